@@ -0,0 +1,308 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from chat_ui.chat_manager.manager import ChatManager
+from chat_ui.utils.metrics import percentile
+from models import ModelChatThread
+
+
+def _invalid_messages(messages):
+    """Describe what is wrong with a job's messages, None when they can be sent"""
+    if not isinstance(messages, list) or not messages:
+        return "'messages' must be a non-empty list"
+    for position, message in enumerate(messages):
+        if not isinstance(message, dict) or not isinstance(message.get('role'), str) \
+                or not isinstance(message.get('content'), str):
+            return f"message {position} needs a 'role' and a 'content' string"
+    return None
+
+
+def read_jobs(path):
+    """
+    Read prompts or conversations from a JSONL file
+
+    Each line is either {"prompt": "..."} or {"messages": [...]}, with an
+    optional "id", "system" prompt and "model" overriding the command line.
+
+    Args:
+        path (str): Path of the JSONL file, '-' for stdin
+
+    Yields:
+        dict: Job with id, messages and optional model and profile
+    """
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping line {line_number}: {e}", file=sys.stderr)
+                continue
+
+            if not isinstance(record, dict):
+                print(f"Skipping line {line_number}: not a JSON object", file=sys.stderr)
+                continue
+            if 'messages' in record:
+                messages = record['messages']
+            elif 'prompt' in record:
+                messages = []
+                if record.get('system'):
+                    messages.append({'role': 'system', 'content': record['system']})
+                messages.append({'role': 'user', 'content': record['prompt']})
+            else:
+                print(f"Skipping line {line_number}: no 'prompt' or 'messages'", file=sys.stderr)
+                continue
+            error = _invalid_messages(messages)
+            if error:
+                print(f"Skipping line {line_number}: {error}", file=sys.stderr)
+                continue
+
+            yield {
+                'id': record.get('id', line_number),
+                'messages': messages,
+                'model': record.get('model'),
+                'profile': record.get('profile'),
+            }
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+class BatchRunner:
+    """
+    Run chat jobs against one or more models without the Tk interface
+    """
+
+    def __init__(self, models, concurrency=1, output=None, chat_manager=None, profile=None):
+        """
+        Initialize the runner
+
+        Args:
+            models (list): Models every job is run against, unless the job names one
+            concurrency (int, optional): Number of generations in flight. Defaults to 1.
+            output (file, optional): Stream results are written to as JSONL
+            chat_manager (ChatManager, optional): Store each conversation as a chat when given
+            profile (str, optional): Performance profile of jobs that don't name one
+        """
+        self.models = models
+        self.concurrency = concurrency
+        self.output = output
+        self.chat_manager = chat_manager
+        self.profile = profile
+        self._output_lock = threading.Lock()
+        # ChatManager is not thread safe, jobs store their chats one at a time
+        self._chats_lock = threading.Lock()
+        self.results = []
+
+    def _expand(self, jobs):
+        """Pair every job with the models it should run on"""
+        for job in jobs:
+            for model in ([job['model']] if job.get('model') else self.models):
+                yield job, model
+
+    def run_one(self, job, model):
+        """
+        Run a single job synchronously
+
+        Returns:
+            dict: Result record
+        """
+        profile = job.get('profile') or self.profile
+        thread = ModelChatThread(model, job['messages'], None, profile=profile)
+        response, think_content, is_complete = thread.generate()
+        stats = thread.stats
+
+        eval_count = stats.get('eval_count') or 0
+        eval_duration = stats.get('eval_duration') or 0
+        result = {
+            'id': job['id'],
+            'model': model,
+            'profile': profile,
+            'ok': is_complete,
+            'response': response,
+            'think': think_content,
+            'ttft_ms': round(stats.get('first_token_s', 0) * 1000, 1),
+            'total_ms': round(stats.get('total_s', 0) * 1000, 1),
+            'prompt_eval_count': stats.get('prompt_eval_count'),
+            'eval_count': stats.get('eval_count'),
+            'tokens_per_s': round(eval_count / (eval_duration / 1e9), 2) if eval_duration else None,
+            'endpoint': stats.get('endpoint'),
+            'timeout': stats.get('timeout'),
+        }
+
+        if self.chat_manager is not None:
+            with self._chats_lock:
+                chat = self.chat_manager.create_new_chat(model, profile)
+                for message in job['messages']:
+                    self.chat_manager.add_message(chat, message['role'], message['content'])
+                if is_complete:
+                    self.chat_manager.add_message(chat, 'assistant', response)
+            result['chat_id'] = chat['id']
+
+        return result
+
+    def _failure(self, job, model, error):
+        """Result record of a job that raised instead of completing"""
+        return {
+            'id': job['id'],
+            'model': model,
+            'profile': job.get('profile') or self.profile,
+            'ok': False,
+            'error': f"{type(error).__name__}: {error}",
+            'timeout': None,
+        }
+
+    def _record(self, result):
+        """Keep a result and stream it to the output"""
+        self.results.append(result)
+        if self.output is not None:
+            with self._output_lock:
+                self.output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                self.output.flush()
+
+    def run(self, jobs, max_requests=None, duration=None):
+        """
+        Run jobs with bounded concurrency, streaming results as they complete
+
+        Args:
+            jobs (iterable): Jobs from read_jobs, consumed lazily
+            max_requests (int, optional): Stop after this many generations
+            duration (float, optional): Stop submitting new generations after this many seconds
+
+        Returns:
+            float: Wall-clock seconds spent
+        """
+        start = time.perf_counter()
+        # Future -> (job, model), to report a job that raised
+        pending = {}
+        submitted = 0
+        work = self._expand(jobs)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                # Keep the pool full without materializing the job list
+                while len(pending) < self.concurrency:
+                    if max_requests is not None and submitted >= max_requests:
+                        break
+                    if duration is not None and time.perf_counter() - start >= duration:
+                        break
+                    try:
+                        job, model = next(work)
+                    except StopIteration:
+                        break
+                    pending[executor.submit(self.run_one, job, model)] = (job, model)
+                    submitted += 1
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, model = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # One bad job doesn't abort the others in flight
+                        result = self._failure(job, model, e)
+                    self._record(result)
+
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        """
+        Summarize throughput and latency percentiles
+
+        Args:
+            elapsed (float): Wall-clock seconds of the run
+
+        Returns:
+            dict: Summary statistics
+        """
+        ok = [result for result in self.results if result['ok']]
+        total = [result['total_ms'] for result in ok]
+        ttft = [result['ttft_ms'] for result in ok]
+        tokens = sum(result['eval_count'] or 0 for result in ok)
+        return {
+            'requests': len(self.results),
+            'errors': len(self.results) - len(ok),
+            'timeouts': sum(1 for result in self.results if result['timeout']),
+            'elapsed_s': round(elapsed, 2),
+            'requests_per_s': round(len(self.results) / elapsed, 3) if elapsed else 0.0,
+            'tokens_per_s': round(tokens / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {f"p{p}": percentile(total, p) for p in (50, 90, 99)},
+            'ttft_ms': {f"p{p}": percentile(ttft, p) for p in (50, 90, 99)},
+        }
+
+
+def _cycle(path):
+    """Replay the job file forever, for load generation"""
+    while True:
+        empty = True
+        for job in read_jobs(path):
+            empty = False
+            yield job
+        if empty:
+            return
+
+
+def _positive_int(value):
+    """argparse type of options that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+
+def main():
+    """
+    Headless entry point for batch evaluation and load generation
+    """
+    parser = argparse.ArgumentParser(description="Run Ollama chat prompts in batch, without a display")
+    parser.add_argument('input', help="JSONL file of prompts or conversations ('-' for stdin)")
+    parser.add_argument('-m', '--models', required=True,
+                        help="Comma-separated models to run every prompt against")
+    parser.add_argument('-c', '--concurrency', type=_positive_int, default=1,
+                        help="Generations in flight (default: %(default)s)")
+    parser.add_argument('-o', '--output', default='-', help="Results JSONL file ('-' for stdout)")
+    parser.add_argument('-p', '--profile',
+                        help="Performance profile of prompts that don't name one (default: the configured default)")
+    parser.add_argument('--save-chats', action='store_true',
+                        help="Store every conversation in the chats directory")
+    parser.add_argument('--chats-dir', default='chats', help="Chats directory (default: chats)")
+    parser.add_argument('--load', action='store_true',
+                        help="Load generator: replay the input until --requests or --duration is reached")
+    parser.add_argument('--requests', type=int, help="Maximum number of generations")
+    parser.add_argument('--duration', type=float, help="Seconds to keep submitting generations")
+    args = parser.parse_args()
+
+    if args.load and args.requests is None and args.duration is None:
+        parser.error("--load needs --requests or --duration")
+
+    models = [model.strip() for model in args.models.split(',') if model.strip()]
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    chat_manager = ChatManager(args.chats_dir) if args.save_chats else None
+
+    runner = None
+    try:
+        runner = BatchRunner(models, args.concurrency, output, chat_manager, args.profile)
+        jobs = _cycle(args.input) if args.load else read_jobs(args.input)
+        elapsed = runner.run(jobs, max_requests=args.requests, duration=args.duration)
+        print(json.dumps(runner.report(elapsed), indent=2), file=sys.stderr)
+    finally:
+        if chat_manager is not None:
+            chat_manager.close()
+        if output is not sys.stdout:
+            output.close()
+
+    return 0 if runner is not None and all(result['ok'] for result in runner.results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+
+from chat_ui.chat_manager.messages import MessageList
+
+WORDS = (
+    "the model returns a list of tokens for each prompt and the server keeps "
+    "context between turns while python code runs inside a local chat window"
+).split()
+
+
+def build_corpus(total_messages, messages_per_chat, seed=0):
+    """
+    Build chats shaped like the ones stored on disk
+
+    Args:
+        total_messages (int): Number of messages across all chats
+        messages_per_chat (int): Messages in each chat
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: JSON documents, one per chat
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    chats = []
+    for first in range(0, total_messages, messages_per_chat):
+        messages = []
+        for index in range(first, min(first + messages_per_chat, total_messages)):
+            role = 'user' if index % 2 == 0 else 'assistant'
+            length = rng.randint(5, 40) if role == 'user' else rng.randint(40, 200)
+            messages.append({
+                'role': role,
+                'content': ' '.join(rng.choice(WORDS) for _ in range(length)),
+                'timestamp': (start + timedelta(seconds=index, microseconds=rng.randint(0, 999999))).isoformat(),
+            })
+        chats.append(json.dumps(messages))
+    return chats
+
+
+def measure(build):
+    """
+    Measure the memory retained by a structure and the time to build it
+
+    Returns:
+        tuple: (structure, retained bytes, seconds)
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    structure = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return structure, retained, elapsed
+
+
+def main():
+    """
+    Compare the memory used by dict messages and compact Message objects
+    """
+    parser = argparse.ArgumentParser(description="Chat message memory benchmark")
+    parser.add_argument('--messages', type=int, default=1_000_000, help="Messages in the corpus (default: %(default)s)")
+    parser.add_argument('--per-chat', type=int, default=1000, help="Messages per chat (default: %(default)s)")
+    args = parser.parse_args()
+
+    print(f"Building a corpus of {args.messages:,} messages...")
+    corpus = build_corpus(args.messages, args.per_chat)
+
+    # Both representations are built from the same JSON, as when chats are loaded
+    dicts, dict_bytes, dict_time = measure(lambda: [json.loads(chat) for chat in corpus])
+    content_bytes = sum(sys.getsizeof(msg['content']) for chat in dicts for msg in chat)
+    del dicts
+    compact, compact_bytes, compact_time = measure(lambda: [MessageList(json.loads(chat)) for chat in corpus])
+    del compact
+
+    print()
+    print(f"Content strings:     {content_bytes / 2**20:10.1f} MB")
+    print(f"Dict messages:       {dict_bytes / 2**20:10.1f} MB  "
+          f"({(dict_bytes - content_bytes) / args.messages:6.1f} B/message overhead, loaded in {dict_time:.2f} s)")
+    print(f"Compact messages:    {compact_bytes / 2**20:10.1f} MB  "
+          f"({(compact_bytes - content_bytes) / args.messages:6.1f} B/message overhead, loaded in {compact_time:.2f} s)")
+    print(f"Saved:               {(dict_bytes - compact_bytes) / 2**20:10.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
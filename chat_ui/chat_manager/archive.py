@@ -0,0 +1,398 @@
+import os
+import json
+import gzip
+import zlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from chat_ui.chat_manager.messages import to_json
+from chat_ui.chat_manager.storage import directory_lock, file_signature
+
+# Errors reading a batch: missing or truncated segment, corrupt gzip member or line
+BATCH_ERRORS = (OSError, EOFError, zlib.error, UnicodeDecodeError, json.JSONDecodeError)
+
+
+class ChatArchive:
+    """
+    Append-only, compressed archive for deleted chats.
+
+    Deleted chats are written in batches: each batch is a single gzip member
+    (one JSON chat per line) appended to the current segment file. An index
+    maps every archived chat id to the segment, byte offset and length of its
+    batch, so a chat can be restored without reading the whole archive.
+    Restored or expired entries are simply dropped from the index; compaction
+    later rewrites the segments that are mostly dead.
+
+    Several processes may share the archive, so every access holds the
+    archive directory's advisory lock and picks up the index another
+    process wrote meanwhile.
+    """
+
+    INDEX_FILE = 'index.json'
+    SEGMENT_PREFIX = 'segment_'
+    SEGMENT_SUFFIX = '.jsonl.gz'
+    LEGACY_PREFIX = 'deleted_'
+
+    def __init__(self, archive_dir, retention_days=90, max_segment_bytes=4 * 1024 * 1024,
+                 compaction_interval=3600, legacy_dirs=()):
+        """
+        Initialize the archive
+
+        Args:
+            archive_dir (str): Directory holding segments and the index
+            retention_days (int, optional): Days to keep archived chats, None keeps them forever. Defaults to 90.
+            max_segment_bytes (int, optional): Size after which a new segment is started. Defaults to 4 MB.
+            compaction_interval (int, optional): Seconds between background compactions. Defaults to 3600.
+            legacy_dirs (iterable, optional): Extra directories scanned for loose deleted_*.json files.
+        """
+        self.archive_dir = os.path.abspath(archive_dir)
+        self.retention_days = retention_days
+        self.max_segment_bytes = max_segment_bytes
+        self.compaction_interval = compaction_interval
+        self.legacy_dirs = [self.archive_dir] + [os.path.abspath(d) for d in legacy_dirs]
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        # Nesting depth of _locked(), the directory lock is only taken by the outermost call
+        self._lock_depth = 0
+        self._stop_event = threading.Event()
+        self._compaction_thread = None
+        self._index_signature = None
+        self._index = self._load_index()
+
+    @contextmanager
+    def _locked(self):
+        """
+        Hold the archive lock, in this process and across processes, with
+        the index up to date
+        """
+        with self._lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+
+            with directory_lock(self.archive_dir):
+                self._lock_depth = 1
+                try:
+                    index_path = os.path.join(self.archive_dir, self.INDEX_FILE)
+                    if file_signature(index_path) != self._index_signature:
+                        self._index = self._load_index()
+                    yield
+                finally:
+                    self._lock_depth = 0
+
+    def _load_index(self):
+        """Load the archive index, or start an empty one"""
+        index_path = os.path.join(self.archive_dir, self.INDEX_FILE)
+        self._index_signature = file_signature(index_path)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            index.setdefault('entries', {})
+            index.setdefault('segments', {})
+            index.setdefault('next_segment', len(index['segments']) + 1)
+            return index
+        except FileNotFoundError:
+            return {'entries': {}, 'segments': {}, 'next_segment': 1}
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Error loading archive index: {e}")
+            return {'entries': {}, 'segments': {}, 'next_segment': 1}
+
+    def _save_index(self):
+        """Write the index atomically"""
+        index_path = os.path.join(self.archive_dir, self.INDEX_FILE)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+        self._index_signature = file_signature(index_path)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.archive_dir, segment)
+
+    def _current_segment(self):
+        """Return the segment new batches are appended to, rolling over when full"""
+        segments = sorted(self._index['segments'])
+        if segments:
+            last = segments[-1]
+            path = self._segment_path(last)
+            if os.path.exists(path) and os.path.getsize(path) < self.max_segment_bytes:
+                return last
+
+        # Segment numbers are never reused, so a segment being compacted away
+        # can't be appended to by mistake
+        segment = f"{self.SEGMENT_PREFIX}{self._index['next_segment']:06d}{self.SEGMENT_SUFFIX}"
+        self._index['next_segment'] += 1
+        self._index['segments'][segment] = {'entries': 0}
+        return segment
+
+    def _append_batch(self, chats, deleted_at):
+        """Append one compressed batch to the current segment and index it"""
+        payload = ''.join(
+            json.dumps(chat, ensure_ascii=False, default=to_json) + '\n' for chat in chats
+        ).encode('utf-8')
+        member = gzip.compress(payload)
+
+        segment = self._current_segment()
+        with open(self._segment_path(segment), 'ab') as f:
+            offset = f.tell()
+            f.write(member)
+            f.flush()
+            os.fsync(f.fileno())
+
+        for chat in chats:
+            self._index['entries'][chat['id']] = {
+                'segment': segment,
+                'offset': offset,
+                'length': len(member),
+                'deleted_at': deleted_at,
+                'title': chat.get('title'),
+            }
+        self._index['segments'][segment]['entries'] += len(chats)
+
+    def archive_chats(self, chats):
+        """
+        Archive a batch of chats in a single append
+
+        Args:
+            chats (list): Chat sessions to archive
+        """
+        chats = [chat for chat in chats if chat and 'id' in chat]
+        if not chats:
+            return
+
+        with self._locked():
+            self._append_batch(chats, datetime.now().isoformat())
+            self._save_index()
+
+    def _read_batch(self, entry):
+        """Read and decompress the batch an index entry points to"""
+        with open(self._segment_path(entry['segment']), 'rb') as f:
+            f.seek(entry['offset'])
+            member = f.read(entry['length'])
+        for line in gzip.decompress(member).decode('utf-8').splitlines():
+            if line.strip():
+                yield json.loads(line)
+
+    def get_archived_chat(self, chat_id):
+        """
+        Read an archived chat without removing it from the archive
+
+        Args:
+            chat_id (str): ID of the archived chat
+
+        Returns:
+            dict: Chat session or None if not archived
+        """
+        with self._locked():
+            entry = self._index['entries'].get(chat_id)
+            if not entry:
+                return None
+            try:
+                for chat in self._read_batch(entry):
+                    if chat.get('id') == chat_id:
+                        return chat
+            except BATCH_ERRORS as e:
+                print(f"Error reading archived chat {chat_id}: {e}")
+            return None
+
+    def restore_chat(self, chat_id):
+        """
+        Remove a chat from the archive and return it
+
+        Args:
+            chat_id (str): ID of the archived chat
+
+        Returns:
+            dict: Restored chat session or None if not archived
+        """
+        with self._locked():
+            chat = self.get_archived_chat(chat_id)
+            if chat is not None:
+                del self._index['entries'][chat_id]
+                self._save_index()
+            return chat
+
+    def list_archived(self):
+        """
+        List archived chats, most recently deleted first
+
+        Returns:
+            list: Dictionaries with id, title and deleted_at
+        """
+        with self._locked():
+            entries = [
+                {'id': chat_id, 'title': entry.get('title'), 'deleted_at': entry['deleted_at']}
+                for chat_id, entry in self._index['entries'].items()
+            ]
+        return sorted(entries, key=lambda entry: entry['deleted_at'], reverse=True)
+
+    def apply_retention(self, now=None):
+        """
+        Drop index entries older than the retention period
+
+        Args:
+            now (datetime, optional): Reference time. Defaults to the current time.
+
+        Returns:
+            int: Number of expired chats
+        """
+        if self.retention_days is None:
+            return 0
+
+        cutoff = ((now or datetime.now()) - timedelta(days=self.retention_days)).isoformat()
+        with self._locked():
+            expired = [
+                chat_id for chat_id, entry in self._index['entries'].items()
+                if entry['deleted_at'] < cutoff
+            ]
+            for chat_id in expired:
+                del self._index['entries'][chat_id]
+            if expired:
+                self._save_index()
+        return len(expired)
+
+    def _legacy_files(self):
+        """Find loose deleted_<id>_<timestamp>.json files left by older versions"""
+        for directory in self.legacy_dirs:
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                if filename.startswith(self.LEGACY_PREFIX) and filename.endswith('.json'):
+                    yield os.path.join(directory, filename)
+
+    def compact(self, dead_ratio=0.5):
+        """
+        Apply retention, fold legacy loose files into a segment and rewrite
+        segments whose dead entries exceed ``dead_ratio``
+
+        Args:
+            dead_ratio (float, optional): Fraction of dead entries that triggers a rewrite. Defaults to 0.5.
+
+        Returns:
+            dict: Counts of expired chats, imported legacy files and removed segments
+        """
+        with self._locked():
+            expired = self.apply_retention()
+
+            live_per_segment = {}
+            for entry in self._index['entries'].values():
+                live_per_segment[entry['segment']] = live_per_segment.get(entry['segment'], 0) + 1
+
+            current = sorted(self._index['segments'])[-1] if self._index['segments'] else None
+            stale_segments = []
+            for segment, info in self._index['segments'].items():
+                live = live_per_segment.get(segment, 0)
+                dead = info['entries'] - live
+                if live == 0 and segment != current:
+                    stale_segments.append(segment)
+                elif info['entries'] and dead / info['entries'] > dead_ratio:
+                    stale_segments.append(segment)
+
+            survivors = []
+            # Segments with a batch that can't be read are kept, along with the
+            # index entries of its chats, rather than losing those chats
+            unreadable = set()
+            for segment in stale_segments:
+                batches = {}
+                for chat_id, entry in self._index['entries'].items():
+                    if entry['segment'] == segment:
+                        batches.setdefault(entry['offset'], (entry, set()))[1].add(chat_id)
+                for entry, chat_ids in batches.values():
+                    try:
+                        for chat in self._read_batch(entry):
+                            if chat.get('id') in chat_ids:
+                                survivors.append((chat, entry['deleted_at']))
+                    except BATCH_ERRORS as e:
+                        print(f"Error compacting archive segment {segment}, keeping it: {e}")
+                        unreadable.add(segment)
+            stale_segments = [segment for segment in stale_segments if segment not in unreadable]
+
+            # Only files that could be read are removed once their chat is in a segment,
+            # or already was; unreadable ones are left for the user to look at
+            legacy_paths = []
+            for path in self._legacy_files():
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        chat = json.load(f)
+                    deleted_at = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+                except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
+                    print(f"Error importing legacy archive file {path}: {e}")
+                    continue
+                if not isinstance(chat, dict) or 'id' not in chat:
+                    print(f"Error importing legacy archive file {path}: not a chat")
+                    continue
+                legacy_paths.append(path)
+                if chat['id'] not in self._index['entries']:
+                    survivors.append((chat, deleted_at))
+
+            if not stale_segments and not legacy_paths:
+                return {'expired': expired, 'imported': 0, 'removed_segments': 0}
+
+            for segment in stale_segments:
+                del self._index['segments'][segment]
+            # Never append survivors to a segment that is about to be removed
+            self._index['next_segment'] = max(
+                [self._index['next_segment']] +
+                [int(s[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]) + 1 for s in stale_segments]
+            )
+
+            # Group survivors by their original deletion time so the batch
+            # timestamp keeps driving retention correctly
+            by_deleted_at = {}
+            for chat, deleted_at in survivors:
+                by_deleted_at.setdefault(deleted_at, []).append(chat)
+            for deleted_at in sorted(by_deleted_at):
+                self._append_batch(by_deleted_at[deleted_at], deleted_at)
+
+            self._save_index()
+
+            for segment in stale_segments:
+                try:
+                    os.remove(self._segment_path(segment))
+                except FileNotFoundError:
+                    pass
+            for path in legacy_paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        return {
+            'expired': expired,
+            'imported': len(legacy_paths),
+            'removed_segments': len(stale_segments),
+        }
+
+    def start_background_compaction(self, initial_delay=30):
+        """
+        Run compaction periodically in a daemon thread
+
+        Args:
+            initial_delay (int, optional): Seconds before the first run. Defaults to 30.
+        """
+        if self._compaction_thread and self._compaction_thread.is_alive():
+            return
+
+        def worker():
+            delay = initial_delay
+            while not self._stop_event.wait(delay):
+                try:
+                    self.compact()
+                except Exception as e:
+                    print(f"Error during archive compaction: {e}")
+                delay = self.compaction_interval
+
+        self._stop_event.clear()
+        self._compaction_thread = threading.Thread(target=worker, daemon=True)
+        self._compaction_thread.start()
+
+    def stop(self):
+        """Stop background compaction"""
+        self._stop_event.set()
@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+
+# File layout: magic, header length, JSON header, then the tokens as
+# little-endian unsigned 32-bit integers
+_MAGIC = b'OCTX1\n'
+_HEADER_LENGTH = struct.Struct('<I')
+CONTEXT_SUFFIX = '.ctx'
+
+
+def _token_array(tokens):
+    """Return tokens as an array of unsigned 32-bit integers"""
+    if isinstance(tokens, array) and tokens.itemsize == 4:
+        return tokens
+    typecode = 'I' if array('I').itemsize == 4 else 'L'
+    return array(typecode, tokens)
+
+
+class ContextStore:
+    """
+    Ollama `context` token arrays of chats, one binary file per chat.
+
+    A context is stored with the key of the history it encodes (model,
+    head message and a digest of that message), so it is only handed back
+    for the same history. Tokens are kept as typed arrays, four bytes per
+    token, instead of JSON lists.
+    """
+
+    def __init__(self, directory, memory_chats=8):
+        """
+        Initialize the store
+
+        Args:
+            directory (str): Directory of the context files
+            memory_chats (int, optional): Contexts kept in memory. Defaults to 8.
+        """
+        self.directory = directory
+        self.memory_chats = memory_chats
+        # chat_id -> (key, tokens), least recently used first
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, chat_id):
+        return os.path.join(self.directory, f"{chat_id}{CONTEXT_SUFFIX}")
+
+    def _remember(self, chat_id, entry):
+        with self._lock:
+            self._cache[chat_id] = entry
+            self._cache.move_to_end(chat_id)
+            while len(self._cache) > self.memory_chats:
+                self._cache.popitem(last=False)
+
+    def _read(self, chat_id):
+        """Read a context file, None when missing or unreadable"""
+        try:
+            with open(self._path(chat_id), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"Error reading context of chat {chat_id}: {e}")
+            return None
+        if not data.startswith(_MAGIC):
+            return None
+        offset = len(_MAGIC)
+        (length,) = _HEADER_LENGTH.unpack_from(data, offset)
+        offset += _HEADER_LENGTH.size
+        try:
+            key = json.loads(data[offset:offset + length].decode('utf-8'))
+        except ValueError:
+            return None
+        tokens = _token_array(())
+        tokens.frombytes(data[offset + length:])
+        if sys.byteorder == 'big':
+            tokens.byteswap()
+        return key, tokens
+
+    def get(self, chat_id, key):
+        """
+        Return the context of a chat if it encodes the given history
+
+        Args:
+            chat_id (str): Chat ID
+            key (dict): Key of the history the caller is about to extend
+
+        Returns:
+            array: Context tokens, None if the chat has none for this history
+        """
+        with self._lock:
+            entry = self._cache.get(chat_id)
+        if entry is None:
+            entry = self._read(chat_id)
+            if entry is None:
+                return None
+            self._remember(chat_id, entry)
+        stored_key, tokens = entry
+        return tokens if stored_key == key else None
+
+    def set(self, chat_id, key, tokens):
+        """
+        Store the context of a chat, replacing the previous one
+
+        Args:
+            chat_id (str): Chat ID
+            key (dict): Key of the history the context encodes
+            tokens (iterable): Context tokens
+        """
+        tokens = _token_array(tokens)
+        self._remember(chat_id, (key, tokens))
+
+        header = json.dumps(key).encode('utf-8')
+        if sys.byteorder == 'big':
+            tokens = array(tokens.typecode, tokens)
+            tokens.byteswap()
+        path = self._path(chat_id)
+        tmp_file = f"{path}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_file, 'wb') as f:
+                f.write(_MAGIC)
+                f.write(_HEADER_LENGTH.pack(len(header)))
+                f.write(header)
+                f.write(tokens.tobytes())
+            os.replace(tmp_file, path)
+        except OSError as e:
+            # The context only saves work, the next turn falls back to the full history
+            print(f"Error writing context of chat {chat_id}: {e}")
+
+    def remove(self, chat_id):
+        """
+        Drop the context of a chat
+
+        Args:
+            chat_id (str): Chat ID
+        """
+        with self._lock:
+            self._cache.pop(chat_id, None)
+        try:
+            os.remove(self._path(chat_id))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing context of chat {chat_id}: {e}")
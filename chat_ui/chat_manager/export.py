@@ -0,0 +1,226 @@
+import os
+import json
+import html
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from chat_ui.chat_manager import storage
+from chat_ui.chat_manager.messages import to_json, branch_messages
+
+EXPORT_FORMATS = ('jsonl', 'markdown', 'html')
+
+ROLE_LABELS = {
+    'user': '👤 User',
+    'assistant': '🤖 Assistant',
+    'system': '⚙️ System',
+}
+
+HTML_HEADER = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Ollama Chat export</title>
+<style>
+body { font-family: sans-serif; max-width: 900px; margin: 2em auto; color: #222; }
+section { border-bottom: 1px solid #ccc; padding-bottom: 1em; margin-bottom: 2em; }
+.meta { color: #777; font-size: 0.9em; }
+.message { margin: 1em 0; }
+.role { font-weight: bold; }
+.user .role { color: #1a5fb4; }
+.assistant .role { color: #26a269; }
+pre { white-space: pre-wrap; background: #f6f6f6; padding: 0.6em; border-radius: 4px; }
+</style>
+</head>
+<body>
+"""
+
+HTML_FOOTER = "</body>\n</html>\n"
+
+
+def _plain(chat):
+    """Convert a chat to plain JSON-compatible data, for pickling to workers"""
+    return json.loads(json.dumps(chat, ensure_ascii=False, default=to_json))
+
+
+def render_jsonl(chat):
+    """Render a chat as one JSONL line"""
+    return json.dumps(chat, ensure_ascii=False, default=to_json) + '\n'
+
+
+def render_markdown(chat):
+    """
+    Render the active branch of a chat as a Markdown document section
+
+    Args:
+        chat (dict): Chat session
+
+    Returns:
+        str: Markdown text
+    """
+    lines = [
+        f"# {chat.get('title') or 'Untitled Chat'}",
+        "",
+        f"*{chat.get('model') or 'Unknown model'} · {chat.get('created_at', '')} · `{chat['id']}`*",
+        "",
+    ]
+    for msg in branch_messages(chat):
+        lines.append(f"### {ROLE_LABELS.get(msg['role'], msg['role'])}")
+        if msg.get('timestamp'):
+            lines.append(f"<sub>{msg['timestamp']}</sub>")
+        lines.append("")
+        lines.append(msg['content'])
+        lines.append("")
+    lines.append("---")
+    lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def render_html(chat):
+    """
+    Render the active branch of a chat as an HTML section
+
+    Args:
+        chat (dict): Chat session
+
+    Returns:
+        str: HTML fragment
+    """
+    parts = [
+        f"<section id=\"{html.escape(chat['id'])}\">",
+        f"<h1>{html.escape(chat.get('title') or 'Untitled Chat')}</h1>",
+        f"<p class=\"meta\">{html.escape(chat.get('model') or 'Unknown model')} · "
+        f"{html.escape(chat.get('created_at', ''))}</p>",
+    ]
+    for msg in branch_messages(chat):
+        role = msg['role']
+        parts.append(
+            f"<div class=\"message {html.escape(role)}\">"
+            f"<div class=\"role\">{html.escape(ROLE_LABELS.get(role, role))}</div>"
+            f"<pre>{html.escape(msg['content'])}</pre></div>"
+        )
+    parts.append("</section>\n")
+    return "\n".join(parts)
+
+
+RENDERERS = {
+    'jsonl': render_jsonl,
+    'markdown': render_markdown,
+    'html': render_html,
+}
+
+
+def _render_parallel(renderer, chats, workers):
+    """
+    Render chats in a process pool, in order, with a bounded number of
+    chats in flight so the whole store is never held in memory
+
+    Yields:
+        str: Rendered chats
+    """
+    window = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for chat in chats:
+            in_flight.append(executor.submit(renderer, _plain(chat)))
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def export_chats(chats, out, fmt='jsonl', workers=None):
+    """
+    Stream chats into a single bundle
+
+    Args:
+        chats (iterable): Chats, typically ChatManager.iter_chats()
+        out (file): Text stream the bundle is written to
+        fmt (str, optional): 'jsonl', 'markdown' or 'html'. Defaults to 'jsonl'.
+        workers (int, optional): Processes rendering Markdown/HTML. Defaults to the CPU count,
+            0 renders on the calling thread.
+
+    Returns:
+        int: Number of exported chats
+    """
+    if fmt not in RENDERERS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+
+    renderer = RENDERERS[fmt]
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if fmt == 'jsonl' or workers <= 0:
+        # JSON encoding is cheaper than shipping the chat to another process
+        rendered = (renderer(chat) for chat in chats)
+    else:
+        rendered = _render_parallel(renderer, chats, workers)
+
+    if fmt == 'html':
+        out.write(HTML_HEADER)
+    count = 0
+    for text in rendered:
+        out.write(text)
+        count += 1
+    if fmt == 'html':
+        out.write(HTML_FOOTER)
+    return count
+
+
+def import_chats(chats_dir, stream, batch_size=100, replace=False,
+                 compress_threshold=storage.DEFAULT_COMPRESS_THRESHOLD):
+    """
+    Import a JSONL bundle, reading it line by line and writing chats in batches
+
+    Args:
+        chats_dir (str): Chats directory
+        stream (file): Text stream of the JSONL bundle
+        batch_size (int, optional): Chats written between two syncs of the directory. Defaults to 100.
+        replace (bool, optional): Overwrite chats that already exist. Defaults to False.
+        compress_threshold (int, optional): Size above which imported chats are compressed
+
+    Returns:
+        dict: Counts of imported, skipped and invalid chats
+    """
+    counts = {'imported': 0, 'skipped': 0, 'invalid': 0}
+    batch = []
+
+    def write_batch():
+        for chat in batch:
+            # Each file is synced before it is renamed into place
+            storage.write_chat_file(chats_dir, chat, compress_threshold)
+        # The renames are synced once for the whole batch
+        storage.fsync_directory(chats_dir)
+        counts['imported'] += len(batch)
+        batch.clear()
+
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            chat = json.loads(line)
+            if not isinstance(chat.get('id'), str) or not isinstance(chat.get('messages', []), list):
+                raise ValueError("missing 'id' or invalid 'messages'")
+            # The id becomes a file name
+            if not chat['id'] or os.path.basename(chat['id']) != chat['id'] or chat['id'].startswith('.'):
+                raise ValueError(f"invalid chat id {chat['id']!r}")
+            # Caught here rather than when the chat is loaded
+            for position, message in enumerate(chat.get('messages', [])):
+                if not isinstance(message, dict) or not isinstance(message.get('role'), str):
+                    raise ValueError(f"message {position} has no 'role'")
+        except (json.JSONDecodeError, ValueError, AttributeError) as e:
+            print(f"Skipping line {line_number}: {e}")
+            counts['invalid'] += 1
+            continue
+
+        if not replace and storage.find_chat_file(chats_dir, chat['id']):
+            counts['skipped'] += 1
+            continue
+
+        batch.append(chat)
+        if len(batch) >= batch_size:
+            write_batch()
+
+    if batch:
+        write_batch()
+    return counts
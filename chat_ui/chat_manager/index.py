@@ -0,0 +1,161 @@
+import bisect
+import threading
+from datetime import date
+
+
+def chat_timestamp(chat):
+    """Return the time a chat was last touched, as an ISO string"""
+    return chat.get('last_updated') or chat.get('created_at') or ''
+
+
+def _bound(value):
+    """Convert a date range bound to an ISO string comparable with chat timestamps"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Unsupported date bound: {value!r}")
+
+
+class ChatIndex:
+    """
+    Chats ordered by last update, most recent first.
+
+    Entries are (timestamp, id) keys kept sorted in blocks of at most
+    2 * BLOCK_SIZE keys, with the last key of every block in a separate
+    list. Touching or removing a chat bisects that list to find the block,
+    then bisects the block, so it costs O(log n) comparisons plus a shift
+    of at most one block, however many chats there are. A page by offset
+    walks the block lengths, which are few. ISO timestamps sort as strings.
+    """
+
+    BLOCK_SIZE = 512
+
+    def __init__(self):
+        """
+        Initialize an empty index
+        """
+        # Sorted ascending across blocks, read from the end for the most recent first
+        self._blocks = []
+        # Last key of each block
+        self._maxes = []
+        self._len = 0
+        # chat_id -> (timestamp, chat_id) currently in _blocks
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._len
+
+    def _insert(self, key):
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+        else:
+            i = min(bisect.bisect_left(self._maxes, key), len(self._blocks) - 1)
+            block = self._blocks[i]
+            bisect.insort(block, key)
+            self._maxes[i] = block[-1]
+            if len(block) > 2 * self.BLOCK_SIZE:
+                self._blocks.insert(i + 1, block[self.BLOCK_SIZE:])
+                del block[self.BLOCK_SIZE:]
+                self._maxes.insert(i, block[-1])
+        self._len += 1
+
+    def _delete(self, key):
+        i = bisect.bisect_left(self._maxes, key)
+        block = self._blocks[i]
+        del block[bisect.bisect_left(block, key)]
+        if block:
+            self._maxes[i] = block[-1]
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+        self._len -= 1
+
+    def _rank(self, key):
+        """Return the number of keys lower than key"""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            return self._len
+        return sum(len(block) for block in self._blocks[:i]) + bisect.bisect_left(self._blocks[i], key)
+
+    def _slice(self, start, stop):
+        """Return the keys from position start to stop (excluded), ascending"""
+        keys = []
+        first = 0
+        for block in self._blocks:
+            if first >= stop:
+                break
+            last = first + len(block)
+            if last > start:
+                keys.extend(block[max(start - first, 0):stop - first])
+            first = last
+        return keys
+
+    def touch(self, chat):
+        """
+        Add a chat, or move it to match its timestamp
+
+        Args:
+            chat (dict): Chat session
+        """
+        key = (chat_timestamp(chat), chat['id'])
+        with self._lock:
+            previous = self._positions.get(chat['id'])
+            if previous == key:
+                return
+            if previous is not None:
+                self._delete(previous)
+            self._insert(key)
+            self._positions[chat['id']] = key
+
+    def remove(self, chat_id):
+        """
+        Remove a chat
+
+        Args:
+            chat_id (str): ID of the chat
+        """
+        with self._lock:
+            previous = self._positions.pop(chat_id, None)
+            if previous is not None:
+                self._delete(previous)
+
+    def page(self, offset=0, limit=None, since=None, until=None, predicate=None):
+        """
+        Return the IDs of a page of chats, most recent first
+
+        Args:
+            offset (int, optional): Matching chats to skip. Defaults to 0.
+            limit (int, optional): Maximum number of IDs. Defaults to no limit.
+            since (str | date, optional): Only chats updated at or after this time
+            until (str | date, optional): Only chats updated before this time
+            predicate (callable, optional): Called with a chat ID, False excludes the chat
+
+        Returns:
+            list: Chat IDs
+        """
+        since, until = _bound(since), _bound(until)
+        with self._lock:
+            # A range of the sorted keys, walked from its most recent end
+            start = self._rank((since,)) if since else 0
+            end = self._rank((until,)) if until else self._len
+            if predicate is None:
+                stop = end - offset
+                first = start if limit is None else max(start, stop - limit)
+                return [chat_id for _, chat_id in reversed(self._slice(first, max(stop, first)))]
+            keys = self._slice(start, end)
+
+        ids = []
+        skipped = 0
+        for _, chat_id in reversed(keys):
+            if not predicate(chat_id):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            ids.append(chat_id)
+            if limit is not None and len(ids) >= limit:
+                break
+        return ids
@@ -1,47 +1,220 @@
 import uuid
 import os
 import json
+import hashlib
+import logging
 import queue
 import threading
 from datetime import datetime
 
+from chat_ui.chat_manager.archive import ChatArchive
+from chat_ui.chat_manager import storage
+from chat_ui.chat_manager.persister import ChatPersister
+from chat_ui.chat_manager.index import ChatIndex
+from chat_ui.chat_manager.contexts import ContextStore
+from chat_ui.chat_manager.watcher import DirectoryWatcher
+from chat_ui.utils.metrics import metrics
+from chat_ui.utils.profiling import profiled
+from chat_ui.chat_manager.messages import (
+    Message, MessageList, PagedMessageList, datetime_to_int, parent_index, active_path, children_map
+)
+
 class ChatManager:
-    def __init__(self, chats_dir='chats'):
+    def __init__(self, chats_dir='chats', compress_threshold=storage.DEFAULT_COMPRESS_THRESHOLD,
+                 save_delay=0.5, preload=True, lazy_threshold=500):
         """
         Initialize ChatManager with a directory for storing chats
         
         Args:
             chats_dir (str, optional): Directory to store chat files. Defaults to 'chats'.
+            compress_threshold (int, optional): Chats larger than this many bytes are stored
+                compressed. None disables compression.
+            save_delay (float, optional): Seconds during which repeated saves of a chat are
+                coalesced by the background writer. Defaults to 0.5.
+            preload (bool, optional): Load every chat into memory. Tools that only stream
+                through the store with iter_chats() pass False. Defaults to True.
+            lazy_threshold (int, optional): Chats with more messages than this are loaded
+                through their offset index: only their other fields are read at startup,
+                and messages are read by blocks as they are accessed, the most recent
+                first. None reads every chat whole. Defaults to 500.
         """
         self.chats_dir = os.path.abspath(chats_dir)
+        self.compress_threshold = compress_threshold
+        self.lazy_threshold = lazy_threshold
         
         # Create chats directory if it doesn't exist
         os.makedirs(self.chats_dir, exist_ok=True)
         
-        # Initialize chats dictionary
+        # Deleted chats are kept in a compressed archive instead of loose files
+        self.archive = ChatArchive(
+            os.path.join(self.chats_dir, 'archive'),
+            legacy_dirs=[os.path.join(self.chats_dir, 'deleted')]
+        )
+        self.archive.start_background_compaction()
+
+        # Ollama context arrays of chats using context reuse
+        self.contexts = ContextStore(os.path.join(self.chats_dir, 'contexts'))
+
+        # Saves are written behind by a background thread
+        self.persister = ChatPersister(self._write_chat, coalesce_window=save_delay)
+
+        # Initialize chats dictionary, and its order by last update
         self.chats = {}
-        self._load_existing_chats()
+        self._index = ChatIndex()
+        # Active branch of each chat, as (message count, head, indices)
+        self._paths = {}
+        # Version of each chat file last read or written by this instance,
+        # and the number of messages it held
+        self._file_signatures = {}
+        self._synced_counts = {}
+        # File and offset index the unread messages of lazily loaded chats are read from
+        self._sources = {}
+        # Chats changed by another process while this one had unsaved changes,
+        # as (chat read from disk, file version) until they are merged
+        self._merging = {}
+        self._closing = False
+        self._watcher = None
+        self._dispatch = lambda func, *args: func(*args)
+        self._change_listeners = []
+        self.preloaded = preload
+        if preload:
+            self._load_existing_chats()
 
     def _load_existing_chats(self):
         """
         Load existing chat files from the chats directory
         """
         for filename in os.listdir(self.chats_dir):
-            if filename.endswith('.json'):
+            if storage.chat_id_from_filename(filename):
                 filepath = os.path.join(self.chats_dir, filename)
                 try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        chat = json.load(f)
-                        self.chats[chat['id']] = chat
-                except (json.JSONDecodeError, KeyError) as e:
+                    signature = storage.file_signature(filepath)
+                    chat = self._read_chat(filepath)
+                    self.chats[chat['id']] = chat
+                    self._index.touch(chat)
+                    self._file_signatures[chat['id']] = signature
+                    self._synced_counts[chat['id']] = len(chat['messages'])
+                except (json.JSONDecodeError, KeyError, OSError, ValueError) as e:
                     print(f"Error loading chat file {filename}: {e}")
 
-    def create_new_chat(self, model=None):
+    def _read_chat(self, path):
+        """
+        Read a chat file, leaving the messages of long chats on disk until they are needed
+        
+        Args:
+            path (str): Path of the chat file
+        
+        Returns:
+            dict: Chat session
+        """
+        index = storage.read_chat_index(path) if self.lazy_threshold is not None else None
+        if index is None or index['count'] <= self.lazy_threshold:
+            return self._compact(storage.read_chat_file(path))
+
+        chat = storage.read_chat_header(path, index)
+        blocks = [(first, count) for _, _, first, count in index['blocks']]
+        chat['messages'] = PagedMessageList(
+            index['count'],
+            blocks,
+            lambda block: self._read_block(chat['id'], *blocks[block]),
+            {int(position): parent for position, parent in index['parents'].items()}
+        )
+        self._sources[chat['id']] = (path, index)
+        metrics.incr('chats.lazy_loaded')
+        return chat
+
+    def _read_block(self, chat_id, first, count):
+        """
+        Read a block of messages of a chat loaded through its index.
+        Chats are append-only, so the block can be read from any later
+        version of the file, through that version's own index.
+        
+        Args:
+            chat_id (str): ID of the chat
+            first (int): Index of the block's first message
+            count (int): Number of messages in the block
+        
+        Returns:
+            list: Messages of the block
+
+        Raises:
+            FileNotFoundError: If the chat's file was removed
+        """
+        metrics.incr('chats.blocks_read')
+        for _ in range(2):
+            source = self._sources.get(chat_id)
+            if source is None:
+                # Rewritten since its index was read, by this instance or another one
+                path = storage.find_chat_file(self.chats_dir, chat_id)
+                index = storage.read_chat_index(path) if path else None
+                if index is None:
+                    break
+                source = self._sources[chat_id] = (path, index)
+            try:
+                return storage.read_messages(*source, first, first + count)
+            except (OSError, ValueError):
+                self._sources.pop(chat_id, None)
+        path = storage.find_chat_file(self.chats_dir, chat_id)
+        if path is None:
+            raise FileNotFoundError(f"Chat {chat_id} was removed before its messages were read")
+        logging.debug(f"Chat {chat_id} has no current index, reading it whole")
+        chat = storage.read_chat_file(path)
+        return chat['messages'][first:first + count]
+
+    @staticmethod
+    def _load_messages(chat):
+        """Read the messages of a chat still on disk, before it is serialized as a whole"""
+        messages = chat.get('messages')
+        if isinstance(messages, PagedMessageList):
+            messages.load_all()
+        return chat
+
+    def iter_chats(self):
+        """
+        Walk every chat one at a time.
+        Chats that are not in memory are read from disk and not kept.
+        
+        Yields:
+            dict: Chat session
+        """
+        if self.preloaded:
+            for chat in self.list_chats():
+                yield self._load_messages(chat)
+            return
+
+        for filename in sorted(os.listdir(self.chats_dir)):
+            chat_id = storage.chat_id_from_filename(filename)
+            if not chat_id:
+                continue
+            if chat_id in self.chats:
+                yield self.chats[chat_id]
+                continue
+            try:
+                yield storage.read_chat_file(os.path.join(self.chats_dir, filename))
+            except (json.JSONDecodeError, KeyError, OSError, ValueError) as e:
+                print(f"Error loading chat file {filename}: {e}")
+
+    @staticmethod
+    def _compact(chat):
+        """
+        Switch a freshly read chat to the compact message representation
+        
+        Args:
+            chat (dict): Chat session as read from disk
+        
+        Returns:
+            dict: The same chat, with its messages in a MessageList
+        """
+        chat['messages'] = MessageList(chat.get('messages', []))
+        return chat
+
+    def create_new_chat(self, model=None, profile=None):
         """
         Create a new chat session.
         
         Args:
             model (str, optional): Model to use for the chat. Defaults to None.
+            profile (str, optional): Performance profile of the chat. Defaults to the default profile.
         
         Returns:
             dict: Newly created chat session
@@ -50,16 +223,18 @@ class ChatManager:
         chat = {
             'id': chat_id,
             'model': model,
-            'messages': [],
+            'messages': MessageList(),
             'created_at': datetime.now().isoformat(),
             'last_updated': datetime.now().isoformat()
         }
+        if profile:
+            chat['profile'] = profile
         
         self.chats[chat_id] = chat
         self.save_chat(chat)
         return chat
 
-    def add_message(self, chat, role, message):
+    def add_message(self, chat, role, message, parent=None, images=None):
         """
         Add a message to a chat session.
         
@@ -67,18 +242,30 @@ class ChatManager:
             chat (dict): Chat session to add message to
             role (str): Role of the message sender ('user' or 'assistant')
             message (str): Message content
+            parent (int, optional): Index of the message the new one answers or follows,
+                -1 to start a new root. Defaults to the head of the active branch.
+            images (list, optional): Paths of images attached to the message
         
         Returns:
             dict: Updated chat session
         """
-        message_entry = {
-            'role': role,
-            'content': message,
-            'timestamp': datetime.now().isoformat()
-        }
+        now = datetime.now()
+        message_entry = Message(role, message, datetime_to_int(now))
+        if images:
+            message_entry['images'] = list(images)
         
-        chat['messages'].append(message_entry)
-        chat['last_updated'] = datetime.now().isoformat()
+        if not isinstance(chat.get('messages'), MessageList):
+            self._compact(chat)
+        messages = chat['messages']
+        if parent is None:
+            parent = self._head(chat)
+        # Following the previous message is implicit, only branches store their parent
+        if parent != len(messages) - 1:
+            message_entry['parent'] = parent
+        messages.append(message_entry)
+        # The new message is the last one, so it is the head by default
+        chat.pop('head', None)
+        chat['last_updated'] = now.isoformat()
         
         # Update the chat in memory and save to file
         self.chats[chat['id']] = chat
@@ -86,33 +273,256 @@ class ChatManager:
         
         return chat
 
+    @profiled('save_chat')
     def save_chat(self, chat):
         """
-        Save a chat session to a JSON file
+        Queue a chat session to be saved by the background writer
         
         Args:
             chat (dict): Chat session to save
         """
-        try:
-            chat_file = os.path.join(self.chats_dir, f"{chat['id']}.json")
-            
-            with open(chat_file, 'w', encoding='utf-8') as f:
-                json.dump(chat, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print(f"Error saving chat {chat['id']}: {e}")
+        # Every change to a chat is saved, so this keeps the order up to date
+        self._index.touch(chat)
+        self.persister.schedule(chat)
+
+    def _write_chat(self, chat):
+        """
+        Write a chat session to a JSON file, compressed when it is large.
+        Called from the background writer thread. When another process saved
+        the chat since this one last read or wrote it, nothing is written:
+        the other version is merged on the owner thread, which saves again.
+        
+        Args:
+            chat (dict): Snapshot of the chat session to write
+        """
+        chat_id = chat['id']
+        if chat_id in self._merging:
+            # The merge saves the latest state once it is applied
+            return
+        with storage.directory_lock(self.chats_dir):
+            path = storage.find_chat_file(self.chats_dir, chat_id)
+            current = storage.file_signature(path or '')
+            known = self._file_signatures.get(chat_id)
+            if current is None or known is None or current == known:
+                path = storage.write_chat_file(self.chats_dir, chat, self.compress_threshold, lock=False)
+                self._file_signatures[chat_id] = storage.file_signature(path)
+                self._synced_counts[chat_id] = len(chat['messages'])
+                self._sources.pop(chat_id, None)
+                return
+            # Another process saved the chat since this one last saw it
+            metrics.incr('save.conflicts')
+            print(f"Chat {chat_id} was changed by another process, merging it")
+            self._merging[chat_id] = (storage.read_chat_file(path), current)
+        if not self._closing:
+            self._dispatch(self._merge_foreign, chat_id)
+
+    def _merge_foreign(self, chat_id):
+        """
+        Merge the version of a chat another process saved with this instance's
+        unsaved changes, on the thread owning the chats. Chats are append-only,
+        so both versions share the messages this instance last read or wrote;
+        the other version's messages keep their position and the ones added
+        here since are moved after them, with their parents renumbered.
+        
+        Args:
+            chat_id (str): ID of the chat
+        """
+        merge = self._merging.pop(chat_id, None)
+        chat = self.chats.get(chat_id)
+        if merge is None or chat is None:
+            return
+        disk_chat, signature = merge
+        disk_messages = disk_chat.get('messages', [])
+        messages = chat['messages']
+        base = min(self._synced_counts.get(chat_id, 0), len(disk_messages), len(messages))
+        offset = len(disk_messages) - base
+
+        merged = MessageList(disk_messages)
+        for position in range(base, len(messages)):
+            message = messages[position].to_dict()
+            parent = message.pop('parent', position - 1)
+            if parent >= base:
+                parent += offset
+            if parent != len(merged) - 1:
+                message['parent'] = parent
+            merged.append(message)
+        chat['messages'] = merged
+        if chat.get('head') is not None and chat['head'] >= base:
+            chat['head'] += offset
+        if not chat.get('title') and disk_chat.get('title'):
+            chat['title'] = disk_chat['title']
+        chat['last_updated'] = max(chat.get('last_updated', ''), disk_chat.get('last_updated', ''))
+        metrics.incr('save.merges')
+
+        self._file_signatures[chat_id] = signature
+        self._synced_counts[chat_id] = len(disk_messages)
+        self._paths.pop(chat_id, None)
+        self.save_chat(chat)
+        for callback in self._change_listeners:
+            callback(chat_id, chat)
+
+    def flush(self, timeout=None):
+        """
+        Write all pending saves to disk
+        
+        Args:
+            timeout (float, optional): Maximum seconds to wait
+        
+        Returns:
+            bool: True if every pending save was written
+        """
+        return self.persister.flush(timeout)
+
+    def persistence_stats(self):
+        """
+        Report pending writes and write latency
+        
+        Returns:
+            dict: Statistics from the background writer
+        """
+        return self.persister.stats()
+
+    def close(self):
+        """
+        Flush pending saves and stop background work
+        """
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        # Merges can't wait for the owner thread anymore, apply them here
+        self._closing = True
+        self.persister.close()
+        for chat_id in list(self._merging):
+            self._merge_foreign(chat_id)
+        self.archive.stop()
+
+    def add_change_listener(self, callback):
+        """
+        Register a callback for chats changed by other processes
+        
+        Args:
+            callback (callable): Called with the chat ID and the updated chat,
+                or None when the chat was deleted
+        """
+        self._change_listeners.append(callback)
+
+    def watch(self, dispatch=None):
+        """
+        Apply the changes other processes make to the chats directory, using inotify.
+        Only the chat files that changed are read.
+        
+        Args:
+            dispatch (callable, optional): Runs a function with its arguments on the thread
+                owning the chats, e.g. the UI thread. Defaults to calling it from the
+                watcher thread.
+        
+        Returns:
+            bool: False if the directory can't be watched on this system
+        """
+        if self._watcher is not None:
+            return True
+        self._dispatch = dispatch or (lambda func, *args: func(*args))
+        watcher = DirectoryWatcher(self.chats_dir, self._on_files_changed)
+        if not watcher.start():
+            return False
+        self._watcher = watcher
+        return True
+
+    def _on_files_changed(self, filenames):
+        """
+        Read the chat files changed by other processes; runs in the watcher thread
+        
+        Args:
+            filenames (set): Names of the changed files, None when events were lost
+        """
+        if filenames is None:
+            # Events were lost, compare every file with the version last seen
+            filenames = set(os.listdir(self.chats_dir))
+            filenames.update(f"{chat_id}{storage.PLAIN_SUFFIX}" for chat_id in list(self._file_signatures))
+
+        chat_ids = {storage.chat_id_from_filename(filename) for filename in filenames} - {None}
+        for chat_id in chat_ids:
+            with storage.directory_lock(self.chats_dir, shared=True):
+                path = storage.find_chat_file(self.chats_dir, chat_id)
+                signature = storage.file_signature(path) if path else None
+                if signature == self._file_signatures.get(chat_id):
+                    # Written by this instance, or already applied
+                    continue
+                chat = None
+                if path is not None:
+                    try:
+                        chat = storage.read_chat_file(path)
+                    except (json.JSONDecodeError, KeyError, OSError, ValueError) as e:
+                        print(f"Error loading chat file {path}: {e}")
+                        continue
+            metrics.incr('watch.changes')
+            self._dispatch(self._apply_change, chat_id, chat, signature)
+
+    def _apply_change(self, chat_id, chat, signature):
+        """
+        Apply a chat changed by another process to the in-memory store
+        
+        Args:
+            chat_id (str): ID of the chat
+            chat (dict): Chat as read from disk, None if its file was removed
+            signature (tuple): Version of the file the chat was read from
+        """
+        if self.persister.has_pending(chat_id) or chat_id in self._merging:
+            # This instance has unsaved changes, the write merges both versions
+            return
+
+        if chat is None:
+            self._file_signatures.pop(chat_id, None)
+            self._synced_counts.pop(chat_id, None)
+            if chat_id not in self.chats:
+                return
+            del self.chats[chat_id]
+            self._index.remove(chat_id)
+        else:
+            self._file_signatures[chat_id] = signature
+            self._synced_counts[chat_id] = len(chat.get('messages', []))
+            chat = self._compact(chat)
+            existing = self.chats.get(chat_id)
+            if existing is not None:
+                # Update in place, so every reference to the chat sees the change
+                existing.clear()
+                existing.update(chat)
+                chat = existing
+            else:
+                self.chats[chat_id] = chat
+            self._index.touch(chat)
+        self._paths.pop(chat_id, None)
+
+        for callback in self._change_listeners:
+            callback(chat_id, chat)
 
-    def list_chats(self):
+    def list_chats(self, offset=0, limit=None, filter=None):
         """
-        List all available chat sessions.
+        List chat sessions, most recently updated first.
+        
+        Args:
+            offset (int, optional): Matching chats to skip. Defaults to 0.
+            limit (int, optional): Maximum number of chats. Defaults to all.
+            filter (dict, optional): Restrict the listing with any of 'model' (model name),
+                'since' (updated at or after) and 'until' (updated before). Dates are
+                ISO strings, dates or datetimes.
         
         Returns:
             list: List of chat sessions sorted by last updated time
         """
-        return sorted(
-            list(self.chats.values()), 
-            key=lambda chat: chat.get('last_updated', chat.get('created_at')), 
-            reverse=True
+        filter = filter or {}
+        predicate = None
+        if filter.get('model'):
+            model = filter['model']
+            predicate = lambda chat_id: self.chats.get(chat_id, {}).get('model') == model
+
+        chat_ids = self._index.page(
+            offset, limit,
+            since=filter.get('since'),
+            until=filter.get('until'),
+            predicate=predicate
         )
+        return [self.chats[chat_id] for chat_id in chat_ids if chat_id in self.chats]
 
     def get_chat_by_id(self, chat_id):
         """
@@ -129,30 +539,241 @@ class ChatManager:
     def delete_chat(self, chat_id):
         """
         Delete a specific chat session.
+        The chat is moved to the archive and can be restored later.
         
         Args:
             chat_id (str): ID of the chat to delete
         """
-        if chat_id in self.chats:
+        self.delete_chats([chat_id])
+
+    def delete_chats(self, chat_ids):
+        """
+        Delete several chat sessions as one archive batch.
+        
+        Args:
+            chat_ids (iterable): IDs of the chats to delete
+        """
+        chats = [self.chats[chat_id] for chat_id in chat_ids if chat_id in self.chats]
+        if not chats:
+            return
+
+        # Archive first so a failure never loses a chat
+        self.archive.archive_chats([self._load_messages(chat) for chat in chats])
+
+        for chat in chats:
+            # Make sure a queued save can't bring the file back
+            self.persister.cancel(chat['id'])
+
             # Remove from memory
-            del self.chats[chat_id]
+            del self.chats[chat['id']]
+            self._index.remove(chat['id'])
+            self._paths.pop(chat['id'], None)
             
             # Remove from file system
-            chat_file = os.path.join(self.chats_dir, f"{chat_id}.json")
-            if os.path.exists(chat_file):
-                os.remove(chat_file)
+            storage.remove_chat_files(self.chats_dir, chat['id'])
+            self._file_signatures.pop(chat['id'], None)
+            self._synced_counts.pop(chat['id'], None)
+            self._sources.pop(chat['id'], None)
+            self.contexts.remove(chat['id'])
 
-    def get_chat_messages(self, chat):
+    def clear_all_chats(self):
         """
-        Get messages from a chat session.
+        Delete every chat session in a single archive batch.
+        """
+        self.delete_chats(list(self.chats))
+
+    def restore_chat(self, chat_id):
+        """
+        Restore a deleted chat from the archive.
+        
+        Args:
+            chat_id (str): ID of the chat to restore
+        
+        Returns:
+            dict: Restored chat session or None if not archived
+        """
+        chat = self.archive.restore_chat(chat_id)
+        if chat is not None:
+            self.chats[chat_id] = self._compact(chat)
+            self.save_chat(chat)
+        return chat
+
+    def get_chat_messages(self, chat, offset=0, limit=None, reverse=False):
+        """
+        Get the messages of a chat session's active branch, or a window of them.
+        Only the messages returned are read from disk for long chats.
         
         Args:
             chat (dict): Chat session to retrieve messages from
+            offset (int, optional): Messages to skip. Defaults to 0.
+            limit (int, optional): Maximum number of messages. Defaults to all.
+            reverse (bool, optional): Count from the head of the branch and return the
+                most recent message first, to page backwards. Defaults to False.
+        
+        Returns:
+            list: List of messages from the first one to the head of the branch,
+                or from the head back when reverse is set
+        """
+        messages = chat.get('messages', [])
+        path = self.get_active_path(chat)
+        if reverse:
+            path = path[::-1]
+        stop = None if limit is None else offset + limit
+        return [messages[index] for index in path[offset:stop]]
+
+    def _context_key(self, chat, path):
+        """Identify the history a context encodes: model, length, last message and its digest"""
+        message = chat['messages'][path[-1]]
+        content = f"{message['role']}\0{message['content']}".encode('utf-8', 'surrogatepass')
+        return {
+            'model': chat.get('model'),
+            'length': len(path),
+            'head': path[-1],
+            'digest': hashlib.sha1(content).hexdigest(),
+        }
+
+    def get_context(self, chat):
+        """
+        Get the Ollama context of the history a reply to the head's message extends,
+        i.e. the active branch without its last message.
+        
+        Args:
+            chat (dict): Chat session whose active branch ends with a new user message
         
         Returns:
-            list: List of messages in the chat
+            array: Context tokens, None if the model or the history changed since
+                the context was stored
+        """
+        path = self.get_active_path(chat)
+        if len(path) < 2:
+            return None
+        return self.contexts.get(chat['id'], self._context_key(chat, path[:-1]))
+
+    def set_context(self, chat, tokens):
+        """
+        Store the Ollama context returned with the reply at the head of the active branch
+        
+        Args:
+            chat (dict): Chat session
+            tokens (iterable): Context tokens, None to drop the chat's context
+        """
+        path = self.get_active_path(chat)
+        if tokens is None or not path:
+            self.contexts.remove(chat['id'])
+            return
+        self.contexts.set(chat['id'], self._context_key(chat, path), tokens)
+
+    def _head(self, chat):
+        """Return the index of the active branch's last message, -1 for an empty chat"""
+        head = chat.get('head')
+        count = len(chat.get('messages', []))
+        return head if head is not None and 0 <= head < count else count - 1
+
+    def get_active_path(self, chat):
+        """
+        Get the indices of the messages on a chat session's active branch.
+        The result is cached until the chat grows or switches branch.
+        
+        Args:
+            chat (dict): Chat session
+        
+        Returns:
+            list: Message indices from the first message to the head
+        """
+        key = (len(chat.get('messages', [])), self._head(chat))
+        cached = self._paths.get(chat['id'])
+        if cached is None or cached[0] != key:
+            cached = (key, active_path(chat.get('messages', []), key[1]))
+            self._paths[chat['id']] = cached
+        return cached[1]
+
+    def get_parent(self, chat, index):
+        """
+        Get the index of a message's parent.
+        
+        Args:
+            chat (dict): Chat session
+            index (int): Message index
+        
+        Returns:
+            int: Parent index, -1 for a first message
+        """
+        return parent_index(chat['messages'], index)
+
+    def get_siblings(self, chat, index):
+        """
+        Get the alternatives of a message: every message with the same parent.
+        
+        Args:
+            chat (dict): Chat session
+            index (int): Message index
+        
+        Returns:
+            list: Indices of the sibling messages, including the message, oldest first
+        """
+        messages = chat['messages']
+        return children_map(messages)[parent_index(messages, index)]
+
+    def get_branch_choices(self, chat):
+        """
+        Get the messages of the active branch that have alternatives.
+        
+        Args:
+            chat (dict): Chat session
+        
+        Returns:
+            dict: Message index to the indices of its siblings, including itself
+        """
+        messages = chat.get('messages', [])
+        children = children_map(messages)
+        choices = {}
+        for index in self.get_active_path(chat):
+            siblings = children[parent_index(messages, index)]
+            if len(siblings) > 1:
+                choices[index] = siblings
+        return choices
+
+    def set_head(self, chat, index):
+        """
+        Make a message the end of the active branch.
+        Messages after it are kept and can be switched back to.
+        
+        Args:
+            chat (dict): Chat session
+            index (int): Index of the new head, -1 for an empty branch
+        """
+        if index == len(chat['messages']) - 1:
+            chat.pop('head', None)
+        else:
+            chat['head'] = index
+        self.save_chat(chat)
+
+    def set_profile(self, chat, profile):
+        """
+        Choose the performance profile of a chat's generations
+        
+        Args:
+            chat (dict): Chat session
+            profile (str): Profile name, None for the default profile
+        """
+        if profile:
+            chat['profile'] = profile
+        else:
+            chat.pop('profile', None)
+        self.save_chat(chat)
+
+    def switch_branch(self, chat, index):
+        """
+        Activate the branch going through a message, down to its most recent leaf.
+        
+        Args:
+            chat (dict): Chat session
+            index (int): Message on the branch to activate
         """
-        return chat.get('messages', [])
+        children = children_map(chat['messages'])
+        while index in children:
+            index = children[index][-1]
+        self.set_head(chat, index)
 
     def process_responses(self, callback):
         """
@@ -0,0 +1,410 @@
+import sys
+import bisect
+import threading
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+
+# Timestamps are kept as integer microseconds since this (naive) epoch,
+# which round-trips the naive ISO strings stored in chat files exactly
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+_CORE_KEYS = frozenset(('role', 'content', 'timestamp'))
+
+
+def datetime_to_int(value):
+    """
+    Convert a datetime to integer microseconds
+
+    Args:
+        value (datetime): Naive datetime; aware ones, e.g. from imported
+            bundles, are converted to naive UTC
+
+    Returns:
+        int: Microseconds since 1970-01-01
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def timestamp_to_int(value):
+    """
+    Convert an ISO timestamp string to integer microseconds
+
+    Args:
+        value (str): ISO timestamp, or None
+
+    Returns:
+        int: Microseconds since 1970-01-01, or None
+    """
+    if value is None:
+        return None
+    return datetime_to_int(datetime.fromisoformat(value))
+
+
+def int_to_timestamp(value):
+    """
+    Convert integer microseconds back to an ISO timestamp string
+
+    Args:
+        value (int): Microseconds since 1970-01-01, or None
+
+    Returns:
+        str: Naive ISO timestamp, or None
+    """
+    if value is None:
+        return None
+    return (_EPOCH + value * _MICROSECOND).isoformat()
+
+
+class Message(Mapping):
+    """
+    Compact chat message.
+
+    Roles are interned, the timestamp is an integer and any other field
+    lives in an optional ``extra`` dict. The message behaves like the
+    ``{'role', 'content', 'timestamp'}`` dict it replaces.
+    ``formatted`` caches the form a prompt adapter produced for the message.
+    """
+
+    __slots__ = ('role', 'content', 'ts', 'extra', 'formatted')
+
+    def __init__(self, role, content, ts=None, extra=None):
+        """
+        Initialize a message
+
+        Args:
+            role (str): Message role ('user', 'assistant' or 'system')
+            content (str): Message content
+            ts (int, optional): Timestamp in microseconds since 1970-01-01
+            extra (dict, optional): Additional fields
+        """
+        self.role = sys.intern(role)
+        self.content = content
+        self.ts = ts
+        self.extra = extra or None
+        self.formatted = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a message from its dict form"""
+        if isinstance(data, Message):
+            return data
+        timestamp = data.get('timestamp')
+        extra = None
+        # Most messages only have the core fields
+        extra_keys = data.keys() - _CORE_KEYS
+        if extra_keys:
+            # Keep the file's key order, so rewriting a chat doesn't shuffle it
+            extra = {sys.intern(key): value for key, value in data.items() if key in extra_keys}
+        return cls(
+            data['role'],
+            data.get('content', ''),
+            datetime_to_int(datetime.fromisoformat(timestamp)) if timestamp is not None else None,
+            extra
+        )
+
+    @property
+    def timestamp(self):
+        """ISO timestamp string, as stored in chat files"""
+        return int_to_timestamp(self.ts)
+
+    def to_dict(self):
+        """Return the message as a plain dict"""
+        data = {'role': self.role, 'content': self.content}
+        if self.ts is not None:
+            data['timestamp'] = self.timestamp
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __getitem__(self, key):
+        if key == 'role':
+            return self.role
+        if key == 'content':
+            return self.content
+        if key == 'timestamp':
+            if self.ts is None:
+                raise KeyError(key)
+            return self.timestamp
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'role':
+            self.role = sys.intern(value)
+            self.formatted = None
+        elif key == 'content':
+            self.content = value
+            self.formatted = None
+        elif key == 'timestamp':
+            self.ts = timestamp_to_int(value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[sys.intern(key)] = value
+
+    def __iter__(self):
+        yield 'role'
+        yield 'content'
+        if self.ts is not None:
+            yield 'timestamp'
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return 2 + (self.ts is not None) + (len(self.extra) if self.extra else 0)
+
+    def __repr__(self):
+        return f"Message({self.to_dict()!r})"
+
+
+class MessageList(list):
+    """
+    List of Message objects that converts dicts on the way in
+    """
+
+    def __init__(self, messages=()):
+        super().__init__(Message.from_dict(message) for message in messages)
+
+    def append(self, message):
+        super().append(Message.from_dict(message))
+
+    def extend(self, messages):
+        super().extend(Message.from_dict(message) for message in messages)
+
+    def insert(self, index, message):
+        super().insert(index, Message.from_dict(message))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            super().__setitem__(index, [Message.from_dict(message) for message in value])
+        else:
+            super().__setitem__(index, Message.from_dict(value))
+
+
+class PagedMessageList(MessageList):
+    """
+    Messages of a chat read from its file on demand, one block at a time.
+
+    The list has the chat's full length, but a block of messages is only
+    parsed when one of its messages is first accessed; until then its slots
+    hold None. Opening a long chat therefore reads the blocks of the last
+    messages only, and older blocks are read as they are reached. Iterating
+    or changing the order of the list reads every block first, so code
+    written for MessageList keeps working.
+    """
+
+    def __init__(self, count, blocks, read_block, parents=None):
+        """
+        Initialize the list with no message read
+
+        Args:
+            count (int): Number of messages
+            blocks (list): (first message index, message count) per block
+            read_block (callable): Called with a block position, returns the block's messages
+            parents (dict, optional): Explicit parent of each message that has one, by index
+        """
+        super().__init__()
+        list.extend(self, [None] * count)
+        self._blocks = list(blocks)
+        self._starts = [first for first, _ in self._blocks]
+        self._unread = set(range(len(self._blocks)))
+        self._read_block = read_block
+        self._parents = parents or {}
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """Whether every block was read"""
+        return not self._unread
+
+    def _read(self, block):
+        with self._lock:
+            if block not in self._unread:
+                return
+            first, count = self._blocks[block]
+            messages = [Message.from_dict(message) for message in self._read_block(block)]
+            if len(messages) != count:
+                raise ValueError(f"Expected {count} messages from block {block}, read {len(messages)}")
+            list.__setitem__(self, slice(first, first + count), messages)
+            self._unread.discard(block)
+
+    def _ensure(self, start, stop):
+        """Read the blocks holding the messages from start to stop (excluded)"""
+        if not self._unread or start >= stop:
+            return
+        first_block = max(bisect.bisect_right(self._starts, start) - 1, 0)
+        last_block = bisect.bisect_right(self._starts, stop - 1) - 1
+        for block in range(first_block, last_block + 1):
+            if block in self._unread:
+                self._read(block)
+
+    def load_all(self):
+        """Read every block not read yet"""
+        for block in sorted(self._unread):
+            self._read(block)
+
+    def copy(self):
+        """
+        Return a copy holding the messages read so far. Its unread blocks
+        are read through the same reader when the copy is accessed, so a
+        snapshot for a background writer costs no read on this thread.
+        """
+        with self._lock:
+            copy = PagedMessageList(0, self._blocks, self._read_block, self._parents)
+            list.extend(copy, list.__getitem__(self, slice(None)))
+            copy._unread = set(self._unread)
+        return copy
+
+    def explicit_parent(self, index):
+        """
+        Return the 'parent' field of a message without reading it
+
+        Args:
+            index (int): Message index
+
+        Returns:
+            int: Explicit parent index, None for a message following the previous one
+        """
+        message = list.__getitem__(self, index)
+        if message is None:
+            return self._parents.get(index)
+        return message.get('parent')
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self))
+            self._ensure(start, stop)
+        else:
+            position = index + len(self) if index < 0 else index
+            self._ensure(position, position + 1)
+        return super().__getitem__(index)
+
+    def __iter__(self):
+        self.load_all()
+        return super().__iter__()
+
+    def __reversed__(self):
+        # Most recent first, reading older blocks only when they are reached
+        for position in range(len(self) - 1, -1, -1):
+            yield self[position]
+
+    def __contains__(self, value):
+        self.load_all()
+        return super().__contains__(value)
+
+    def insert(self, index, message):
+        self.load_all()
+        super().insert(index, message)
+
+    def __setitem__(self, index, value):
+        self.load_all()
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index):
+        self.load_all()
+        super().__delitem__(index)
+
+    def pop(self, index=-1):
+        self.load_all()
+        return super().pop(index)
+
+
+def to_json(value):
+    """
+    ``default`` hook for json.dump that serializes messages
+
+    Args:
+        value: Object json could not serialize
+
+    Returns:
+        dict: Plain dict form of a Message
+    """
+    if isinstance(value, Message):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Conversations are trees stored as an append-only list of messages: a
+# message's index is its id and its parent is the previous message, unless
+# it carries an explicit 'parent' index (-1 for a root). Branches therefore
+# share their common prefix, and linear chats are stored exactly as before.
+# The chat's 'head' names the leaf of the active branch, the last message
+# when absent.
+
+def parent_index(messages, index):
+    """
+    Return the index of a message's parent
+
+    Args:
+        messages (list): Every message of the chat
+        index (int): Message index
+
+    Returns:
+        int: Parent index, -1 for a root message
+    """
+    explicit_parent = getattr(messages, 'explicit_parent', None)
+    if explicit_parent is not None:
+        # Paged lists know the tree without reading messages
+        parent = explicit_parent(index)
+    else:
+        parent = messages[index].get('parent')
+    # Only earlier messages can be parents, which also rules out cycles
+    if parent is None or not -1 <= parent < index:
+        return index - 1
+    return parent
+
+
+def active_path(messages, head=None):
+    """
+    Return the indices of the messages on a branch, from the root down
+
+    Args:
+        messages (list): Every message of the chat
+        head (int, optional): Leaf of the branch. Defaults to the last message.
+
+    Returns:
+        list: Message indices
+    """
+    if head is None or not 0 <= head < len(messages):
+        head = len(messages) - 1
+    path = []
+    index = head
+    while index >= 0:
+        path.append(index)
+        index = parent_index(messages, index)
+    path.reverse()
+    return path
+
+
+def children_map(messages):
+    """
+    Group message indices by parent
+
+    Args:
+        messages (list): Every message of the chat
+
+    Returns:
+        dict: Parent index (-1 for roots) to the indices of its children, oldest first
+    """
+    children = {}
+    for index in range(len(messages)):
+        children.setdefault(parent_index(messages, index), []).append(index)
+    return children
+
+
+def branch_messages(chat):
+    """
+    Return the messages of a chat's active branch
+
+    Args:
+        chat (dict): Chat session
+
+    Returns:
+        list: Messages from the root to the head
+    """
+    messages = chat.get('messages', [])
+    return [messages[index] for index in active_path(messages, chat.get('head'))]
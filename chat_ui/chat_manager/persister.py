@@ -0,0 +1,203 @@
+import time
+import atexit
+import threading
+
+from chat_ui.utils.metrics import metrics as default_metrics
+
+
+class ChatPersister:
+    """
+    Write-behind persistence for chats.
+
+    Saves are queued and written by a background thread. Repeated saves of
+    the same chat within the coalescing window collapse into one write of
+    the latest state. Pending writes are flushed on close and at interpreter
+    exit.
+    """
+
+    def __init__(self, write_func, coalesce_window=0.5, metrics=None):
+        """
+        Initialize the persister
+
+        Args:
+            write_func (callable): Function writing a chat snapshot to disk
+            coalesce_window (float, optional): Seconds a save waits for newer saves of the same chat.
+                Defaults to 0.5.
+            metrics (Metrics, optional): Metrics store for latency samples. Defaults to the shared one.
+        """
+        self.write_func = write_func
+        self.coalesce_window = coalesce_window
+        self.metrics = metrics or default_metrics
+
+        # chat_id -> (snapshot, due_time, enqueued_at)
+        self._pending = {}
+        self._condition = threading.Condition()
+        # Held for the duration of each file write
+        self._write_lock = threading.Lock()
+        self._in_flight = 0
+        # Chats taken by the writer and not written yet
+        self._writing = set()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _snapshot(chat):
+        """
+        Copy the parts of a chat that change after a save, so the writer
+        never serializes a list that is being appended to. Messages of long
+        chats still on disk are left for the writer to read.
+        """
+        snapshot = dict(chat)
+        if 'messages' in chat:
+            snapshot['messages'] = chat['messages'].copy()
+        return snapshot
+
+    def schedule(self, chat):
+        """
+        Queue a chat for writing
+
+        Args:
+            chat (dict): Chat session to save
+        """
+        snapshot = self._snapshot(chat)
+        now = time.monotonic()
+        with self._condition:
+            if self._closed:
+                # Late saves after shutdown are written synchronously
+                self._write(snapshot, now)
+                return
+            previous = self._pending.get(chat['id'])
+            if previous:
+                # Keep the original deadline so a busy chat is still written regularly
+                self._pending[chat['id']] = (snapshot, previous[1], previous[2])
+                self.metrics.incr('save.coalesced')
+            else:
+                self._pending[chat['id']] = (snapshot, now + self.coalesce_window, now)
+            self._condition.notify()
+
+    def cancel(self, chat_id):
+        """
+        Drop a pending save, waiting for an in-progress write to finish
+
+        Args:
+            chat_id (str): ID of the chat
+        """
+        with self._condition:
+            self._pending.pop(chat_id, None)
+            # A save already taken by the writer can't be dropped, let it land first
+            self._condition.wait_for(lambda: chat_id not in self._writing)
+
+    def has_pending(self, chat_id):
+        """
+        Whether a save of a chat is waiting or being written
+
+        Args:
+            chat_id (str): ID of the chat
+        """
+        with self._condition:
+            return chat_id in self._pending or chat_id in self._writing
+
+    def _write(self, snapshot, enqueued_at):
+        """Write one snapshot and record its latency"""
+        start = time.perf_counter()
+        try:
+            with self._write_lock:
+                self.write_func(snapshot)
+            self.metrics.incr('save.writes')
+        except Exception as e:
+            self.metrics.incr('save.errors')
+            print(f"Error saving chat {snapshot.get('id')}: {e}")
+        finally:
+            self.metrics.observe('save.write', time.perf_counter() - start)
+            self.metrics.observe('save.delay', time.monotonic() - enqueued_at)
+
+    def _take_due(self, flush_all=False):
+        """Pop the snapshots whose deadline has passed; caller holds the condition"""
+        now = time.monotonic()
+        due = [
+            chat_id for chat_id, (_, due_time, _) in self._pending.items()
+            if flush_all or due_time <= now
+        ]
+        return [self._pending.pop(chat_id) for chat_id in due]
+
+    def _worker(self):
+        """Background writer loop"""
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._pending:
+                        next_due = min(due_time for _, due_time, _ in self._pending.values())
+                        timeout = next_due - time.monotonic()
+                        if timeout <= 0:
+                            break
+                        self._condition.wait(timeout)
+                    else:
+                        self._condition.wait()
+                if self._closed and not self._pending:
+                    return
+                batch = self._take_due(flush_all=self._closed)
+                self._in_flight += len(batch)
+                self._writing.update(snapshot['id'] for snapshot, _, _ in batch)
+
+            for snapshot, _, enqueued_at in batch:
+                self._write(snapshot, enqueued_at)
+                with self._condition:
+                    self._in_flight -= 1
+                    self._writing.discard(snapshot['id'])
+                    self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Write every pending save now and wait for the writes to finish
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait
+
+        Returns:
+            bool: True if nothing is left pending
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            # Make everything due immediately
+            for chat_id, (snapshot, _, enqueued_at) in list(self._pending.items()):
+                self._pending[chat_id] = (snapshot, 0, enqueued_at)
+            self._condition.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self):
+        """Flush pending saves and stop the writer thread"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def pending_count(self):
+        """Return the number of chats waiting to be written"""
+        with self._condition:
+            return len(self._pending) + self._in_flight
+
+    def stats(self):
+        """
+        Report pending writes and write latency
+
+        Returns:
+            dict: pending, writes, coalesced, errors and latency summaries in milliseconds
+        """
+        return {
+            'pending': self.pending_count(),
+            'writes': self.metrics.counter('save.writes'),
+            'coalesced': self.metrics.counter('save.coalesced'),
+            'errors': self.metrics.counter('save.errors'),
+            'write': self.metrics.summary('save.write'),
+            'delay': self.metrics.summary('save.delay'),
+        }
@@ -0,0 +1,442 @@
+import os
+import json
+import gzip
+from contextlib import contextmanager
+
+from chat_ui.chat_manager.messages import to_json
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Advisory locking is only available on POSIX systems
+    fcntl = None
+
+# Chats whose JSON is larger than this are stored compressed
+DEFAULT_COMPRESS_THRESHOLD = 256 * 1024
+
+PLAIN_SUFFIX = '.json'
+GZIP_SUFFIX = '.json.gz'
+ZSTD_SUFFIX = '.json.zst'
+CHAT_SUFFIXES = (ZSTD_SUFFIX, GZIP_SUFFIX, PLAIN_SUFFIX)
+
+# Advisory lock shared by every process writing to a chats directory
+LOCK_FILENAME = '.lock'
+
+# Sidecar file locating a chat's messages inside its file, see write_chat_file
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+# Messages are written in blocks of about this many bytes, the unit read through the index
+INDEX_BLOCK_BYTES = 64 * 1024
+
+
+@contextmanager
+def directory_lock(chats_dir, shared=False):
+    """
+    Hold the advisory lock of a chats directory, so that processes sharing
+    it never write chat files at the same time. Without fcntl this does nothing.
+
+    Args:
+        chats_dir (str): Chats directory
+        shared (bool, optional): Take the lock for reading only. Defaults to False.
+    """
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(os.path.join(chats_dir, LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+def file_signature(path):
+    """
+    Identify the current version of a file.
+    Chat files are replaced on write, so a new version has a new inode.
+
+    Returns:
+        tuple: (inode, modification time in ns, size), None if the file is missing
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def chat_id_from_filename(filename):
+    """
+    Extract the chat id from a chat file name
+
+    Args:
+        filename (str): File name such as '<id>.json' or '<id>.json.gz'
+
+    Returns:
+        str: Chat id, or None if the file is not a chat file
+    """
+    for suffix in CHAT_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return None
+
+
+def chat_file_candidates(chats_dir, chat_id):
+    """Return every path a chat may be stored under, compressed or not"""
+    return [os.path.join(chats_dir, f"{chat_id}{suffix}") for suffix in CHAT_SUFFIXES]
+
+
+def find_chat_file(chats_dir, chat_id):
+    """
+    Find the file a chat is currently stored in
+
+    Args:
+        chats_dir (str): Chats directory
+        chat_id (str): ID of the chat
+
+    Returns:
+        str: Path of the chat file, or None if it does not exist
+    """
+    for path in chat_file_candidates(chats_dir, chat_id):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _chat_chunks(chat, compact):
+    """
+    Serialize a chat as a header, blocks of messages and a footer.
+
+    The chunks concatenate to the chat's JSON with 'messages' moved last,
+    formatted as json.dumps would. Each block holds whole messages, so it
+    can be parsed on its own once its leading separator is stripped.
+
+    Args:
+        chat (dict): Chat session
+        compact (bool): Leave out indentation
+
+    Returns:
+        tuple: (header, list of (first message index, message count, text), footer)
+    """
+    meta = {key: value for key, value in chat.items() if key != 'messages'}
+    messages = chat.get('messages', [])
+    if compact:
+        dump = lambda value: json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=to_json)
+        header = dump(meta)[:-1] + (',' if meta else '') + '"messages":['
+        pieces = [dump(message) for message in messages]
+        first_separator, separator, footer = '', ',', ']}'
+    else:
+        dump = lambda value: json.dumps(value, ensure_ascii=False, indent=4, default=to_json)
+        header = dump(meta)[:-2] + (',\n' if meta else '{\n') + '    "messages": ['
+        # Strings never contain raw newlines, so this only re-indents the structure
+        pieces = ['        ' + dump(message).replace('\n', '\n        ') for message in messages]
+        first_separator, separator = '\n', ',\n'
+        footer = '\n    ]\n}' if pieces else ']\n}'
+
+    blocks = []
+    first = 0
+    size = 0
+    for position, piece in enumerate(pieces):
+        size += len(piece)
+        if size >= INDEX_BLOCK_BYTES or position == len(pieces) - 1:
+            text = (separator if blocks else first_separator) + separator.join(pieces[first:position + 1])
+            blocks.append((first, position + 1 - first, text))
+            first = position + 1
+            size = 0
+    return header, blocks, footer
+
+
+def _compress(suffix, data):
+    if suffix == ZSTD_SUFFIX:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if suffix == GZIP_SUFFIX:
+        return gzip.compress(data, compresslevel=6)
+    return data
+
+
+def _decompress(path, data):
+    """Decompress bytes read from a chat file according to its suffix"""
+    if path.endswith(ZSTD_SUFFIX):
+        if zstandard is None:
+            raise ValueError("zstandard is required to read zstd-compressed chats")
+        # Indexed files hold one frame per block
+        with zstandard.ZstdDecompressor().stream_reader(data, read_across_frames=True) as reader:
+            return reader.read()
+    if path.endswith(GZIP_SUFFIX):
+        # Members are decompressed one after the other
+        return gzip.decompress(data)
+    return data
+
+
+def encode_chat_indexed(chat, compress_threshold=DEFAULT_COMPRESS_THRESHOLD):
+    """
+    Serialize a chat like encode_chat, along with the offset index of its messages.
+
+    Compressed chats are written as one gzip member or zstd frame per block,
+    which still decompress as a whole, so a block can also be decompressed
+    alone once its offset is known.
+
+    Args:
+        chat (dict): Chat session
+        compress_threshold (int, optional): Size in bytes above which the chat is compressed.
+            None disables compression.
+
+    Returns:
+        tuple: (file suffix, encoded bytes, index)
+    """
+    header, blocks, footer = _chat_chunks(chat, compact=False)
+    chunks = [header] + [text for _, _, text in blocks] + [footer]
+    encoded = [chunk.encode('utf-8') for chunk in chunks]
+    suffix = PLAIN_SUFFIX
+    if compress_threshold is not None and sum(len(chunk) for chunk in encoded) > compress_threshold:
+        # Indentation only costs CPU once the file is compressed anyway
+        header, blocks, footer = _chat_chunks(chat, compact=True)
+        chunks = [header] + [text for _, _, text in blocks] + [footer]
+        suffix = ZSTD_SUFFIX if zstandard is not None else GZIP_SUFFIX
+        encoded = [_compress(suffix, chunk.encode('utf-8')) for chunk in chunks]
+
+    offsets = [0]
+    for chunk in encoded:
+        offsets.append(offsets[-1] + len(chunk))
+    index = {
+        'version': INDEX_VERSION,
+        'count': len(chat.get('messages', [])),
+        'header': [0, offsets[1]],
+        'blocks': [
+            [offsets[position + 1], len(encoded[position + 1]), first, count]
+            for position, (first, count, _) in enumerate(blocks)
+        ],
+        # Reading the tree structure then needs no message
+        'parents': {
+            str(position): message['parent']
+            for position, message in enumerate(chat.get('messages', []))
+            if message.get('parent') is not None
+        },
+    }
+    return suffix, b''.join(encoded), index
+
+
+def encode_chat(chat, compress_threshold=DEFAULT_COMPRESS_THRESHOLD):
+    """
+    Serialize a chat, compressing it when it is larger than the threshold
+
+    Args:
+        chat (dict): Chat session
+        compress_threshold (int, optional): Size in bytes above which the chat is compressed.
+            None disables compression.
+
+    Returns:
+        tuple: (file suffix, encoded bytes)
+    """
+    suffix, data, _ = encode_chat_indexed(chat, compress_threshold)
+    return suffix, data
+
+
+def decode_chat(path, data):
+    """
+    Deserialize a chat file's bytes according to its suffix
+
+    Args:
+        path (str): Path the bytes were read from
+        data (bytes): Raw file content
+
+    Returns:
+        dict: Chat session
+    """
+    return json.loads(_decompress(path, data).decode('utf-8'))
+
+
+def read_chat_file(path):
+    """
+    Read a chat file, transparently decompressing it
+
+    Args:
+        path (str): Path of the chat file
+
+    Returns:
+        dict: Chat session
+    """
+    with open(path, 'rb') as f:
+        return decode_chat(path, f.read())
+
+
+def index_file(chat_file):
+    """Return the path of a chat file's offset index"""
+    directory, filename = os.path.split(chat_file)
+    return os.path.join(directory, f"{chat_id_from_filename(filename)}{INDEX_SUFFIX}")
+
+
+def read_chat_index(path):
+    """
+    Read the offset index of a chat file
+
+    Args:
+        path (str): Path of the chat file
+
+    Returns:
+        dict: Index, None if it is missing or was written for another version of the file
+    """
+    try:
+        with open(index_file(path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != INDEX_VERSION or tuple(index.get('file') or ()) != file_signature(path):
+        return None
+    return index
+
+
+def _read_chunk(f, path, offset, length):
+    f.seek(offset)
+    return _decompress(path, f.read(length)).decode('utf-8')
+
+
+def _check_version(f, index):
+    """Make sure an open chat file is the version its index describes"""
+    stat = os.fstat(f.fileno())
+    if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != tuple(index['file']):
+        raise ValueError("Chat file changed since its index was read")
+
+
+def read_chat_header(path, index):
+    """
+    Read a chat's fields other than its messages, through its index
+
+    Args:
+        path (str): Path of the chat file
+        index (dict): Index from read_chat_index
+
+    Returns:
+        dict: Chat session with an empty message list
+    """
+    with open(path, 'rb') as f:
+        _check_version(f, index)
+        header = _read_chunk(f, path, *index['header'])
+    return json.loads(header + ']}')
+
+
+def read_messages(path, index, start, stop):
+    """
+    Read a range of a chat's messages, through its index. Only the blocks
+    holding the range are read, so the range needn't match the blocks of
+    the version of the file it was first read from.
+
+    Args:
+        path (str): Path of the chat file
+        index (dict): Index from read_chat_index
+        start (int): Index of the first message
+        stop (int): Index after the last message
+
+    Returns:
+        list: Messages as dicts
+
+    Raises:
+        ValueError: The file is no longer the version the index describes,
+            or holds fewer messages than requested
+    """
+    blocks = [block for block in index['blocks'] if block[2] < stop and block[2] + block[3] > start]
+    messages = []
+    with open(path, 'rb') as f:
+        _check_version(f, index)
+        for offset, length, _, _ in blocks:
+            text = _read_chunk(f, path, offset, length)
+            messages.extend(json.loads('[' + text.strip(' ,\n') + ']'))
+    first = blocks[0][2] if blocks else start
+    messages = messages[start - first:stop - first]
+    if len(messages) != stop - start:
+        raise ValueError(f"Expected {stop - start} messages from {path}, read {len(messages)}")
+    return messages
+
+
+def write_chat_file(chats_dir, chat, compress_threshold=DEFAULT_COMPRESS_THRESHOLD, fsync=True,
+                    lock=True):
+    """
+    Write a chat in the format its size calls for and remove any copy
+    left in another format. The file is written to a temporary name and
+    renamed over the old one, so a crash never leaves a truncated chat.
+
+    Args:
+        chats_dir (str): Chats directory
+        chat (dict): Chat session to save
+        compress_threshold (int, optional): Size in bytes above which the chat is compressed
+        fsync (bool, optional): Flush the file to disk before renaming it. Defaults to True.
+        lock (bool, optional): Take the directory lock. Callers already holding it
+            pass False. Defaults to True.
+
+    Returns:
+        str: Path the chat was written to
+    """
+    if lock:
+        with directory_lock(chats_dir):
+            return write_chat_file(chats_dir, chat, compress_threshold, fsync, lock=False)
+
+    suffix, data, index = encode_chat_indexed(chat, compress_threshold)
+    chat_file = os.path.join(chats_dir, f"{chat['id']}{suffix}")
+
+    tmp_file = f"{chat_file}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_file, chat_file)
+
+    for stale_file in chat_file_candidates(chats_dir, chat['id']):
+        if stale_file != chat_file and os.path.exists(stale_file):
+            os.remove(stale_file)
+
+    write_chat_index(chat_file, index)
+    return chat_file
+
+
+def fsync_directory(path):
+    """
+    Flush a directory's entries to disk, so files renamed into it survive a
+    crash. Systems that can't open a directory, such as Windows, are skipped.
+
+    Args:
+        path (str): Directory
+    """
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_chat_index(chat_file, index):
+    """
+    Write the offset index of a chat file. The index records the version of
+    the file it describes, so an index left behind by a crash or by a tool
+    unaware of it is ignored rather than trusted.
+
+    Args:
+        chat_file (str): Path of the chat file, already written
+        index (dict): Index from encode_chat_indexed
+    """
+    path = index_file(chat_file)
+    tmp_file = f"{path}.tmp"
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(dict(index, file=file_signature(chat_file)), f)
+        os.replace(tmp_file, path)
+    except OSError as e:
+        # The index only speeds up reading, the chat file is complete without it
+        print(f"Error writing index of {chat_file}: {e}")
+
+
+def remove_chat_files(chats_dir, chat_id, lock=True):
+    """Remove every stored copy of a chat, under the directory lock unless lock is False"""
+    if lock:
+        with directory_lock(chats_dir):
+            return remove_chat_files(chats_dir, chat_id, lock=False)
+    for path in chat_file_candidates(chats_dir, chat_id) + [os.path.join(chats_dir, f"{chat_id}{INDEX_SUFFIX}")]:
+        if os.path.exists(path):
+            os.remove(path)
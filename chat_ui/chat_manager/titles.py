@@ -0,0 +1,204 @@
+import re
+import time
+import threading
+
+from models import OllamaModelHandler, ModelChatThread, deadlines_for, stream_with_deadlines
+
+TITLE_MAX_LENGTH = 60
+# Leading messages looked at to queue a chat and to describe it to the title model
+TITLE_EXCERPT_MESSAGES = 4
+
+
+class TitlingPreempted(Exception):
+    """An interactive generation started while titles were being generated"""
+
+
+def fallback_title(chat):
+    """
+    Build a title from the first user message
+
+    Args:
+        chat (dict): Chat session
+
+    Returns:
+        str: Title, or None if the chat has no user message
+    """
+    for msg in chat.get('messages', []):
+        if msg['role'] == 'user' and msg['content'].strip():
+            text = ' '.join(msg['content'].split())
+            return text if len(text) <= TITLE_MAX_LENGTH else text[:TITLE_MAX_LENGTH - 3] + '...'
+    return None
+
+
+class TitleService:
+    """
+    Background titling of new chats.
+
+    Chats are queued after their first exchange and titled in batches by a
+    small model. The worker only talks to the model while no interactive
+    generation is running, and abandons the batch as soon as one starts;
+    the batch is queued again for the next idle moment.
+
+    The worker never touches the chats: queued chats are described by an
+    excerpt taken when they are queued, and titles are applied through the
+    dispatcher, on the thread owning the chat manager.
+    """
+
+    def __init__(self, chat_manager, title_model=None, on_title=None, batch_delay=2.0, max_batch=8,
+                 dispatch=None):
+        """
+        Initialize the title service
+
+        Args:
+            chat_manager (ChatManager): Store used to persist titles
+            title_model (str, optional): Model used for titles. Defaults to the smallest installed model.
+            on_title (callable, optional): Called as on_title(chat_id, title) once a title is saved,
+                on the thread of the dispatcher
+            batch_delay (float, optional): Seconds to wait for more chats before titling. Defaults to 2.0.
+            max_batch (int, optional): Chats titled by a single request. Defaults to 8.
+            dispatch (callable, optional): Runs a function with its arguments on the thread
+                owning the chats, e.g. the UI thread. Defaults to calling it from the
+                worker thread.
+        """
+        self.chat_manager = chat_manager
+        self.title_model = title_model
+        self.on_title = on_title
+        self.dispatch = dispatch or (lambda func, *args: func(*args))
+        self.batch_delay = batch_delay
+        self.max_batch = max_batch
+
+        # (chat_id, excerpt) of the chats waiting for a title, oldest first
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def request_title(self, chat):
+        """
+        Queue a chat for titling if it has no title yet
+
+        Args:
+            chat (dict): Chat session
+        """
+        if chat.get('title'):
+            return
+        # Only the first messages are read, long chats may not be fully loaded
+        head = chat.get('messages', [])[:TITLE_EXCERPT_MESSAGES]
+        if not any(msg['role'] == 'assistant' for msg in head):
+            return
+        excerpt = [{'role': msg['role'], 'content': msg['content']} for msg in head]
+        with self._condition:
+            if all(chat_id != chat['id'] for chat_id, _ in self._pending):
+                self._pending.append((chat['id'], excerpt))
+                self._condition.notify()
+
+    def _next_batch(self):
+        """Wait for pending chats and an idle model, then take a batch"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending)
+        # Give other chats a chance to join the batch
+        time.sleep(self.batch_delay)
+        ModelChatThread.wait_until_idle()
+        with self._condition:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+        return batch
+
+    def _build_prompt(self, chats):
+        """Ask for one numbered title per conversation, given their excerpts"""
+        parts = [
+            "Write a short title (at most 6 words) for each conversation below. "
+            "Answer with one line per conversation, formatted as '<number>. <title>', "
+            "and nothing else."
+        ]
+        for number, messages in enumerate(chats, start=1):
+            excerpt = []
+            for msg in messages[:2]:
+                excerpt.append(f"{msg['role']}: {msg['content'][:500]}")
+            parts.append(f"Conversation {number}:\n" + "\n".join(excerpt))
+        return "\n\n".join(parts)
+
+    def _generate_titles(self, chats):
+        """
+        Ask the title model for a batch of titles
+
+        Args:
+            chats (list): Excerpt of each chat, as built by request_title
+
+        Returns:
+            dict: Title per position in the batch (1-based)
+
+        Raises:
+            TitlingPreempted: An interactive generation started meanwhile
+            GenerationTimeout: The model missed one of its deadlines
+        """
+        model = self.title_model or OllamaModelHandler.get_smallest_model()
+        if not model:
+            return {}
+
+        response = ""
+        prompt = [{'role': 'user', 'content': self._build_prompt(chats)}]
+        # A stalled host would otherwise hold up every later title
+        stream = stream_with_deadlines(
+            lambda: OllamaModelHandler.stream_chat(
+                model, prompt, options={'temperature': 0.2, 'num_predict': 32 * len(chats)}
+            ),
+            deadlines_for(model)
+        )
+        try:
+            for chunk in stream:
+                # Leave the model to the user's generation
+                if ModelChatThread.active_generations():
+                    raise TitlingPreempted()
+                if chunk['done']:
+                    break
+                response += chunk.get('message', {}).get('content', '')
+        finally:
+            # Closing the stream drops the connection of an abandoned request
+            stream.close()
+
+        # Reasoning models think out loud before answering
+        response = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL)
+
+        titles = {}
+        for line in response.splitlines():
+            match = re.match(r'\s*(\d+)[.)]\s*(.+)', line)
+            if match:
+                title = match.group(2).strip().strip('"*#').strip()
+                if title:
+                    titles[int(match.group(1))] = title[:TITLE_MAX_LENGTH]
+        return titles
+
+    def _apply_title(self, chat_id, title):
+        """Save a generated title; runs on the dispatcher's thread"""
+        chat = self.chat_manager.get_chat_by_id(chat_id)
+        # The user may have titled or deleted the chat meanwhile
+        if chat is None or chat.get('title'):
+            return
+        chat['title'] = title
+        self.chat_manager.save_chat(chat)
+        if self.on_title:
+            self.on_title(chat_id, title)
+
+    def _worker(self):
+        """Title queued chats in batches"""
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            try:
+                titles = self._generate_titles([excerpt for _, excerpt in batch])
+            except TitlingPreempted:
+                with self._condition:
+                    queued = {chat_id for chat_id, _ in self._pending}
+                    self._pending[:0] = [entry for entry in batch if entry[0] not in queued]
+                continue
+            except Exception as e:
+                print(f"Error generating chat titles: {e}")
+                titles = {}
+
+            for number, (chat_id, excerpt) in enumerate(batch, start=1):
+                title = titles.get(number) or fallback_title({'messages': excerpt})
+                if title:
+                    self.dispatch(self._apply_title, chat_id, title)
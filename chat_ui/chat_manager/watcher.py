@@ -0,0 +1,128 @@
+import os
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+# inotify event flags, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Chat files are written to a temporary name and renamed, or written in place by older tools
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    """Return libc with the inotify functions, None where inotify is unavailable"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class DirectoryWatcher:
+    """
+    Reports the files changed in a directory, using Linux inotify through ctypes.
+
+    Events are read by a daemon thread and reported in batches: the callback
+    gets the set of file names touched since the last read, or None when the
+    kernel queue overflowed and events were lost.
+    """
+
+    def __init__(self, path, callback, poll_interval=1.0):
+        """
+        Initialize the watcher
+
+        Args:
+            path (str): Directory to watch
+            callback (callable): Called from the watcher thread with a set of file names, or None
+            poll_interval (float, optional): Seconds between checks for stop(). Defaults to 1.
+        """
+        self.path = path
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self._fd = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """
+        Start watching
+
+        Returns:
+            bool: False if inotify is not available on this system
+        """
+        libc = _load_libc()
+        if libc is None:
+            return False
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return False
+        if libc.inotify_add_watch(fd, os.fsencode(self.path), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            print(f"Error watching {self.path}: {os.strerror(errno)}")
+            return False
+
+        self._fd = fd
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Stop watching, waiting for the watcher thread to exit"""
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _read_events(self):
+        """Read the pending events, returning the names touched or None on overflow"""
+        names = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif name:
+                    names.add(os.fsdecode(name))
+        return None if overflow else names
+
+    def _worker(self):
+        """Watcher thread loop"""
+        try:
+            while not self._stop_event.is_set():
+                ready, _, _ = select.select([self._fd], [], [], self.poll_interval)
+                if not ready:
+                    continue
+                names = self._read_events()
+                if names is None or names:
+                    try:
+                        self.callback(names)
+                    except Exception as e:
+                        print(f"Error applying changes of {self.path}: {e}")
+        finally:
+            os.close(self._fd)
+            self._fd = None
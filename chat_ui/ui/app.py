@@ -7,11 +7,21 @@ from tkinter import filedialog
 
 from chat_ui.utils.markdown_parser import MarkdownParser
 from chat_ui.chat_manager.manager import ChatManager
+from chat_ui.chat_manager.titles import TitleService
 from chat_ui.ui.message_display import MessageDisplay
 from chat_ui.ui.input_handler import InputHandler
 from chat_ui.ui.chat_list import ChatListManager
-
-from models import OllamaModelHandler, ModelChatThread
+from chat_ui.ui.prefill import PrefillManager
+from chat_ui.ui.outbox import Outbox
+from chat_ui.ui.render_cache import RenderCache
+from chat_ui.utils.images import image_encoder, is_image
+from chat_ui.utils.metrics import metrics
+from chat_ui.utils import profiling
+from chat_ui.utils.settings import settings
+
+from models import OllamaModelHandler, ModelChatThread, profile_names
+from model_registry import registry
+from endpoint_pool import pool
 from ui_components import ChatListItem, ConfirmationDialog, MessageBox
 
 class OllamaChatApp:
@@ -31,6 +41,13 @@ class OllamaChatApp:
         self.current_chat = None
         self.response_queue = queue.Queue()
 
+        # Opt-in prompt cache warm-up while typing
+        self.prefill = PrefillManager(
+            self,
+            enabled=settings['prefill']['enabled'],
+            debounce_ms=settings['prefill']['debounce_ms']
+        )
+
         # Initialize UI components
         self._setup_main_layout()
         self._setup_sidebar()
@@ -38,20 +55,65 @@ class OllamaChatApp:
         self._setup_input_area()
 
         # Additional setup
-        self.message_display = MessageDisplay(self.chat_text)
+        display_settings = settings['display']
+        self.message_display = MessageDisplay(
+            self.chat_text,
+            on_action=self.on_message_action,
+            chunk_threshold=display_settings['chunk_threshold'],
+            chunk_chars=display_settings['chunk_chars'],
+            collapse_lines=display_settings['collapse_lines'],
+            preview_lines=display_settings['preview_lines'],
+            max_messages=display_settings['max_messages'],
+            page_messages=display_settings['page_messages'],
+            on_load_earlier=self.refresh_messages
+        )
+        # Chats likely to be opened next are rendered ahead of time
+        self.render_cache = RenderCache(
+            os.path.join(self.chat_manager.chats_dir, 'render_cache'),
+            self.message_display.render_options,
+            workers=display_settings['render_workers']
+        )
+        self.message_display.render_cache = self.render_cache
         self.input_handler = InputHandler(self)
-        self.chat_list_manager = ChatListManager(self.chat_list, self.load_selected_chat)
+        self.chat_list_manager = ChatListManager(
+            self.chat_list,
+            self.load_selected_chat,
+            self.chat_manager.list_chats,
+            page_size=display_settings['sidebar_page_size'],
+            hover_callback=self.prepare_chat
+        )
+
+        # Chats saved by other instances or batch runs are applied as they change
+        self.chat_manager.add_change_listener(self.on_chat_changed)
+        self.chat_manager.watch(dispatch=lambda func, *args: self.root.after(0, func, *args))
 
-        # Load existing chats
+        # Load existing chats, and prepare the most recently used ones
         self.load_existing_chats()
+        for chat in self.chat_manager.list_chats(0, display_settings['prepare_recent']):
+            self.prepare_chat(chat)
+
+        # Title new chats in the background once they have a first exchange
+        self.title_service = TitleService(
+            self.chat_manager,
+            on_title=self.chat_list_manager.update_chat_title,
+            dispatch=lambda func, *args: self.root.after(0, func, *args)
+        )
+
+        # Developer mode overlay, with F8/F9/F10 hotkeys
+        self.profiler_overlay = None
+        if profiling.enabled:
+            from chat_ui.ui.profiler_overlay import ProfilerOverlay
+            self.profiler_overlay = ProfilerOverlay(self)
 
-        # Start response processing thread
-        self.response_thread = threading.Thread(target=self.process_responses, daemon=True)
-        self.response_thread.start()
+        # Flush pending saves before the window goes away
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Schedule periodic queue checking
         self.root.after(100, self.check_response_queue)
 
+        # Refresh the stats bar periodically
+        self.root.after(1000, self.refresh_stats)
+
         # Add animation tracking
         self.animation_running = False
         self.animation_thread = None
@@ -175,8 +237,31 @@ class OllamaChatApp:
         )
         self.model_combo.grid(row=0, column=0, padx=(0, 5), pady=5, sticky="ew")
 
-        # Populate models
+        # Performance profile of the current chat (context size, output cap, keep_alive)
+        self.profile_combo = ctk.CTkComboBox(
+            self.model_frame,
+            state="readonly",
+            values=profile_names(),
+            command=self.on_profile_selected,
+            width=140
+        )
+        self.profile_combo.set(settings['profiles']['default'])
+        self.profile_combo.grid(row=0, column=1, padx=5, pady=5)
+
+        # Stats bar: prefill savings, pending saves, response latency
+        self.stats_label = ctk.CTkLabel(
+            self.model_frame,
+            text="",
+            text_color="gray",
+            font=ctk.CTkFont(size=11)
+        )
+        self.stats_label.grid(row=0, column=2, padx=5, pady=5, sticky="e")
+
+        # Populate models, and again whenever the installed models change
         self.populate_models()
+        registry.add_listener(lambda models: self.root.after(0, self.populate_models))
+        registry.start_background_refresh()
+        pool.start_background_checks()
 
         # Message Input Frame
         self.input_frame = ctk.CTkFrame(self.chat_frame, fg_color="transparent")
@@ -195,6 +280,8 @@ class OllamaChatApp:
         )
         self.message_entry.grid(row=0, column=0, padx=(0, 10), pady=5, sticky="ew")
         self.message_entry.bind("<Return>", self.send_message)
+        self.message_entry.bind("<KeyRelease>", lambda event: self.prefill.on_typing(event))
+        self.message_entry.bind("<Escape>", lambda event: self.cancel_edit())
 
         # Attach File Button
         self.attach_button = ctk.CTkButton(
@@ -215,7 +302,10 @@ class OllamaChatApp:
             width=200,
             height=100
         )
-        self.files_listbox.grid(row=1, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
+        self.files_listbox.grid(row=2, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
+
+        # Messages typed while a reply is generated, listed above the attached files
+        self.outbox = Outbox(self, self.input_frame, row=1)
 
         # Send Button with improved styling
         self.send_button = ctk.CTkButton(
@@ -233,11 +323,8 @@ class OllamaChatApp:
         """
         Load and display existing chat sessions
         """
-        # Get list of chats from chat manager
-        existing_chats = self.chat_manager.list_chats()
-        
-        # Update chat list in sidebar
-        self.chat_list_manager.load_existing_chats(existing_chats)
+        # Update chat list in sidebar, which only fetches the rows it shows
+        existing_chats = self.chat_list_manager.load_existing_chats()
         
         # If no chats exist, show welcome message
         if not existing_chats:
@@ -250,10 +337,26 @@ class OllamaChatApp:
         )
         
         if response == "Yes":
+            # One archive batch, then a single refresh of the sidebar
+            for chat_id in list(self.chat_manager.chats):
+                self.render_cache.forget(chat_id)
+                self.outbox.discard(chat_id)
             self.chat_manager.clear_all_chats()
-            self.load_existing_chats()
             self.current_chat = None
             self.message_display.clear_chat()
+            self.outbox.refresh()
+            self.load_existing_chats()
+
+    def on_close(self):
+        """
+        Write pending chats to disk and close the window
+        """
+        self.prefill.cancel()
+        registry.stop()
+        pool.stop()
+        self.render_cache.close()
+        self.chat_manager.close()
+        self.root.destroy()
 
     def populate_models(self):
         """
@@ -266,8 +369,10 @@ class OllamaChatApp:
             # Gérer les différents cas de modèles
             if models:
                 # Configurer les modèles disponibles
+                current = self.model_combo.get()
                 self.model_combo.configure(values=models)
-                self.model_combo.set(models[0])  # Sélectionner le premier modèle par défaut
+                # Garder la sélection si le modèle est toujours installé, sinon le premier par défaut
+                self.model_combo.set(current if current in models else models[0])
             else:
                 # Aucun modèle trouvé
                 default_options = ["No models found", "default"]
@@ -293,7 +398,8 @@ class OllamaChatApp:
             model = 'default'
         
         # Create a new chat
-        new_chat = self.chat_manager.create_new_chat(model)
+        self.prefill.cancel()
+        new_chat = self.chat_manager.create_new_chat(model, self._selected_profile())
         
         # Update the UI
         self.current_chat = new_chat
@@ -315,7 +421,7 @@ class OllamaChatApp:
                 model = 'default'
             
             # Créer un nouveau chat
-            self.current_chat = self.chat_manager.create_new_chat(model)
+            self.current_chat = self.chat_manager.create_new_chat(model, self._selected_profile())
             self.load_existing_chats()
 
         message = self.message_entry.get().strip()
@@ -328,8 +434,8 @@ class OllamaChatApp:
             "files": self.attached_files.copy()  # Send a copy of the list
         }
 
-        # Send the message using the input handler
-        self.input_handler.send_message(message_data)
+        # Send the message using the input handler, which queues it during a generation
+        self.input_handler.submit(message_data)
 
         # Clear the message entry and attached files after sending
         self.message_entry.delete(0, ctk.END)
@@ -339,10 +445,30 @@ class OllamaChatApp:
         for widget in self.files_listbox.winfo_children():
             widget.destroy()
 
+    def cancel_edit(self):
+        """
+        Leave edit mode, and send the queued message held back by the edit if nothing is generating
+        """
+        self.input_handler.cancel_edit()
+        self.input_handler.resume_queue()
+
     def load_selected_chat(self, chat):
+        if chat is not self.current_chat:
+            self.prefill.cancel()
+            self.input_handler.cancel_edit()
         self.current_chat = chat
-        self.message_display.load_chat_messages(chat)
+        self.message_display.load_chat_messages(chat['id'], self._message_entries(chat))
+        self.input_handler.show_failure()
+        self.outbox.refresh()
+        # A queued message held back while it was edited can go now
+        self.input_handler.resume_queue()
+
+        # The chats next to this one in the sidebar are likely to be opened next
+        for neighbour in self.chat_list_manager.adjacent_chats(chat['id']):
+            self.prepare_chat(neighbour)
         
+        self.profile_combo.set(chat.get('profile') or settings['profiles']['default'])
+
         # Vérifier si le modèle existe dans les valeurs disponibles
         model = chat.get('model')
         available_models = self.model_combo.cget("values")
@@ -351,35 +477,187 @@ class OllamaChatApp:
         if model and model in available_models:
             self.model_combo.set(model)
 
-    def process_responses(self):
-        while True:
-            try:
-                model, response, think_content, is_complete = self.response_queue.get()
-                
-                self.current_chat = self.chat_manager.add_message(
-                    self.current_chat, 'assistant', response
-                )
-                
-                self.chat_manager.save_chat(self.current_chat)
-                
-                self.root.after(0, self.handle_ai_response, response, think_content)
-                
-                self.response_queue.task_done()
-            except Exception as e:
-                print(f"Error processing response: {e}")
+    def on_chat_changed(self, chat_id, chat):
+        """
+        Show a chat changed by another process in the sidebar and the chat area
+        
+        Args:
+            chat_id (str): ID of the chat
+            chat (dict): Updated chat session, None if it was deleted
+        """
+        if chat is None:
+            self.render_cache.forget(chat_id)
+            self.outbox.discard(chat_id)
+            self.chat_list_manager.remove_chat_from_list(chat_id)
+            if self.current_chat is not None and self.current_chat['id'] == chat_id:
+                self.current_chat = None
+                self.message_display.clear_chat()
+            return
+
+        if not self.chat_list_manager.update_chat_title(chat_id, chat.get('title')):
+            self.chat_list_manager.add_chat_to_list(chat)
+        # A reply in progress refreshes the chat area when it completes
+        if chat is self.current_chat and self.input_handler.current_thread is None:
+            self.refresh_messages()
+
+    def _selected_profile(self):
+        """Return the profile picked in the selector, None for the default profile"""
+        profile = self.profile_combo.get()
+        return profile if profile != settings['profiles']['default'] else None
+
+    def on_profile_selected(self, profile):
+        """
+        Store the profile picked for the current chat; new chats start with it
+        
+        Args:
+            profile (str): Profile name
+        """
+        if self.current_chat is not None:
+            self.prefill.cancel()
+            self.chat_manager.set_profile(self.current_chat, self._selected_profile())
+
+    def prepare_chat(self, chat):
+        """
+        Render a chat's messages in the background, so opening it is quick
+        
+        Args:
+            chat (dict): Chat session
+        """
+        if chat is self.current_chat or not chat.get('messages'):
+            return
+        # Only the page shown when the chat is opened is rendered, and it is
+        # read by the render worker, so long chats' files are not read here
+        limit = self.message_display.page_messages
+        if self.message_display.max_messages:
+            limit = min(limit, self.message_display.max_messages)
+
+        def load_messages():
+            messages = self.chat_manager.get_chat_messages(chat, limit=limit, reverse=True)
+            return [(msg['role'], msg['content']) for msg in reversed(messages)]
+
+        self.render_cache.prepare(chat['id'], load_messages)
+
+    def _message_entries(self, chat, think=None):
+        """
+        Describe the active branch of a chat for the message display
+        
+        Args:
+            chat (dict): Chat session
+            think (dict, optional): Thought content to show, by message index
+        
+        Returns:
+            list: (index, role, content, branch, think_content) per message; role and
+                content are None for messages older than the display keeps
+        """
+        messages = chat.get('messages', [])
+        choices = self.chat_manager.get_branch_choices(chat)
+        path = self.chat_manager.get_active_path(chat)
+        # Messages the display doesn't show are not read, which spares long chats' files
+        shown_from = self.message_display.first_shown(chat['id'], len(path))
+        entries = []
+        for position, index in enumerate(path):
+            siblings = choices.get(index)
+            branch = (siblings.index(index) + 1, len(siblings)) if siblings else None
+            if position < shown_from:
+                entries.append((index, None, None, branch, None))
+                continue
+            msg = messages[index]
+            entries.append((index, msg['role'], msg['content'], branch, (think or {}).get(index)))
+        return entries
+
+    def refresh_messages(self, think=None):
+        """
+        Show the current chat's active branch, rendering only what changed
+        
+        Args:
+            think (dict, optional): Thought content to show, by message index
+        """
+        if self.current_chat is not None:
+            self.message_display.show_messages(
+                self.current_chat['id'], self._message_entries(self.current_chat, think)
+            )
 
-    def handle_ai_response(self, response, think_content):
-        self.input_handler.handle_ai_response(response, think_content)
+    def on_message_action(self, action, index):
+        """
+        Edit, regenerate or switch the branch of a message of the current chat,
+        or retry a failed generation
+        
+        Args:
+            action (str): 'edit', 'regenerate', 'previous', 'next' or 'retry'
+            index (int): Message index
+        """
+        chat = self.current_chat
+        # The active branch can't change while a reply is being generated
+        if chat is None or self.input_handler.current_thread is not None:
+            return
+
+        if action == 'retry':
+            self.input_handler.retry()
+        elif action == 'edit':
+            self.input_handler.begin_edit(index)
+        elif action == 'regenerate':
+            self.input_handler.regenerate(index)
+        elif action in ('previous', 'next'):
+            siblings = self.chat_manager.get_siblings(chat, index)
+            position = siblings.index(index) + (1 if action == 'next' else -1)
+            if 0 <= position < len(siblings):
+                self.prefill.cancel()
+                self.chat_manager.switch_branch(chat, siblings[position])
+                self.refresh_messages()
 
     def check_response_queue(self):
-        try:
-            model, response, think_content, is_complete = self.response_queue.get_nowait()
-            self.root.after(0, self.handle_ai_response, response, think_content)
-        except queue.Empty:
-            pass
+        # Replies are handled on the UI thread, in order
+        while True:
+            try:
+                model, response, think_content, is_complete = self.response_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.input_handler.on_response(model, response, think_content, is_complete)
         
         self.root.after(100, self.check_response_queue)
 
+    def refresh_stats(self):
+        """
+        Update the stats bar and schedule the next refresh
+        """
+        parts = []
+        prefill_text = self.prefill.status_text()
+        if prefill_text:
+            parts.append(prefill_text)
+
+        first_token = metrics.summary('generate.first_token')
+        if first_token['count']:
+            parts.append(f"⏱ First token p50 {first_token['p50_ms']:.0f} ms")
+
+        context_requests = metrics.counter('context.requests')
+        if context_requests:
+            sent = metrics.counter('context.request_bytes') / 1024
+            history = metrics.counter('context.history_bytes') / 1024
+            text = f"🧠 {context_requests} context turns, {sent:.0f} KB sent vs {history:.0f} KB history"
+            context_eval = metrics.summary('context.prompt_eval')
+            history_eval = metrics.summary('history.prompt_eval')
+            if context_eval['count'] and history_eval['count']:
+                text += f", prompt eval p50 {context_eval['p50_ms']:.0f} vs {history_eval['p50_ms']:.0f} ms"
+            parts.append(text)
+
+        timeouts = metrics.counter('generate.timeouts')
+        if timeouts:
+            parts.append(f"⌛ {timeouts} timeouts")
+
+        frame = metrics.summary('display.frame')
+        if frame['count']:
+            parts.append(f"🖥 Longest UI block {frame['max_ms']:.0f} ms")
+
+        if len(pool.endpoints) > 1:
+            parts.append(f"🌐 {pool.healthy_count()}/{len(pool.endpoints)} hosts")
+
+        pending = self.chat_manager.persistence_stats()['pending']
+        if pending:
+            parts.append(f"💾 {pending} pending")
+
+        self.stats_label.configure(text="  ·  ".join(parts))
+        self.root.after(1000, self.refresh_stats)
+
     def show_welcome_message(self):
         self.message_display.show_welcome_message()
 
@@ -389,6 +667,9 @@ class OllamaChatApp:
             # Check if file is already attached
             if file_path not in self.attached_files:
                 self.attached_files.append(file_path)
+                if is_image(file_path):
+                    # Resize and encode while the message is being typed
+                    self._prepare_image(file_path)
                 
                 # Create a frame for each attached file
                 file_frame = ctk.CTkFrame(self.files_listbox, fg_color="transparent")
@@ -414,6 +695,12 @@ class OllamaChatApp:
                 )
                 remove_button.pack(side="right", padx=5)
 
+    def _prepare_image(self, file_path):
+        """Encode an attached image in the background, at the size the current model uses"""
+        model = self.current_chat['model'] if self.current_chat else self.model_combo.get()
+        _, image_size = registry.image_support(model)
+        image_encoder.prepare([file_path], image_size or settings['images']['max_side'])
+
     def remove_attached_file(self, file_path):
         if file_path in self.attached_files:
             self.attached_files.remove(file_path)
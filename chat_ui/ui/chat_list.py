@@ -1,28 +1,51 @@
 import customtkinter as ctk
 from ui_components import ChatListItem
+from chat_ui.utils.profiling import profiled
 
 class ChatListManager:
-    def __init__(self, chat_list_frame, load_selected_chat_callback):
+    def __init__(self, chat_list_frame, load_selected_chat_callback, list_chats, page_size=50,
+                 hover_callback=None):
         """
         Initialize the chat list manager
         
         Args:
             chat_list_frame (ctk.CTkScrollableFrame): Frame to display chat list
             load_selected_chat_callback (callable): Callback to load a selected chat
+            list_chats (callable): Returns a page of chats, called with offset and limit
+            page_size (int, optional): Chats shown at first and added by "Load more". Defaults to 50.
+            hover_callback (callable, optional): Called with a chat when the pointer enters its row
         """
         self.chat_list_frame = chat_list_frame
         self.load_selected_chat_callback = load_selected_chat_callback
+        self.list_chats = list_chats
+        self.page_size = page_size
+        self.hover_callback = hover_callback
 
-    def load_existing_chats(self, chats):
+        # Number of chat rows fetched, and the button fetching more
+        self.loaded = 0
+        self.more_button = None
+
+    def _fetch(self, offset, limit):
+        """Fetch a page of chats, plus whether more follow"""
+        chats = self.list_chats(offset, limit + 1)
+        return chats[:limit], len(chats) > limit
+
+    @profiled('load_existing_chats')
+    def load_existing_chats(self):
         """
-        Load and display existing chats in the sidebar
+        Load and display the most recent chats in the sidebar.
+        As many rows as were shown before are kept, at least one page.
         
-        Args:
-            chats (list): List of chat sessions
+        Returns:
+            list: Chat sessions shown
         """
+        chats, has_more = self._fetch(0, max(self.loaded, self.page_size))
+        self.loaded = len(chats)
+
         # Clear existing chat list
         for widget in self.chat_list_frame.winfo_children():
             widget.destroy()
+        self.more_button = None
         
         if not chats:
             # Show a placeholder when no chats exist
@@ -32,20 +55,49 @@ class ChatListManager:
                 text_color="gray"
             )
             no_chats_label.pack(pady=20)
-            return
+            return chats
         
+        self._add_rows(chats, has_more)
+        return chats
+
+    def load_more(self):
+        """
+        Append the next page of chats to the sidebar
+        """
+        chats, has_more = self._fetch(self.loaded, self.page_size)
+        self.loaded += len(chats)
+        self._add_rows(chats, has_more)
+
+    def _add_rows(self, chats, has_more):
+        """Append chat rows, followed by a "Load more" button if more chats follow"""
+        if self.more_button is not None:
+            self.more_button.destroy()
+            self.more_button = None
+
         # Create a compact and visually appealing chat list
         for chat in chats:
             chat_item = ChatListItem(
                 self.chat_list_frame, 
                 chat, 
-                on_click_callback=self.load_selected_chat_callback
+                on_click_callback=self.load_selected_chat_callback,
+                on_hover_callback=self.hover_callback
             )
             chat_item.pack(fill="x", padx=5, pady=3)
 
+        if has_more:
+            self.more_button = ctk.CTkButton(
+                self.chat_list_frame,
+                text="Load more",
+                fg_color="transparent",
+                border_width=1,
+                height=26,
+                command=self.load_more
+            )
+            self.more_button.pack(fill="x", padx=5, pady=8)
+
     def add_chat_to_list(self, chat):
         """
-        Add a new chat to the list
+        Add a new chat at the top of the list
         
         Args:
             chat (dict): Chat session to add
@@ -59,9 +111,48 @@ class ChatListManager:
         chat_item = ChatListItem(
             self.chat_list_frame, 
             chat, 
-            on_click_callback=self.load_selected_chat_callback
+            on_click_callback=self.load_selected_chat_callback,
+            on_hover_callback=self.hover_callback
         )
-        chat_item.pack(fill="x", padx=5, pady=3, side="top")
+        rows = [widget for widget in self.chat_list_frame.winfo_children() if hasattr(widget, 'chat')]
+        if rows:
+            chat_item.pack(fill="x", padx=5, pady=3, before=rows[0])
+        else:
+            chat_item.pack(fill="x", padx=5, pady=3, side="top")
+        self.loaded += 1
+
+    def adjacent_chats(self, chat_id):
+        """
+        Return the chats listed right above and below a chat
+        
+        Args:
+            chat_id (str): ID of the chat
+        
+        Returns:
+            list: Neighbouring chat sessions, empty if the chat is not listed
+        """
+        rows = [widget.chat for widget in self.chat_list_frame.winfo_children() if hasattr(widget, 'chat')]
+        for position, chat in enumerate(rows):
+            if chat['id'] == chat_id:
+                return rows[max(position - 1, 0):position] + rows[position + 1:position + 2]
+        return []
+
+    def update_chat_title(self, chat_id, title):
+        """
+        Update the title of a single chat row
+        
+        Args:
+            chat_id (str): ID of the chat
+            title (str): New chat title
+        
+        Returns:
+            bool: False if the chat is not listed
+        """
+        for widget in self.chat_list_frame.winfo_children():
+            if hasattr(widget, 'chat') and widget.chat['id'] == chat_id:
+                widget.set_title(title)
+                return True
+        return False
 
     def remove_chat_from_list(self, chat_id):
         """
@@ -73,10 +164,11 @@ class ChatListManager:
         for widget in self.chat_list_frame.winfo_children():
             if hasattr(widget, 'chat') and widget.chat['id'] == chat_id:
                 widget.destroy()
+                self.loaded -= 1
                 break
         
         # If no chats remain, show the placeholder
-        if not self.chat_list_frame.winfo_children():
+        if not any(hasattr(widget, 'chat') for widget in self.chat_list_frame.winfo_children()):
             no_chats_label = ctk.CTkLabel(
                 self.chat_list_frame, 
                 text="No chats yet. Start a new chat!",
@@ -1,14 +1,32 @@
 import threading
 import queue
 from models import ModelChatThread
+from chat_ui.utils.images import is_image
+from chat_ui.utils.profiling import profiled
+from chat_ui.utils.settings import settings
 
 class InputHandler:
     def __init__(self, app):
         self.app = app
 
-    def send_message(self, message_data):
+        # Generation in progress, the chat it answers and the prefill signature of its history
+        self.current_thread = None
+        self.pending_chat = None
+        self._send_signature = None
+
+        # Index of the user message being edited, if any
+        self.editing = None
+        # ID of the queued message being edited, if any
+        self.editing_pending = None
+
+        # Chat whose last generation failed, offered a retry, and the error
+        self.failed_chat = None
+        self._failure_message = None
+
+    def submit(self, message_data):
         """
-        Send a message in the current chat
+        Send a message typed in the current chat, or queue it while a reply is
+        being generated. Queued messages are sent in order as replies complete.
         
         Args:
             message_data (dict or str): Message to send, can be a dictionary with 'text' and 'files' or a string
@@ -16,13 +34,39 @@ class InputHandler:
         # Clear input
         self.app.message_entry.delete(0, 'end')
 
-        # Disable input during processing
-        self.app.message_entry.configure(state='disabled')
-        self.app.send_button.configure(state='disabled')
+        if not isinstance(message_data, dict):
+            message_data = {"text": message_data, "files": []}
+        chat = self.app.current_chat
 
-        # Start thinking animation
-        self.start_thinking()
+        if self.editing_pending is not None:
+            entry_id = self.editing_pending
+            self.editing_pending = None
+            if self.app.outbox.update(entry_id, message_data.get("text", ""), message_data.get("files", [])):
+                # It may have been held back while it was edited
+                self.resume_queue()
+                return
+            # Cancelled meanwhile, so the edit is a new message
+
+        # Branch edits only start while nothing is generating, and go out at once
+        if self.editing is None and (self.current_thread is not None or self.app.outbox.pending(chat['id'])):
+            self.app.outbox.add(chat['id'], message_data)
+            if self.current_thread is None:
+                # Left queued by a failed generation
+                self._send_next(chat['id'])
+            return
+
+        self.send_message(message_data)
 
+    def send_message(self, message_data, chat=None, think=None):
+        """
+        Send a message in a chat
+        
+        Args:
+            message_data (dict or str): Message to send, can be a dictionary with 'text' and 'files' or a string
+            chat (dict, optional): Chat to send it in. Defaults to the current chat.
+            think (dict, optional): Thought content of the previous reply, by message index,
+                shown when the chat is refreshed
+        """
         # Extract message and files
         if isinstance(message_data, dict):
             message = message_data.get("text", "")
@@ -31,28 +75,198 @@ class InputHandler:
             message = message_data
             files = []
 
-        # Add user message to chat
-        self.app.current_chat = self.app.chat_manager.add_message(
-            self.app.current_chat, 'user', message
-        )
-        self.app.message_display.display_message('user', message)
+        chat = chat or self.app.current_chat
 
-        # Handle attached files
-        if files:
-            for file_path in files:
-                self.app.message_display.display_file('user', file_path)
+        # An edited message starts a new branch next to the original
+        parent = None
+        if self.editing is not None and chat is self.app.current_chat:
+            parent = self.app.chat_manager.get_parent(chat, self.editing)
+            self.editing = None
+
+        # Note which history the request extends, to measure prefill savings
+        signature = self.app.prefill.before_send(chat, chat['model'], parent)
+
+        # Add user message to chat; images are sent with it to vision models
+        images = [file_path for file_path in files if is_image(file_path)]
+        self.app.chat_manager.add_message(chat, 'user', message, parent=parent, images=images)
+
+        # The request goes out before the display is updated
+        self._generate(chat, signature)
+        self._show_generating(chat, think, files)
+
+    def _send_next(self, preferred=None, think=None):
+        """
+        Send the next queued message, if any
+        
+        Args:
+            preferred (str, optional): Chat served first when it has queued messages
+            think (dict, optional): Thought content of the reply the preferred chat just got
+        
+        Returns:
+            bool: True if a message was sent
+        """
+        while True:
+            chat_id = self.app.outbox.next_chat(preferred)
+            if chat_id is None:
+                return False
+            chat = self.app.chat_manager.get_chat_by_id(chat_id)
+            if chat is None:
+                # Deleted while its messages were queued
+                self.app.outbox.discard(chat_id)
+                continue
+            if self.app.outbox.pending(chat_id)[0]['id'] == self.editing_pending:
+                # Held back until the edit is sent or abandoned
+                return False
+            message_data = self.app.outbox.pop(chat_id)
+            self.send_message(message_data, chat, think if chat_id == preferred else None)
+            return True
+
+    def resume_queue(self):
+        """
+        Send the next queued message if no reply is being generated.
+        After a failure the queue waits for a retry or a new message.
+        """
+        if self.current_thread is None and self.failed_chat is None:
+            self._send_next()
+
+    def edit_pending(self, entry_id):
+        """
+        Put a queued message back in the input field; sending it updates the queued message
+        
+        Args:
+            entry_id (int): ID of the queued message
+        """
+        entry = self.app.outbox.get(entry_id)
+        if entry is None:
+            return
+        self.editing = None
+        self.editing_pending = entry_id
+        self.app.message_entry.delete(0, 'end')
+        self.app.message_entry.insert(0, entry['text'])
+        self.app.message_entry.focus_set()
+        self.app.outbox.refresh()
+
+    def cancel_pending(self, entry_id):
+        """
+        Remove a queued message before it is sent
+        
+        Args:
+            entry_id (int): ID of the queued message
+        """
+        if self.editing_pending == entry_id:
+            self.cancel_edit()
+        self.app.outbox.cancel(entry_id)
+        self.resume_queue()
+
+    def regenerate(self, index):
+        """
+        Generate a new reply in place of an assistant message, keeping the old one as a branch
+        
+        Args:
+            index (int): Index of the assistant message
+        """
+        chat = self.app.current_chat
+        parent = self.app.chat_manager.get_parent(chat, index)
+        if parent < 0:
+            return
+
+        self.cancel_edit()
+        # The history is unchanged, so the server's prompt cache covers all of it
+        signature = self.app.prefill.before_send(chat, chat['model'], parent, new_turn=False)
+        self.app.chat_manager.set_head(chat, parent)
+        self._generate(chat, signature)
+        self._show_generating(chat)
+
+    def retry(self):
+        """
+        Generate the reply that failed again, from the same history
+        """
+        chat = self.failed_chat
+        if chat is None or chat is not self.app.current_chat:
+            return
+        signature = self.app.prefill.before_send(chat, chat['model'], new_turn=False)
+        self._generate(chat, signature)
+        self._show_generating(chat)
+
+    def _generate(self, chat, signature):
+        """
+        Start generating a reply to the active branch of a chat
+        
+        Args:
+            chat (dict): Chat session
+            signature (tuple): Prefill signature of the history
+        """
+        self.failed_chat = None
+        self.pending_chat = chat
+        self._send_signature = signature
 
         # Prepare messages for model
-        messages = self.app.current_chat['messages']
+        messages = self.app.chat_manager.get_chat_messages(chat)
+
+        # In conversation mode, the context of the history answered last time saves resending it
+        reuse_context = settings['context_reuse']['enabled']
+        context = self.app.chat_manager.get_context(chat) if reuse_context else None
 
         # Start chat thread
         thread = ModelChatThread(
-            self.app.current_chat['model'], 
+            chat['model'], 
             messages, 
-            self.app.response_queue
+            self.app.response_queue,
+            profile=chat.get('profile'),
+            reuse_context=reuse_context,
+            context=context
         )
+        self.current_thread = thread
         thread.start()
 
+        # Messages typed meanwhile are queued
+        self.app.send_button.configure(text="Queue")
+
+    def _show_generating(self, chat, think=None, files=()):
+        """
+        Show a chat's latest messages and the thinking animation, if the chat is on screen
+        
+        Args:
+            chat (dict): Chat a reply is being generated for
+            think (dict, optional): Thought content to show, by message index
+            files (list, optional): Files attached to the last user message
+        """
+        if chat is not self.app.current_chat:
+            return
+        self.app.message_display.clear_error()
+        self.app.refresh_messages(think)
+
+        # Handle attached files
+        for file_path in files:
+            self.app.message_display.display_file('user', file_path)
+
+        # Start thinking animation
+        self.start_thinking()
+
+    def begin_edit(self, index):
+        """
+        Put a user message back in the input field; sending it creates a new branch
+        
+        Args:
+            index (int): Index of the user message
+        """
+        self.editing = index
+        self.app.message_entry.delete(0, 'end')
+        self.app.message_entry.insert(0, self.app.current_chat['messages'][index]['content'])
+        self.app.message_entry.focus_set()
+
+    def cancel_edit(self):
+        """
+        Leave edit mode without sending
+        """
+        if self.editing is not None:
+            self.editing = None
+            self.app.message_entry.delete(0, 'end')
+        if self.editing_pending is not None:
+            self.editing_pending = None
+            self.app.message_entry.delete(0, 'end')
+            self.app.outbox.refresh()
+
     def start_thinking(self):
         """
         Start the thinking animation in the chat.
@@ -150,23 +364,87 @@ class InputHandler:
         except Exception as e:
             print(f"Error deleting last message: {e}")
 
-    def handle_ai_response(self, response, think_content):
+    @profiled('queue_dispatch')
+    def on_response(self, model, response, think_content, is_complete):
         """
-        Handle AI response with improved display and interaction
+        Store a generated reply in the chat it answers and display it
         
         Args:
+            model (str): Model that generated the reply
             response (str): AI's response message
-            think_content (str, optional): Internal thought content
+            think_content (str): Internal thought content
+            is_complete (bool): Whether generation succeeded
         """
-        # Stop thinking animation
-        self.stop_thinking()
+        chat = self.pending_chat or self.app.current_chat
+        self.pending_chat = None
+        if chat is None:
+            return
+
+        # Failed or timed out generations are not stored, a retry is offered instead
+        if not is_complete:
+            self.handle_failure(chat, response)
+            return
+
+        self.app.chat_manager.add_message(chat, 'assistant', response)
+        if self.current_thread is not None and self.current_thread.reuse_context:
+            # Without a context, a stale one is dropped
+            self.app.chat_manager.set_context(chat, self.current_thread.context)
+        self.app.title_service.request_title(chat)
+
+        think = {len(chat['messages']) - 1: think_content} if think_content else None
+        self.handle_ai_response(chat, think)
+
+    def handle_failure(self, chat, message):
+        """
+        Show a failed generation and offer to retry it
         
-        # Display response in main thread
-        self.app.message_display.display_message('assistant', response, think_content)
+        Args:
+            chat (dict): Chat the generation was for
+            message (str): Error description
+        """
+        self.stop_thinking()
+        self.current_thread = None
+        self.failed_chat = chat
+        self._failure_message = message
+        self.show_failure()
+
+        # Messages queued behind the failed reply wait for a retry or a new message
+        self.app.send_button.configure(text="Send")
+
+    def show_failure(self):
+        """
+        Show the failed generation again when its chat is displayed
+        """
+        if self.failed_chat is not None and self.failed_chat is self.app.current_chat:
+            self.app.message_display.display_error(self._failure_message)
+
+    def handle_ai_response(self, chat, think=None):
+        """
+        Handle AI response with improved display and interaction
         
-        # Re-enable input
-        self.app.message_entry.configure(state='normal')
-        self.app.send_button.configure(state='normal')
+        Args:
+            chat (dict): Chat the response was added to
+            think (dict, optional): Internal thought content, by message index
+        """
+        # Stop thinking animation
+        self.stop_thinking()
+
+        # Compare the request with the prefill of its history
+        if self.current_thread is not None:
+            self.app.prefill.record_send(self._send_signature, self.current_thread.stats)
+            self.current_thread = None
+
+        # Send the next queued message right away, this chat's first; its
+        # chat is refreshed once the request is on its way
+        if self._send_next(chat['id'], think):
+            if chat is not self.pending_chat and chat is self.app.current_chat:
+                self.app.refresh_messages(think)
+            return
+        self.app.send_button.configure(text="Send")
+
+        # Display the response if its chat is still shown
+        if chat is self.app.current_chat:
+            self.app.refresh_messages(think)
         
         # Focus back on message entry
         self.app.message_entry.focus_set()
@@ -1,12 +1,89 @@
 import customtkinter as ctk
-from chat_ui.utils.markdown_parser import MarkdownParser
+from chat_ui.utils.metrics import metrics
+from chat_ui.ui.render_cache import RenderOptions, render_pieces
+from chat_ui.utils.profiling import profiled
 import os
+import time
 import customtkinter as ctk
+from collections import deque
 from tkinter import messagebox
 
 class MessageDisplay:
-    def __init__(self, chat_text_widget):
+    # Clickable actions shown under messages, by tag
+    ACTION_TAGS = {
+        'edit': "action_edit",
+        'regenerate': "action_regenerate",
+        'previous': "action_previous",
+        'next': "action_next",
+        'retry': "action_retry",
+    }
+
+    # Time spent inserting messages of a chat per frame before yielding to the event loop
+    FRAME_BUDGET_S = 0.012
+
+    def __init__(self, chat_text_widget, on_action=None, chunk_threshold=20000, chunk_chars=8000,
+                 collapse_lines=60, preview_lines=20, max_messages=0, render_cache=None,
+                 page_messages=50, on_load_earlier=None):
+        """
+        Initialize the message display
+
+        Args:
+            chat_text_widget (CTkTextbox): Text area showing the conversation
+            on_action (callable, optional): Called with the action name and the
+                message index when a message action is clicked
+            chunk_threshold (int, optional): Messages longer than this many characters are
+                inserted in chunks across idle callbacks. Defaults to 20000.
+            chunk_chars (int, optional): Characters inserted per chunk. Defaults to 8000.
+            collapse_lines (int, optional): Code blocks and pasted text with more lines are
+                collapsed behind an expander. Defaults to 60.
+            preview_lines (int, optional): Lines shown above the expander. Defaults to 20.
+            max_messages (int, optional): Messages kept in the text area, the oldest ones
+                are removed beyond that. 0 keeps everything. Defaults to 0.
+            render_cache (RenderCache, optional): Pieces of stored messages prepared ahead of time
+            page_messages (int, optional): Most recent messages shown when a chat is opened,
+                earlier ones are shown a page at a time on request. Defaults to 50.
+            on_load_earlier (callable, optional): Called when earlier messages are requested,
+                to show the branch again with first_shown() moved back a page
+        """
         self.chat_text = chat_text_widget
+        self.on_action = on_action
+
+        self.chunk_threshold = chunk_threshold
+        self.chunk_chars = chunk_chars
+        self.collapse_lines = collapse_lines
+        self.preview_lines = preview_lines
+        self.max_messages = max_messages
+        self.page_messages = page_messages
+        self.on_load_earlier = on_load_earlier
+        self.render_options = RenderOptions(chunk_threshold, chunk_chars, collapse_lines, preview_lines)
+        self.render_cache = render_cache
+
+        # Pending chunked insertions, collapsed texts, thoughts and attached
+        # files, by the name of the mark they are inserted at. Each value
+        # starts with the position of the message it belongs to.
+        self._next_mark_id = 0
+        self._chunk_jobs = {}
+        self._folds = {}
+        self._thoughts = {}
+        self._files = {}
+
+        # Messages currently shown, as (message index, branch) per position.
+        # Each one starts at the mark "msg_<position>", except the first
+        # _trimmed ones which were removed to bound the text area.
+        self._chat_id = None
+        self._rendered = []
+        self._trimmed = 0
+        # Position earlier messages were requested from, until they are shown,
+        # and the message to scroll back to once they are
+        self._load_from = None
+        self._reveal = None
+        # Entries of the chat being shown that are not inserted yet, and the
+        # callback inserting the next ones
+        self._batch = None
+        self._batch_job = None
+        # Start of the error shown after a failed generation
+        self._error_mark = None
+
         self._configure_tags()
 
     def _configure_tags(self):
@@ -18,13 +95,57 @@ class MessageDisplay:
             "bold": {"foreground": "dark blue"},
             "italic": {"foreground": "dark green"},
             "code": {"background": "gray90", "foreground": "dark red"},
-            "separator": {"foreground": "#CCCCCC", "justify": "center"}
+            "separator": {"foreground": "#CCCCCC", "justify": "center"},
+            "code_block_tag": {"background": "gray95", "foreground": "black"},
+            "expander": {"foreground": "gray60", "underline": 1},
+            "error_tag": {"foreground": "#FF6B6B"},
+            "think_button": {"foreground": "blue", "underline": 1},
+            "file_link": {"foreground": "blue", "underline": 1},
+            "load_earlier": {"foreground": "gray60", "underline": 1, "justify": "center"}
         }
 
         for tag, config in tag_configs.items():
             self.chat_text.tag_config(tag, **config)
 
-    def display_message(self, role, content, think_content=None, is_animation=False):
+        # Every clickable tag is configured and bound once; what a click acts
+        # on is found from the marks before the click position
+        clickable = {
+            "expander": self._on_expander_click,
+            "think_button": self._on_think_click,
+            "file_link": self._on_file_click,
+            "load_earlier": self._on_load_earlier_click,
+        }
+        for tag, handler in clickable.items():
+            self._bind_clickable(tag, handler)
+
+        for action, tag in self.ACTION_TAGS.items():
+            self.chat_text.tag_config(tag, foreground="gray60")
+            self._bind_clickable(tag, lambda event, action=action: self._on_action_click(action, event))
+
+    def _bind_clickable(self, tag, handler):
+        """Bind a click handler and a hand cursor to a tag"""
+        self.chat_text.tag_bind(tag, "<Button-1>", handler)
+        self.chat_text.tag_bind(tag, "<Enter>",
+            lambda event: self.chat_text.configure(cursor="hand2")
+        )
+        self.chat_text.tag_bind(tag, "<Leave>",
+            lambda event: self.chat_text.configure(cursor="")
+        )
+
+    def _event_index(self, event):
+        """Text index under the mouse"""
+        return self.chat_text.index(f"@{event.x},{event.y}")
+
+    def _set_mark(self, prefix, where="end-1c"):
+        """Create a unique mark that stays before text inserted at it"""
+        mark = self._new_mark(prefix)
+        self.chat_text.mark_set(mark, where)
+        self.chat_text.mark_gravity(mark, "left")
+        return mark
+
+    @profiled('display_message')
+    def display_message(self, role, content, think_content=None, is_animation=False,
+                        index=None, branch=None):
         """
         Display a message in the chat text area with advanced formatting
         
@@ -33,23 +154,94 @@ class MessageDisplay:
             content (str): Message content
             think_content (str, optional): Internal thought content
             is_animation (bool, optional): Flag for animation messages
+            index (int, optional): Index of the message in its chat. Messages with an
+                index are tracked for branch switching and get edit/regenerate actions.
+            branch (tuple, optional): Position and number of alternatives of the message
         """
+        # The message goes after the chat's remaining messages
+        self._flush_batch()
+        with metrics.timer('display.frame'):
+            self._display_message(role, content, think_content, is_animation, index, branch)
+
+    def _show_next_batch(self):
+        """
+        Insert the chat's next messages for up to a frame's budget, then yield
+        back to the event loop; each call is one frame of the display.frame metric
+        """
+        self._batch_job = None
+        batch = self._batch
+        if not batch:
+            self._batch = None
+            return
+        with metrics.timer('display.frame'):
+            deadline = time.perf_counter() + self.FRAME_BUDGET_S
+            while batch:
+                index, role, content, branch, think_content = batch.popleft()
+                self._display_message(role, content, think_content, False, index, branch)
+                if time.perf_counter() >= deadline:
+                    break
+        if batch:
+            # A timer rather than an idle callback, so input and redraws run in between
+            self._batch_job = self.chat_text.after(1, self._show_next_batch)
+        else:
+            self._batch = None
+            if self._reveal is not None:
+                # Earlier messages were added, keep the one read before in view
+                self.chat_text.see(f"msg_{self._reveal}")
+                self._reveal = None
+
+    def _cancel_batch(self):
+        """Forget the messages not inserted yet"""
+        if self._batch_job is not None:
+            self.chat_text.after_cancel(self._batch_job)
+            self._batch_job = None
+        self._batch = None
+        self._reveal = None
+
+    def _flush_batch(self):
+        """Insert the messages not inserted yet now, before something goes after them"""
+        if not self._batch:
+            return
+        if self._batch_job is not None:
+            self.chat_text.after_cancel(self._batch_job)
+            self._batch_job = None
+        self._reveal = None
+        with metrics.timer('display.frame'):
+            batch, self._batch = self._batch, None
+            for index, role, content, branch, think_content in batch:
+                self._display_message(role, content, think_content, False, index, branch)
+
+    def _display_message(self, role, content, think_content, is_animation, index, branch):
         self.chat_text.configure(state="normal")
 
+        if index is not None:
+            mark = f"msg_{len(self._rendered)}"
+            self.chat_text.mark_set(mark, "end-1c")
+            # Keep the mark before the text inserted at it
+            self.chat_text.mark_gravity(mark, "left")
+            self._rendered.append((index, branch))
+
         # Determine tag and prefix based on role
         tag, prefix = self._get_tag_and_prefix(role, is_animation)
 
         # Insert a newline before the message if it's not the first message
-        if self.chat_text.get("1.0", "end-1c").strip():
+        if not self._is_empty():
             self.chat_text.insert("end", "\n")
 
         # Insert message prefix
         self.chat_text.insert("end", f"{prefix}", tag)
 
         # Parse and insert markdown-formatted content
-        segments = MarkdownParser.parse_markdown(content)
-        for segment in segments:
-            self._insert_segment(segment, tag)
+        pieces = self._render(role, content, cached=index is not None)
+        if len(content) > self.chunk_threshold:
+            # Reserve the content's place and fill it from idle callbacks, so
+            # the rest of the message and later messages can go after it now
+            mark = self._set_mark("chunk")
+            self._chunk_jobs[mark] = (len(self._rendered) - 1, deque(pieces))
+            self.chat_text.after_idle(self._insert_next_chunk, mark)
+        else:
+            for piece in pieces:
+                self._insert_piece("end", *piece)
 
         # Add a newline at the end
         self.chat_text.insert("end", "\n")
@@ -58,6 +250,9 @@ class MessageDisplay:
         if role != 'user' and think_content and think_content.strip():
             self._add_think_button(think_content)
 
+        if index is not None:
+            self._add_actions(role, branch)
+
         # Add visual separator for non-animation messages
         if not is_animation:
             self.chat_text.insert("end", "\n" + "─" * 30 + "\n", "separator")
@@ -65,6 +260,86 @@ class MessageDisplay:
         self.chat_text.configure(state="disabled")
         self.chat_text.see("end")
 
+    def _is_empty(self):
+        """Whether the text area is empty, without copying its contents"""
+        return self.chat_text.index("end-1c") == "1.0"
+
+    def _new_mark(self, prefix):
+        """Return a unique mark name"""
+        self._next_mark_id += 1
+        return f"{prefix}_{self._next_mark_id}"
+
+    def _insert_at(self, where, text, tag):
+        """Insert text at "end" or after the text already inserted at a mark"""
+        if where == "end":
+            self.chat_text.insert("end", text, tag)
+            return
+        # Move the mark past the inserted text
+        self.chat_text.mark_gravity(where, "right")
+        self.chat_text.insert(where, text, tag)
+        self.chat_text.mark_gravity(where, "left")
+
+    def _insert_piece(self, where, text, tag, hidden=None):
+        """
+        Insert a piece of message content, followed by an expander when part of it is collapsed
+
+        Args:
+            where (str): "end" or the mark to insert at
+            text (str): Visible text
+            tag (str): Text tag
+            hidden (str, optional): Collapsed remainder of the text
+        """
+        self._insert_at(where, text, tag)
+        if hidden:
+            fold = self._set_mark("fold", "end-1c" if where == "end" else where)
+            hidden_lines = hidden.count("\n") + 1
+            label = f"▸ Afficher {hidden_lines} lignes de plus\n"
+            self._folds[fold] = (len(self._rendered) - 1, label, hidden, tag)
+            self._insert_at(where, label, "expander")
+
+    def _insert_next_chunk(self, mark):
+        """Insert the next chunk of a large text, then yield back to the event loop"""
+        job = self._chunk_jobs.get(mark)
+        if job is None:
+            return
+        position, pieces = job
+
+        with metrics.timer('display.frame'):
+            self.chat_text.configure(state="normal")
+            budget = self.chunk_chars
+            while pieces and budget > 0:
+                text, tag, hidden = pieces.popleft()
+                if len(text) > budget:
+                    # Split at a line break when there is one in the chunk
+                    cut = text.rfind("\n", 0, budget) + 1 or budget
+                    pieces.appendleft((text[cut:], tag, hidden))
+                    text, hidden = text[:cut], None
+                self._insert_piece(mark, text, tag, hidden)
+                budget -= len(text)
+            self.chat_text.configure(state="disabled")
+
+        if pieces:
+            self.chat_text.after_idle(self._insert_next_chunk, mark)
+        else:
+            del self._chunk_jobs[mark]
+            self.chat_text.mark_unset(mark)
+
+    def _on_expander_click(self, event):
+        """Replace a clicked expander with the text it hides"""
+        fold = self._mark_before(self._event_index(event), "fold_")
+        if fold is None or fold not in self._folds:
+            return
+        position, label, hidden, tag = self._folds.pop(fold)
+
+        with metrics.timer('display.frame'):
+            self.chat_text.configure(state="normal")
+            self.chat_text.delete(fold, f"{fold} + {len(label)} chars")
+            self.chat_text.configure(state="disabled")
+
+        # The expanded text is inserted in chunks like a large message
+        self._chunk_jobs[fold] = (position, deque([(hidden, tag, None)]))
+        self._insert_next_chunk(fold)
+
     def _get_tag_and_prefix(self, role, is_animation=False):
         """
         Determine tag and prefix based on message role
@@ -82,54 +357,101 @@ class MessageDisplay:
             prefix = "🤖 AI: " if not is_animation else ""
             return "ai_tag", prefix
 
-    def _insert_segment(self, segment, default_tag):
-        """Insert a markdown segment with appropriate formatting"""
-        segment_type_map = {
-            'normal': default_tag,
-            'bold': "bold",
-            'italic': "italic",
-            'code': "code",
-            'code_block': "code_block_tag"
-        }
+    def _render(self, role, content, cached=False):
+        """
+        Return the pieces of a message's content
 
-        tag = segment_type_map.get(segment['type'], default_tag)
-
-        if segment['type'] == 'code_block':
-            # Special handling for code blocks
-            highlighted_code = MarkdownParser.highlight_code(
-                segment['content'], 
-                segment['language']
-            )
-            self.chat_text.tag_config("code_block_tag", 
-                background="gray95", 
-                foreground="black"
-            )
-            self.chat_text.insert("end", "\n" + highlighted_code + "\n", "code_block_tag")
-        else:
-            self.chat_text.insert("end", segment['content'], tag)
+        Args:
+            role (str): Message role
+            content (str): Message content
+            cached (bool, optional): Use the render cache, for stored messages of the current chat
+
+        Returns:
+            list: (text, tag, collapsed remainder) per piece
+        """
+        if cached and self.render_cache is not None and self._chat_id is not None:
+            return self.render_cache.pieces(self._chat_id, role, content)
+        return render_pieces(role, content, self.render_options)
 
     def _add_think_button(self, think_content):
         """Add a clickable 'thoughts' button"""
-        unique_tag = f"think_button_{id(think_content)}"
+        mark = self._set_mark("think")
+        self._thoughts[mark] = (len(self._rendered) - 1, think_content)
         think_button_text = " 💭 Pensées "
-        self.chat_text.insert("end", think_button_text, unique_tag)
+        self.chat_text.insert("end", think_button_text, "think_button")
+
+    def _on_think_click(self, event):
+        """Show the thoughts of the clicked button"""
+        mark = self._mark_before(self._event_index(event), "think_")
+        if mark in self._thoughts:
+            self._show_think_content(self._thoughts[mark][1])
+
+    def _add_actions(self, role, branch):
+        """Add the edit or regenerate action and the branch switcher of a message"""
+        if branch is not None:
+            position, count = branch
+            self.chat_text.insert("end", " ◀ ", self.ACTION_TAGS['previous'])
+            self.chat_text.insert("end", f"{position}/{count}", "separator")
+            self.chat_text.insert("end", " ▶ ", self.ACTION_TAGS['next'])
+        if role == 'user':
+            self.chat_text.insert("end", " ✏️ Modifier ", self.ACTION_TAGS['edit'])
+        elif role == 'assistant':
+            self.chat_text.insert("end", " 🔄 Régénérer ", self.ACTION_TAGS['regenerate'])
+
+    def _mark_before(self, text_index, prefix):
+        """Return the closest mark with a prefix before a text index, or None"""
+        mark = self.chat_text.mark_previous(text_index)
+        while mark and not mark.startswith(prefix):
+            mark = self.chat_text.mark_previous(mark)
+        return mark or None
+
+    def _message_position_at(self, text_index):
+        """
+        Find the rendered message containing a text index
 
-        # Configure think button tag
-        self.chat_text.tag_config(unique_tag, 
-            foreground="blue", 
-            underline=1
-        )
-        
-        # Bind events to the think button
-        self.chat_text.tag_bind(unique_tag, "<Button-1>", 
-            lambda event, tc=think_content: self._show_think_content(tc)
-        )
-        self.chat_text.tag_bind(unique_tag, "<Enter>", 
-            lambda event: self.chat_text.config(cursor="hand2")
-        )
-        self.chat_text.tag_bind(unique_tag, "<Leave>", 
-            lambda event: self.chat_text.config(cursor="")
-        )
+        Returns:
+            int: Position of the message in the rendered branch, or None
+        """
+        mark = self._mark_before(text_index, "msg_")
+        return int(mark[4:]) if mark else None
+
+    def _on_action_click(self, action, event):
+        """Run a message action for the message under the mouse"""
+        position = self._message_position_at(self._event_index(event))
+        if position is None or position >= len(self._rendered) or self.on_action is None:
+            return
+        self.on_action(action, self._rendered[position][0])
+
+    def display_error(self, message, retry=True):
+        """
+        Show a failed generation below the last message
+
+        Args:
+            message (str): Error description
+            retry (bool, optional): Offer to generate the reply again. Defaults to True.
+        """
+        self._flush_batch()
+        self.clear_error()
+        self.chat_text.configure(state="normal")
+        self._error_mark = self._set_mark("error")
+        if not self._is_empty():
+            self.chat_text.insert("end", "\n")
+        self.chat_text.insert("end", f"⚠️ {message}", "error_tag")
+        if retry:
+            self.chat_text.insert("end", " 🔄 Réessayer ", self.ACTION_TAGS['retry'])
+        self.chat_text.insert("end", "\n")
+        self.chat_text.configure(state="disabled")
+        self.chat_text.see("end")
+
+    def clear_error(self):
+        """Remove the error shown by display_error, if any"""
+        if self._error_mark is None:
+            return
+        self.chat_text.configure(state="normal")
+        self.chat_text.delete(self._error_mark, "end")
+        self.chat_text.mark_unset(self._error_mark)
+        self._error_mark = None
+        self.chat_text.configure(state="disabled")
 
     def _show_think_content(self, think_content):
         """Display the internal thought content"""
@@ -138,19 +460,162 @@ class MessageDisplay:
 
     def clear_chat(self):
         """Clear the chat text area"""
+        self._cancel_batch()
+        self.clear_error()
         self.chat_text.configure(state="normal")
         self.chat_text.delete("1.0", "end")
+        self._truncate(0)
+        self._trimmed = 0
+        self._load_from = None
+        self._chat_id = None
+        self.chat_text.configure(state="disabled")
+
+    def _truncate(self, position):
+        """Forget the rendered messages from a position on"""
+        for i in range(max(position, self._trimmed), len(self._rendered)):
+            self.chat_text.mark_unset(f"msg_{i}")
+        del self._rendered[position:]
+
+        # Stop filling in text that is no longer displayed
+        self._forget_marks(lambda owner: owner >= position or position == 0)
+
+    def _trim(self, count):
+        """
+        Remove the oldest messages from the text area, so only those from
+        position count on are displayed
+        """
+        if count <= self._trimmed:
+            return
+        end = min(count, len(self._rendered))
+        if end > self._trimmed:
+            self.chat_text.configure(state="normal")
+            self.chat_text.delete("1.0", f"msg_{end}" if end < len(self._rendered) else "end")
+            self.chat_text.configure(state="disabled")
+            for i in range(self._trimmed, end):
+                self.chat_text.mark_unset(f"msg_{i}")
+            self._forget_marks(lambda owner: owner < end)
+        self._trimmed = count
+
+    def _forget_marks(self, predicate):
+        """Drop the marks, and what they point to, of the messages matching a predicate"""
+        for marks in (self._chunk_jobs, self._folds, self._thoughts, self._files):
+            for mark in [mark for mark, value in marks.items() if predicate(value[0])]:
+                del marks[mark]
+                self.chat_text.mark_unset(mark)
+
+    def first_shown(self, chat_id, count):
+        """
+        Position in a branch of the first message the text area shows: the
+        last page when a chat is opened, then earlier pages as they are
+        requested. Entries before it need no content.
+
+        Args:
+            chat_id (str): Chat ID
+            count (int): Number of messages of the branch
+
+        Returns:
+            int: Position of the first message shown
+        """
+        if chat_id != self._chat_id:
+            first = count - self.page_messages
+        elif self._load_from is not None:
+            first = self._load_from
+        else:
+            # At least a page stays shown when the branch gets shorter
+            first = min(self._trimmed, count - self.page_messages)
+        if self.max_messages:
+            first = max(first, count - self.max_messages)
+        return max(first, 0)
+
+    def _show_load_earlier(self, count):
+        """Offer the messages before the first one shown of a branch of count messages, above it"""
+        self.chat_text.configure(state="normal")
+        ranges = self.chat_text.tag_ranges("load_earlier")
+        if ranges:
+            self.chat_text.delete(ranges[0], ranges[-1])
+        shown = count - self._trimmed
+        if self._trimmed and self.on_load_earlier is not None and (
+                not self.max_messages or shown < self.max_messages):
+            self.chat_text.insert("1.0", f"⬆ Afficher les messages précédents ({self._trimmed})\n", "load_earlier")
+            if self._trimmed < len(self._rendered):
+                # The first message shown starts after the link
+                self.chat_text.mark_set(f"msg_{self._trimmed}", "load_earlier.last")
         self.chat_text.configure(state="disabled")
 
-    def load_chat_messages(self, chat):
-        """Load messages for a specific chat"""
+    def _on_load_earlier_click(self, event):
+        """Show a page of the messages before the first one shown"""
+        if self._batch or self.on_load_earlier is None:
+            return
+        self._load_from = max(self._trimmed - self.page_messages, 0)
+        self.on_load_earlier()
+
+    def load_chat_messages(self, chat_id, entries):
+        """
+        Load the messages of a chat's active branch
+
+        Args:
+            chat_id (str): Chat ID
+            entries (list): (index, role, content, branch, think_content) per message
+        """
         self.clear_chat()
-        
-        for msg in chat.get('messages', []):
-            role = msg['role']
-            content = msg['content']
-            
-            self.display_message(role, content)
+        self.show_messages(chat_id, entries)
+
+    def show_messages(self, chat_id, entries):
+        """
+        Show a chat's active branch, re-rendering only from the first message
+        that differs from what is already displayed. New messages are inserted
+        a frame's budget at a time, so long chats don't block the UI.
+
+        Args:
+            chat_id (str): Chat ID
+            entries (list): (index, role, content, branch, think_content) per message;
+                role and content are None for the messages before first_shown()
+        """
+        # What was still to be inserted is recomputed from the new entries
+        self._cancel_batch()
+        if chat_id != self._chat_id:
+            self.clear_chat()
+            self._chat_id = chat_id
+        self.clear_error()
+        reveal = self._trimmed if self._load_from is not None else None
+        self._load_from = None
+
+        # Messages without content are not shown, and only the most recent
+        # ones are kept when the text area is capped
+        keep_from = next((position for position, entry in enumerate(entries) if entry[1] is not None), len(entries))
+        if self.max_messages:
+            keep_from = max(keep_from, len(entries) - self.max_messages)
+
+        # The shared prefix stays on screen
+        common = 0
+        for rendered, entry in zip(self._rendered, entries):
+            if rendered != (entry[0], entry[3]):
+                break
+            common += 1
+
+        if common < self._trimmed or keep_from < self._trimmed:
+            # The change starts in messages that are not displayed, or earlier
+            # messages were requested: show the branch again
+            self.clear_chat()
+            self._chat_id = chat_id
+            common = 0
+
+        if common < len(self._rendered):
+            self.chat_text.configure(state="normal")
+            self.chat_text.delete(f"msg_{common}", "end")
+            self._truncate(common)
+            self.chat_text.configure(state="disabled")
+
+        if keep_from > self._trimmed:
+            self._trim(keep_from)
+            self._rendered.extend((entry[0], entry[3]) for entry in entries[len(self._rendered):keep_from])
+        self._show_load_earlier(len(entries))
+
+        pending = entries[len(self._rendered):]
+        if pending:
+            self._batch = deque(pending)
+            self._reveal = reveal
+            self._show_next_batch()
 
     def show_welcome_message(self):
         """Display a welcome message when no chats exist"""
@@ -168,13 +633,14 @@ class MessageDisplay:
             role (str): Message role (user/assistant)
             file_path (str): Path to the attached file
         """
+        self._flush_batch()
         self.chat_text.configure(state="normal")
 
         # Determine tag and prefix based on role (without animation)
         tag, prefix = self._get_tag_and_prefix(role)
 
         # Insert a newline before the file if it's not the first message
-        if self.chat_text.get("1.0", "end-1c").strip():
+        if not self._is_empty():
             self.chat_text.insert("end", "\n")
 
         # Insert file prefix
@@ -187,15 +653,9 @@ class MessageDisplay:
 
         # Create a clickable file attachment display
         file_display_text = f"📎 Attached File: {file_name} ({file_type}, {file_size} bytes)\n"
-        start_index = self.chat_text.index("end")
-        self.chat_text.insert("end", file_display_text, tag)
-        end_index = self.chat_text.index("end")
-
-        # Make the file name clickable
-        file_tag = f"file_{id(file_path)}"
-        self.chat_text.tag_add(file_tag, start_index, end_index)
-        self.chat_text.tag_bind(file_tag, "<Button-1>", lambda e, path=file_path: self.open_file(path))
-        self.chat_text.tag_config(file_tag, foreground="blue", underline=1)
+        mark = self._set_mark("file")
+        self._files[mark] = (len(self._rendered) - 1, file_path)
+        self.chat_text.insert("end", file_display_text, (tag, "file_link"))
 
         # Add a visual separator
         self.chat_text.insert("end", "\n" + "─" * 30 + "\n", "separator")
@@ -203,6 +663,12 @@ class MessageDisplay:
         self.chat_text.configure(state="disabled")
         self.chat_text.see("end")
 
+    def _on_file_click(self, event):
+        """Open the clicked attached file"""
+        mark = self._mark_before(self._event_index(event), "file_")
+        if mark in self._files:
+            self.open_file(self._files[mark][1])
+
     def open_file(self, file_path):
         """
         Open the attached file
@@ -0,0 +1,217 @@
+import itertools
+import os
+import customtkinter as ctk
+
+
+class Outbox:
+    """
+    Messages typed while a reply is being generated, queued per chat.
+
+    The queued messages of the chat on screen are listed above the input
+    field, where they can be edited or cancelled until the input handler
+    sends them, in order, as soon as the reply before them completes.
+    """
+
+    # Characters of a queued message shown in its row
+    PREVIEW_CHARS = 80
+
+    def __init__(self, app, parent, row):
+        """
+        Initialize an empty outbox and its list widget
+
+        Args:
+            app (OllamaChatApp): Application owning the input field
+            parent (CTkFrame): Frame the list is placed in
+            row (int): Grid row of the list in the frame
+        """
+        self.app = app
+        # chat_id -> queued entries, oldest first
+        self._queues = {}
+        # Entry IDs grow with time, so they also order entries across chats
+        self._ids = itertools.count()
+
+        self.frame = ctk.CTkFrame(parent, fg_color="transparent")
+        self.frame.grid(row=row, column=0, columnspan=4, padx=5, pady=(0, 5), sticky="ew")
+        self.frame.grid_remove()
+
+    def add(self, chat_id, message_data):
+        """
+        Queue a message
+
+        Args:
+            chat_id (str): Chat the message is for
+            message_data (dict): 'text' and 'files' of the message
+
+        Returns:
+            int: ID of the queued entry
+        """
+        entry = {
+            'id': next(self._ids),
+            'text': message_data.get('text', ''),
+            'files': list(message_data.get('files', [])),
+        }
+        self._queues.setdefault(chat_id, []).append(entry)
+        self.refresh()
+        return entry['id']
+
+    def pending(self, chat_id):
+        """
+        Return the messages queued for a chat
+
+        Args:
+            chat_id (str): Chat ID
+
+        Returns:
+            list: Entries with 'id', 'text' and 'files', oldest first
+        """
+        return list(self._queues.get(chat_id, []))
+
+    def next_chat(self, preferred=None):
+        """
+        Choose the chat whose queued message goes next
+
+        Args:
+            preferred (str, optional): Chat that just got a reply, served first to keep
+                its conversation going
+
+        Returns:
+            str: Chat ID, None when nothing is queued
+        """
+        if preferred in self._queues:
+            return preferred
+        if not self._queues:
+            return None
+        return min(self._queues, key=lambda chat_id: self._queues[chat_id][0]['id'])
+
+    def pop(self, chat_id):
+        """
+        Take the oldest message queued for a chat
+
+        Args:
+            chat_id (str): Chat ID
+
+        Returns:
+            dict: 'text' and 'files' of the message, None if nothing is queued
+        """
+        queue = self._queues.get(chat_id)
+        if not queue:
+            return None
+        entry = queue.pop(0)
+        if not queue:
+            del self._queues[chat_id]
+        self.refresh()
+        return {'text': entry['text'], 'files': entry['files']}
+
+    def _find(self, entry_id):
+        for chat_id, queue in self._queues.items():
+            for entry in queue:
+                if entry['id'] == entry_id:
+                    return chat_id, entry
+        return None, None
+
+    def get(self, entry_id):
+        """
+        Return a queued entry
+
+        Args:
+            entry_id (int): Entry ID
+
+        Returns:
+            dict: Entry, None if it was sent or cancelled
+        """
+        return self._find(entry_id)[1]
+
+    def update(self, entry_id, text, files=()):
+        """
+        Change a queued message in place
+
+        Args:
+            entry_id (int): Entry ID
+            text (str): New text
+            files (list, optional): Files attached while editing, added to the message's
+
+        Returns:
+            bool: False if the message was sent or cancelled meanwhile
+        """
+        _, entry = self._find(entry_id)
+        if entry is None:
+            return False
+        entry['text'] = text
+        entry['files'].extend(path for path in files if path not in entry['files'])
+        self.refresh()
+        return True
+
+    def cancel(self, entry_id):
+        """
+        Remove a queued message
+
+        Args:
+            entry_id (int): Entry ID
+        """
+        chat_id, entry = self._find(entry_id)
+        if entry is None:
+            return
+        self._queues[chat_id].remove(entry)
+        if not self._queues[chat_id]:
+            del self._queues[chat_id]
+        self.refresh()
+
+    def discard(self, chat_id):
+        """
+        Drop every message queued for a chat, e.g. once it is deleted
+
+        Args:
+            chat_id (str): Chat ID
+        """
+        if self._queues.pop(chat_id, None) is not None:
+            self.refresh()
+
+    def refresh(self):
+        """Show the messages queued for the chat on screen"""
+        for widget in self.frame.winfo_children():
+            widget.destroy()
+
+        chat = self.app.current_chat
+        queue = self._queues.get(chat['id'], []) if chat else []
+        if not queue:
+            self.frame.grid_remove()
+            return
+        self.frame.grid()
+
+        editing = self.app.input_handler.editing_pending
+        for entry in queue:
+            row = ctk.CTkFrame(self.frame, fg_color="transparent")
+            row.pack(fill="x", padx=5, pady=1)
+
+            text = " ".join(entry['text'].split())
+            if len(text) > self.PREVIEW_CHARS:
+                text = text[:self.PREVIEW_CHARS] + "…"
+            if entry['files']:
+                names = ", ".join(os.path.basename(path) for path in entry['files'])
+                text = f"{text}  📎 {names}" if text else f"📎 {names}"
+            status = "✎ Editing" if entry['id'] == editing else "⏳ Pending"
+
+            ctk.CTkLabel(
+                row,
+                text=f"{status}: {text}",
+                anchor="w",
+                text_color=("gray40", "gray60")
+            ).pack(side="left", expand=True, fill="x")
+            ctk.CTkButton(
+                row,
+                text="✖",
+                width=30,
+                height=20,
+                fg_color="red",
+                hover_color="darkred",
+                command=lambda entry_id=entry['id']: self.app.input_handler.cancel_pending(entry_id)
+            ).pack(side="right", padx=5)
+            ctk.CTkButton(
+                row,
+                text="✎",
+                width=30,
+                height=20,
+                fg_color=("gray75", "gray30"),
+                hover_color=("gray70", "gray25"),
+                command=lambda entry_id=entry['id']: self.app.input_handler.edit_pending(entry_id)
+            ).pack(side="right")
@@ -0,0 +1,169 @@
+import threading
+
+from chat_ui.utils.metrics import metrics
+from models import OllamaModelHandler, ModelChatThread
+
+
+class PrefillManager:
+    """
+    Warms the server's prompt cache while the user is typing.
+
+    When typing starts in a chat whose history changed since the last
+    request, the history is sent with no output requested, so the real
+    request only has to evaluate the new user turn. Requests are debounced,
+    cancelled when the chat or model changes, and their benefit is measured
+    against the prompt evaluation of the real request.
+    """
+
+    def __init__(self, app, enabled=False, debounce_ms=600):
+        """
+        Initialize the prefill manager
+
+        Args:
+            app (OllamaChatApp): Application owning the chat and input widgets
+            enabled (bool, optional): Opt-in switch. Defaults to False.
+            debounce_ms (int, optional): Typing pause before the request is sent. Defaults to 600.
+        """
+        self.app = app
+        self.enabled = enabled
+        self.debounce_ms = debounce_ms
+
+        self._after_id = None
+        self._cancel_event = None
+        # Signature of the history last sent to the server, by prefill or a real request
+        self._last_signature = None
+        # Result of the last completed prefill
+        self._last_prefill = None
+
+    def _signature(self, chat, model, head=None):
+        """
+        Identify a chat history by chat, model, profile and last message.
+        Messages are only ever appended, so the last message identifies the branch.
+        The profile is included as its num_ctx makes the server reload the model.
+        """
+        if head is None:
+            path = self.app.chat_manager.get_active_path(chat)
+            head = path[-1] if path else -1
+        return (chat['id'], model, chat.get('profile'), head)
+
+    def _current_model(self):
+        chat = self.app.current_chat
+        return chat.get('model') if chat else None
+
+    def on_typing(self, event=None):
+        """Schedule a prefill after a pause in typing"""
+        chat = self.app.current_chat
+        if not self.enabled or not chat or not chat.get('messages'):
+            return
+        if self._signature(chat, self._current_model()) == self._last_signature:
+            return
+
+        if self._after_id is not None:
+            self.app.root.after_cancel(self._after_id)
+        self._after_id = self.app.root.after(self.debounce_ms, self._start)
+
+    def _start(self):
+        """Send the prefill request in a background thread"""
+        self._after_id = None
+        chat = self.app.current_chat
+        model = self._current_model()
+        if not chat or not model or not chat.get('messages'):
+            return
+        # Never compete with a real generation
+        if ModelChatThread.active_generations():
+            return
+
+        signature = self._signature(chat, model)
+        if signature == self._last_signature:
+            return
+
+        self.cancel()
+        self._last_signature = signature
+        cancel_event = self._cancel_event = threading.Event()
+        messages = self.app.chat_manager.get_chat_messages(chat)
+        profile = chat.get('profile')
+
+        def worker():
+            try:
+                with metrics.timer('prefill.request'):
+                    result = OllamaModelHandler.prefill(model, messages, cancel_event, profile)
+            except Exception as e:
+                print(f"Error prefilling prompt cache: {e}")
+                return
+            if result and not cancel_event.is_set():
+                self._last_prefill = dict(result, signature=signature)
+                metrics.incr('prefill.completed')
+            else:
+                metrics.incr('prefill.cancelled')
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def cancel(self):
+        """Cancel a scheduled or running prefill"""
+        if self._after_id is not None:
+            self.app.root.after_cancel(self._after_id)
+            self._after_id = None
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+            self._cancel_event = None
+            # The history was not fully evaluated, allow a new attempt
+            self._last_signature = None
+
+    def before_send(self, chat, model, parent=None, new_turn=True):
+        """
+        Note the history a real request extends, before the user turn is added
+
+        Args:
+            chat (dict): Chat session
+            model (str): Model of the request
+            parent (int, optional): Message the history ends with. Defaults to the active branch's head.
+            new_turn (bool, optional): False when regenerating a reply to the same history.
+                Defaults to True.
+
+        Returns:
+            tuple: Signature of the history before the new user turn
+        """
+        if self._after_id is not None:
+            self.app.root.after_cancel(self._after_id)
+            self._after_id = None
+        signature = self._signature(chat, model, parent)
+        # The real request includes the new user turn, appended as the last message
+        self._last_signature = (
+            self._signature(chat, model, len(chat.get('messages', []))) if new_turn else signature
+        )
+        return signature
+
+    def record_send(self, signature, stats):
+        """
+        Compare a real request with the prefill of its history
+
+        Args:
+            signature (tuple): Value returned by before_send
+            stats (dict): ModelChatThread.stats of the real request
+        """
+        prefill = self._last_prefill
+        if not prefill or prefill['signature'] != signature or 'prompt_eval_count' not in stats:
+            return
+        self._last_prefill = None
+
+        # A cache hit leaves only the new turn to evaluate
+        if stats['prompt_eval_count'] < prefill['prompt_eval_count']:
+            metrics.incr('prefill.hits')
+            metrics.incr('prefill.saved_ms', prefill['prompt_eval_duration'] // 1_000_000)
+            metrics.observe('prefill.saved', prefill['prompt_eval_duration'] / 1e9)
+        else:
+            metrics.incr('prefill.misses')
+
+    def status_text(self):
+        """
+        Summarize prefill results for the stats bar
+
+        Returns:
+            str: Status text, empty when prefill is disabled
+        """
+        if not self.enabled:
+            return ""
+        hits = metrics.counter('prefill.hits')
+        total = hits + metrics.counter('prefill.misses')
+        total_saved_s = metrics.counter('prefill.saved_ms') / 1000
+        return f"⚡ Prefill saved {total_saved_s:.1f} s ({hits}/{total} hits)"
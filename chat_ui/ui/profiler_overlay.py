@@ -0,0 +1,100 @@
+import time
+import logging
+import customtkinter as ctk
+
+from chat_ui.utils import profiling
+from chat_ui.utils.metrics import metrics
+from chat_ui.utils.profiling import profiler
+
+
+class ProfilerOverlay:
+    """
+    Developer overlay showing event loop lag, queue depths and the slowest
+    recent operations.
+
+    Hotkeys: F8 shows or hides the overlay, F9 starts/stops cProfile and
+    F10 writes a tracemalloc snapshot.
+    """
+
+    # Interval of the event loop lag probe, in milliseconds
+    TICK_MS = 50
+
+    def __init__(self, app, refresh_ms=500):
+        """
+        Initialize the overlay on top of the main window
+
+        Args:
+            app (OllamaChatApp): Application being profiled
+            refresh_ms (int, optional): Overlay refresh interval. Defaults to 500.
+        """
+        self.app = app
+        self.refresh_ms = refresh_ms
+        self.visible = True
+        self._last_tick = time.perf_counter()
+        self._status = "F9 cProfile · F10 tracemalloc"
+
+        self.label = ctk.CTkLabel(
+            app.root,
+            text="",
+            justify="left",
+            anchor="nw",
+            fg_color="gray15",
+            text_color="#9FE870",
+            corner_radius=6,
+            font=ctk.CTkFont(family="Courier", size=11)
+        )
+        self.label.place(relx=1.0, rely=0.0, x=-10, y=10, anchor="ne")
+
+        app.root.bind("<F8>", lambda event: self.toggle())
+        app.root.bind("<F9>", lambda event: self.toggle_cprofile())
+        app.root.bind("<F10>", lambda event: self.dump_tracemalloc())
+
+        profiler.start_tracemalloc()
+        app.root.after(self.TICK_MS, self._tick)
+        app.root.after(self.refresh_ms, self._refresh)
+
+    def _tick(self):
+        """Measure how late the event loop runs a timer, i.e. the frame time"""
+        now = time.perf_counter()
+        metrics.observe('profile.frame', now - self._last_tick)
+        self._last_tick = now
+        self.app.root.after(self.TICK_MS, self._tick)
+
+    def toggle(self):
+        """Show or hide the overlay"""
+        self.visible = not self.visible
+        if self.visible:
+            self.label.place(relx=1.0, rely=0.0, x=-10, y=10, anchor="ne")
+            self.label.lift()
+        else:
+            self.label.place_forget()
+
+    def toggle_cprofile(self):
+        """Start cProfile, or stop it and write the profile"""
+        path = profiler.toggle_cprofile()
+        self._status = "cProfile running, F9 to stop" if path is None else f"Wrote {path}"
+        logging.info(self._status)
+
+    def dump_tracemalloc(self):
+        """Write a tracemalloc snapshot"""
+        path = profiler.dump_tracemalloc()
+        self._status = f"Wrote {path}"
+        logging.info(self._status)
+
+    def _refresh(self):
+        """Update the overlay text"""
+        if self.visible:
+            frame = metrics.summary('profile.frame')
+            lag_ms = max(frame['p95_ms'] - self.TICK_MS, 0.0)
+            max_lag_ms = max(frame['max_ms'] - self.TICK_MS, 0.0)
+            lines = [
+                f"frame lag  p95 {lag_ms:6.1f} ms  max {max_lag_ms:6.1f} ms",
+                f"queues     responses {self.app.response_queue.qsize()}  "
+                f"saves {self.app.chat_manager.persistence_stats()['pending']}",
+            ]
+            for name, ms in profiling.slowest(limit=5):
+                lines.append(f"  {ms:8.1f} ms  {name}")
+            lines.append(self._status)
+            self.label.configure(text="\n".join(lines))
+            self.label.lift()
+        self.app.root.after(self.refresh_ms, self._refresh)
@@ -0,0 +1,331 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from chat_ui.utils.markdown_parser import MarkdownParser
+from chat_ui.utils.metrics import metrics
+
+# Bump when the rendering changes, so cached pieces are rebuilt
+RENDER_VERSION = 1
+
+
+class RenderOptions:
+    """Display settings the rendered pieces depend on"""
+
+    def __init__(self, chunk_threshold=20000, chunk_chars=8000, collapse_lines=60, preview_lines=20):
+        self.chunk_threshold = chunk_threshold
+        self.chunk_chars = chunk_chars
+        self.collapse_lines = collapse_lines
+        self.preview_lines = preview_lines
+
+    def as_list(self):
+        return [self.chunk_threshold, self.chunk_chars, self.collapse_lines, self.preview_lines]
+
+
+def role_tag(role):
+    """Return the text tag of a message's normal text"""
+    return "user_tag" if role == 'user' else "ai_tag"
+
+
+def collapse(text, tag, options):
+    """Split overly long text into a preview and a collapsed remainder"""
+    if text.count("\n") < options.collapse_lines and len(text) <= options.chunk_threshold:
+        return text, tag, None
+    cut = 0
+    for _ in range(options.preview_lines):
+        next_line = text.find("\n", cut) + 1
+        if not next_line:
+            break
+        cut = next_line
+    cut = min(cut or len(text), options.chunk_chars)
+    return text[:cut], tag, text[cut:]
+
+
+def segment_piece(segment, default_tag, options, collapse_text=False):
+    """
+    Turn a markdown segment into a piece of text to insert
+
+    Args:
+        segment (dict): Segment from MarkdownParser.parse_markdown
+        default_tag (str): Tag of normal text
+        options (RenderOptions): Display settings
+        collapse_text (bool, optional): Also collapse long normal text, for pastes
+
+    Returns:
+        tuple: Visible text, tag and collapsed remainder (or None)
+    """
+    segment_type_map = {
+        'normal': default_tag,
+        'bold': "bold",
+        'italic': "italic",
+        'code': "code",
+        'code_block': "code_block_tag"
+    }
+
+    tag = segment_type_map.get(segment['type'], default_tag)
+
+    if segment['type'] == 'code_block':
+        # Special handling for code blocks
+        code = segment['content']
+        # Highlighting a huge block would block the UI longer than inserting it
+        if len(code) <= options.chunk_threshold:
+            code = MarkdownParser.highlight_code(code, segment['language'])
+        text = "\n" + code + "\n"
+    else:
+        text = segment['content']
+
+    if segment['type'] == 'code_block' or (collapse_text and segment['type'] == 'normal'):
+        return collapse(text, tag, options)
+    return text, tag, None
+
+
+def render_pieces(role, content, options):
+    """
+    Parse and highlight a message into the pieces inserted in the text area.
+    Does not touch Tk, so it can run in worker threads.
+
+    Args:
+        role (str): Message role
+        content (str): Message content
+        options (RenderOptions): Display settings
+
+    Returns:
+        list: (text, tag, collapsed remainder) per piece
+    """
+    tag = role_tag(role)
+    return [
+        segment_piece(segment, tag, options, role == 'user')
+        for segment in MarkdownParser.parse_markdown(content)
+    ]
+
+
+def render_batch(messages, options):
+    """
+    Render messages in a worker process
+
+    Args:
+        messages (list): (role, content) per message
+        options (RenderOptions): Display settings
+
+    Returns:
+        dict: Pieces per message hash
+    """
+    return {
+        message_hash(role, content): render_pieces(role, content, options)
+        for role, content in messages
+    }
+
+
+def message_hash(role, content):
+    """Identify a message's rendering by its role and content"""
+    return hashlib.sha1(f"{role}\0{content}".encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class RenderCache:
+    """
+    Render-ready pieces of chat messages, prepared ahead of time.
+
+    Chats likely to be opened next are rendered ahead of time and kept in
+    memory and in one file per chat, keyed by message hash, so opening them
+    only inserts text. Entries of edited or removed messages are dropped
+    when the chat's file is rewritten.
+
+    Parsing and highlighting are pure Python and hold the GIL, so they run
+    in worker processes; a single thread coordinates them and does the file
+    I/O, one thread per process.
+    """
+
+    def __init__(self, cache_dir, options=None, workers=2, memory_chats=16):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir (str): Directory of the per-chat cache files
+            options (RenderOptions, optional): Display settings. Defaults to RenderOptions().
+            workers (int, optional): Processes rendering chats. Defaults to 2.
+            memory_chats (int, optional): Chats kept in memory. Defaults to 16.
+        """
+        self.cache_dir = cache_dir
+        self.options = options or RenderOptions()
+        self.memory_chats = memory_chats
+        self.workers = workers
+        self._signature = [RENDER_VERSION] + self.options.as_list()
+
+        # chat_id -> {message hash: pieces}, least recently used first
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+        # Chats queued or being prepared, and chats with unsaved entries
+        self._preparing = set()
+        self._dirty = set()
+        # One coordinating thread per process, they mostly wait on their batch
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+        # Started by a coordinating thread on first use
+        self._processes = None
+        self._processes_failed = False
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, chat_id):
+        return os.path.join(self.cache_dir, f"{chat_id}.json")
+
+    def _load(self, chat_id):
+        """Read a chat's cached pieces from disk, empty when missing or stale"""
+        try:
+            with open(self._path(chat_id), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('signature') != self._signature:
+            return {}
+        return {key: [tuple(piece) for piece in pieces] for key, pieces in data.get('pieces', {}).items()}
+
+    def _entries(self, chat_id):
+        """Return the in-memory entries of a chat, loading them from disk; caller holds the lock"""
+        entries = self._chats.get(chat_id)
+        if entries is None:
+            entries = self._chats[chat_id] = self._load(chat_id)
+            while len(self._chats) > self.memory_chats:
+                evicted, _ = self._chats.popitem(last=False)
+                self._dirty.discard(evicted)
+        self._chats.move_to_end(chat_id)
+        return entries
+
+    def pieces(self, chat_id, role, content):
+        """
+        Return the pieces of a message, rendering them now on a miss
+
+        Args:
+            chat_id (str): Chat the message belongs to
+            role (str): Message role
+            content (str): Message content
+
+        Returns:
+            list: (text, tag, collapsed remainder) per piece
+        """
+        key = message_hash(role, content)
+        with self._lock:
+            cached = self._entries(chat_id).get(key)
+        if cached is not None:
+            metrics.incr('render_cache.hits')
+            return cached
+
+        metrics.incr('render_cache.misses')
+        pieces = render_pieces(role, content, self.options)
+        with self._lock:
+            self._entries(chat_id)[key] = pieces
+            schedule = chat_id not in self._dirty
+            self._dirty.add(chat_id)
+        if schedule:
+            self._executor.submit(self._save, chat_id, None)
+        return pieces
+
+    def prepare(self, chat_id, load_messages):
+        """
+        Render a chat's messages in the background
+
+        Args:
+            chat_id (str): Chat ID
+            load_messages (callable): Returns the (role, content) of the messages to render.
+                Called in the coordinating thread, so messages still on disk are read there.
+        """
+        with self._lock:
+            if chat_id in self._preparing:
+                return
+            self._preparing.add(chat_id)
+        self._executor.submit(self._prepare, chat_id, load_messages)
+
+    def _render(self, messages):
+        """Render messages in the worker processes, or in this thread if they can't run"""
+        if not self._processes_failed:
+            try:
+                with self._lock:
+                    if self._processes is None:
+                        # Spawned rather than forked, the parent runs Tk and other threads
+                        self._processes = ProcessPoolExecutor(
+                            max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                        )
+                return self._processes.submit(render_batch, messages, self.options).result()
+            except Exception as e:
+                logging.warning(f"Render processes unavailable, rendering in a thread: {e}")
+                self._processes_failed = True
+        return render_batch(messages, self.options)
+
+    def _prepare(self, chat_id, load_messages):
+        """Render the missing messages of a chat and save its cache file; runs in the coordinating thread"""
+        try:
+            messages = load_messages()
+            with self._lock:
+                entries = dict(self._entries(chat_id))
+            missing = {}
+            for role, content in messages:
+                key = message_hash(role, content)
+                if key not in entries and key not in missing:
+                    missing[key] = (role, content)
+            rendered = self._render(list(missing.values())) if missing else {}
+            if rendered:
+                metrics.incr('render_cache.prepared', len(rendered))
+                with self._lock:
+                    self._entries(chat_id).update(rendered)
+            keep = {message_hash(role, content) for role, content in messages}
+            if rendered or set(entries) - keep:
+                self._save(chat_id, keep)
+        except Exception as e:
+            print(f"Error preparing chat {chat_id}: {e}")
+        finally:
+            with self._lock:
+                self._preparing.discard(chat_id)
+
+    def _save(self, chat_id, keep=None):
+        """
+        Write a chat's cache file
+
+        Args:
+            chat_id (str): Chat ID
+            keep (set, optional): Hashes of the chat's current messages, other entries are dropped
+        """
+        with self._lock:
+            self._dirty.discard(chat_id)
+            entries = self._chats.get(chat_id)
+            if entries is None:
+                return
+            if keep is not None:
+                for key in [key for key in entries if key not in keep]:
+                    del entries[key]
+            data = {'signature': self._signature, 'pieces': dict(entries)}
+
+        path = self._path(chat_id)
+        tmp_file = f"{path}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, path)
+        except OSError as e:
+            print(f"Error writing render cache of chat {chat_id}: {e}")
+
+    def forget(self, chat_id):
+        """
+        Drop a chat's cached pieces, from memory and disk
+
+        Args:
+            chat_id (str): Chat ID
+        """
+        with self._lock:
+            self._chats.pop(chat_id, None)
+            self._dirty.discard(chat_id)
+        try:
+            os.remove(self._path(chat_id))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing render cache of chat {chat_id}: {e}")
+
+    def close(self):
+        """Stop the workers without waiting for queued preparations"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
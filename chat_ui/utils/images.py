@@ -0,0 +1,208 @@
+import io
+import os
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from chat_ui.utils.metrics import metrics
+from chat_ui.utils.settings import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional, images are then sent as they are
+    Image = None
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp')
+
+
+def is_image(path):
+    """Whether a file looks like an image, by extension"""
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+class ImageEncoder:
+    """
+    Prepares attached images for vision models.
+
+    Images are downscaled to the size the model works at and re-encoded,
+    then returned base64 encoded as the API expects. Results are cached in
+    memory and on disk by content hash and size, so resending a history
+    does not decode the originals again.
+    """
+
+    def __init__(self, cache_dir='image_cache', memory_bytes=64 * 1024 * 1024, quality=85):
+        """
+        Initialize the encoder
+
+        Args:
+            cache_dir (str, optional): Directory of encoded images, None for memory only.
+                Defaults to 'image_cache'.
+            memory_bytes (int, optional): Size of the in-memory cache. Defaults to 64 MB.
+            quality (int, optional): JPEG quality of re-encoded images. Defaults to 85.
+        """
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.quality = quality
+
+        self._lock = threading.Lock()
+        # (content hash, max side) -> base64 string, least recently used first
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        # (path, mtime_ns, size) -> content hash, so unchanged files are not read to be hashed
+        self._hashes = {}
+        self._warned = False
+
+    def _content_hash(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._hashes.get(key)
+        if digest is not None:
+            return digest, None
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._hashes[key] = digest
+        return digest, data
+
+    def _remember(self, key, encoded):
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = encoded
+            self._memory_size += len(encoded)
+            while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _resize(self, data, max_side):
+        """Downscale and re-encode image bytes, returning the new bytes"""
+        if Image is None:
+            if not self._warned:
+                self._warned = True
+                logging.warning("Pillow is not installed, images are sent without resizing")
+            return data
+
+        image = Image.open(io.BytesIO(data))
+        # Phones store the orientation separately, apply it before it is lost
+        image = ImageOps.exif_transpose(image)
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        output = io.BytesIO()
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            # Keep transparency, which JPEG can't store
+            image.save(output, format='PNG', optimize=True)
+        else:
+            image.convert('RGB').save(output, format='JPEG', quality=self.quality)
+        resized = output.getvalue()
+        # Small images can grow when re-encoded
+        return resized if len(resized) < len(data) else data
+
+    def encode(self, path, max_side=None):
+        """
+        Return an image ready to send, base64 encoded
+
+        Args:
+            path (str): Image file
+            max_side (int, optional): Longest side in pixels, None keeps the size
+
+        Returns:
+            str: Base64 encoded image
+        """
+        digest, data = self._content_hash(path)
+        key = (digest, max_side or 0)
+        with self._lock:
+            encoded = self._memory.get(key)
+            if encoded is not None:
+                self._memory.move_to_end(key)
+        if encoded is not None:
+            metrics.incr('images.cache_hits')
+            return encoded
+
+        cache_file = None
+        if self.cache_dir:
+            cache_file = os.path.join(self.cache_dir, f"{digest}-{max_side or 0}")
+            try:
+                with open(cache_file, 'rb') as f:
+                    encoded = base64.b64encode(f.read()).decode('ascii')
+                metrics.incr('images.cache_hits')
+                self._remember(key, encoded)
+                return encoded
+            except FileNotFoundError:
+                pass
+
+        with metrics.timer('images.encode'):
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            try:
+                resized = self._resize(data, max_side)
+            except Exception as e:
+                logging.warning(f"Could not resize {path}, sending it as it is: {e}")
+                resized = data
+        metrics.incr('images.encoded')
+        metrics.incr('images.bytes_in', len(data))
+        metrics.incr('images.bytes_out', len(resized))
+
+        if cache_file is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_file = f"{cache_file}.tmp"
+                with open(tmp_file, 'wb') as f:
+                    f.write(resized)
+                os.replace(tmp_file, cache_file)
+            except OSError as e:
+                logging.warning(f"Could not cache encoded image {path}: {e}")
+
+        encoded = base64.b64encode(resized).decode('ascii')
+        self._remember(key, encoded)
+        return encoded
+
+    def encode_messages(self, messages, max_side=None):
+        """
+        Replace the image paths of request messages with encoded images
+
+        Args:
+            messages (list): Messages as sent to the API, 'images' holding file paths
+            max_side (int, optional): Longest side in pixels, None keeps the size
+
+        Returns:
+            list: Messages with encoded images; the input list is not modified
+        """
+        encoded_messages = []
+        for msg in messages:
+            if msg.get('images'):
+                images = []
+                for path in msg['images']:
+                    try:
+                        images.append(self.encode(path, max_side))
+                    except OSError as e:
+                        logging.warning(f"Skipping image {path}: {e}")
+                msg = dict(msg, images=images)
+            encoded_messages.append(msg)
+        return encoded_messages
+
+    def prepare(self, paths, max_side=None):
+        """
+        Encode images in a background thread, so sending them later is quick
+
+        Args:
+            paths (list): Image files
+            max_side (int, optional): Longest side in pixels, None keeps the size
+        """
+        def worker():
+            for path in paths:
+                try:
+                    self.encode(path, max_side)
+                except Exception as e:
+                    logging.warning(f"Error preparing image {path}: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+
+# Shared instance used across the application
+image_encoder = ImageEncoder(settings['images']['cache_dir'])
@@ -2,9 +2,11 @@ import re
 import pygments
 from pygments.lexers import get_lexer_by_name
 from pygments.formatters import BBCodeFormatter
+from chat_ui.utils.profiling import profiled
 
 class MarkdownParser:
     @classmethod
+    @profiled('parse_markdown')
     def parse_markdown(cls, text):
         """
         Parse markdown text into segments with different types.
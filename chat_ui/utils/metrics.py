@@ -0,0 +1,107 @@
+import math
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a sequence of numbers
+
+    Args:
+        values (iterable): Samples
+        pct (float): Percentile between 0 and 100
+
+    Returns:
+        float: Percentile value, or 0.0 for an empty sequence
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+class Metrics:
+    """
+    Thread-safe counters and bounded timing samples.
+    Timings are stored in seconds; summaries report milliseconds.
+    """
+
+    def __init__(self, max_samples=1000):
+        """
+        Initialize the metrics store
+
+        Args:
+            max_samples (int, optional): Samples kept per timing. Defaults to 1000.
+        """
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._samples = {}
+
+    def incr(self, name, amount=1):
+        """Increase a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        """Record a timing sample"""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.max_samples)
+            samples.append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Context manager recording the duration of its block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name):
+        """Return the current value of a counter"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def summary(self, name):
+        """
+        Summarize a timing
+
+        Returns:
+            dict: count, avg_ms, p50_ms, p95_ms and max_ms
+        """
+        with self._lock:
+            samples = list(self._samples.get(name, ()))
+        if not samples:
+            return {'count': 0, 'avg_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'count': len(samples),
+            'avg_ms': sum(samples) / len(samples) * 1000,
+            'p50_ms': percentile(samples, 50) * 1000,
+            'p95_ms': percentile(samples, 95) * 1000,
+            'max_ms': max(samples) * 1000,
+        }
+
+    def snapshot(self):
+        """
+        Return all counters and timing summaries
+
+        Returns:
+            dict: {'counters': {...}, 'timings': {name: summary}}
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            names = list(self._samples)
+        return {
+            'counters': counters,
+            'timings': {name: self.summary(name) for name in names},
+        }
+
+
+# Shared instance used across the application
+metrics = Metrics()
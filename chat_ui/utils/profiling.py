@@ -0,0 +1,147 @@
+import os
+import time
+import cProfile
+import pstats
+import functools
+import threading
+import tracemalloc
+from collections import deque
+
+from chat_ui.utils.metrics import metrics
+
+# Developer mode: set OLLAMA_CHAT_PROFILE=1 to time hot paths and show the overlay
+PROFILE_ENV = 'OLLAMA_CHAT_PROFILE'
+enabled = os.environ.get(PROFILE_ENV, '').lower() not in ('', '0', 'false', 'no')
+
+# Where cProfile and tracemalloc dumps are written
+PROFILE_DIR = os.environ.get('OLLAMA_CHAT_PROFILE_DIR', 'profiles')
+
+# Most recent timed operations, as (end time, seconds, name)
+_recent = deque(maxlen=2000)
+
+
+def profiled(name):
+    """
+    Decorator timing a function in developer mode.
+    Outside developer mode the function is returned unchanged.
+
+    Args:
+        name (str): Operation name, recorded as the 'profile.<name>' timing
+
+    Returns:
+        callable: Decorator
+    """
+    def decorator(func):
+        if not enabled:
+            return func
+
+        metric = f'profile.{name}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                metrics.observe(metric, end - start)
+                _recent.append((end, end - start, name))
+
+        return wrapper
+    return decorator
+
+
+def slowest(limit=5, window=30.0):
+    """
+    Return the slowest operations timed recently
+
+    Args:
+        limit (int, optional): Number of operations. Defaults to 5.
+        window (float, optional): Seconds to look back. Defaults to 30.
+
+    Returns:
+        list: (name, milliseconds) pairs, slowest first
+    """
+    since = time.perf_counter() - window
+    recent = [(seconds, name) for end, seconds, name in list(_recent) if end >= since]
+    recent.sort(reverse=True)
+    return [(name, seconds * 1000) for seconds, name in recent[:limit]]
+
+
+class Profiler:
+    """
+    On-demand cProfile and tracemalloc dumps, for diagnosing stalls on user machines
+    """
+
+    def __init__(self, output_dir=PROFILE_DIR):
+        """
+        Initialize the profiler
+
+        Args:
+            output_dir (str, optional): Directory dumps are written to. Defaults to 'profiles'.
+        """
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self._cprofile = None
+
+    def _path(self, kind, extension):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.abspath(os.path.join(self.output_dir, f"{kind}-{stamp}.{extension}"))
+
+    @property
+    def cprofile_running(self):
+        return self._cprofile is not None
+
+    def toggle_cprofile(self):
+        """
+        Start cProfile, or stop it and write its statistics
+
+        Returns:
+            str: Path of the written .prof file, None when profiling was started
+        """
+        with self._lock:
+            if self._cprofile is None:
+                self._cprofile = cProfile.Profile()
+                self._cprofile.enable()
+                return None
+            profile, self._cprofile = self._cprofile, None
+
+        profile.disable()
+        path = self._path('cprofile', 'prof')
+        profile.dump_stats(path)
+        # A readable summary next to the binary dump
+        with open(path[:-len('prof')] + 'txt', 'w', encoding='utf-8') as f:
+            pstats.Stats(profile, stream=f).sort_stats('cumulative').print_stats(40)
+        return path
+
+    def start_tracemalloc(self):
+        """Start tracing allocations, so a later snapshot has data"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+    def dump_tracemalloc(self, limit=30):
+        """
+        Write a tracemalloc snapshot and its largest allocation sites
+
+        Args:
+            limit (int, optional): Allocation sites in the text summary. Defaults to 30.
+
+        Returns:
+            str: Path of the written snapshot
+        """
+        self.start_tracemalloc()
+        snapshot = tracemalloc.take_snapshot()
+        path = self._path('tracemalloc', 'snapshot')
+        snapshot.dump(path)
+
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path[:-len('snapshot')] + 'txt', 'w', encoding='utf-8') as f:
+            f.write(f"Traced memory: {current / 1e6:.1f} MB (peak {peak / 1e6:.1f} MB)\n\n")
+            for stat in snapshot.statistics('lineno')[:limit]:
+                f.write(f"{stat}\n")
+        return path
+
+
+# Shared instance used across the application
+profiler = Profiler()
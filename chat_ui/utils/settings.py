@@ -0,0 +1,123 @@
+import os
+import copy
+import json
+
+SETTINGS_FILE = 'settings.json'
+
+# Every setting with its default; settings.json only needs the overrides
+DEFAULT_SETTINGS = {
+    'ollama': {
+        # Ollama hosts requests are spread across, e.g. ["http://gpu1:11434", "http://gpu2:11434"].
+        # Empty uses the default host; OLLAMA_HOSTS (comma separated) overrides this.
+        'hosts': [],
+        # Seconds between health and model inventory checks
+        'check_interval': 30,
+    },
+    'deadlines': {
+        # Seconds allowed to connect to a host, for the first chunk, between two
+        # chunks and for the whole generation; 0 disables a deadline
+        'connect_s': 10,
+        'first_token_s': 120,
+        'chunk_gap_s': 30,
+        'total_s': 900,
+        # Overrides by model name, or by name without the tag ("deepseek-r1" covers "deepseek-r1:70b")
+        'models': {},
+    },
+    'profiles': {
+        # Performance profile of chats that don't pick one
+        'default': 'balanced',
+        # Request options and keep_alive of each profile. 'hosts' overrides options
+        # per Ollama host, e.g. {"http://small-box:11434": {"num_thread": 4}}
+        'presets': {
+            'fast': {
+                'options': {'num_ctx': 2048, 'num_predict': 512, 'temperature': 0.3},
+                'keep_alive': '30m',
+            },
+            # The default profile sends no options, so chats behave as before profiles
+            'balanced': {},
+            'long-context': {
+                'options': {'num_ctx': 32768, 'num_predict': 4096},
+                'keep_alive': '10m',
+            },
+        },
+    },
+    'images': {
+        # Longest side images are downscaled to for models that don't report their input size
+        'max_side': 1024,
+        # Encoded images, by content hash; empty keeps them in memory only
+        'cache_dir': 'image_cache',
+    },
+    'prompt_formats': {
+        # Prompt format by model name, or by name without the tag, for models whose metadata
+        # doesn't reveal it, e.g. {"my-r1-distill": "deepseek"}; "plain" forces the plain format
+        'models': {},
+    },
+    'prefill': {
+        # Warm the server's prompt cache with the history while the user types
+        'enabled': False,
+        'debounce_ms': 600,
+    },
+    'context_reuse': {
+        # Send the context returned with the previous reply and the new turn instead of the
+        # whole history; falls back to the history when the context is stale or refused
+        'enabled': False,
+    },
+    'display': {
+        # Messages longer than this are inserted in chunks, between which the UI stays responsive
+        'chunk_threshold': 20000,
+        'chunk_chars': 8000,
+        # Code blocks and pastes longer than this many lines are collapsed behind an expander
+        'collapse_lines': 60,
+        'preview_lines': 20,
+        # Messages kept in the chat area of long conversations, the oldest are removed; 0 keeps all
+        'max_messages': 0,
+        # Most recent messages shown when a chat is opened, earlier ones a page at a time
+        'page_messages': 50,
+        # Chats listed in the sidebar at first and added by each "Load more"
+        'sidebar_page_size': 50,
+        # Chats rendered ahead of time: hovered, adjacent and this many most recent ones
+        'prepare_recent': 5,
+        # Processes rendering those chats, off the UI thread and its GIL
+        'render_workers': 2,
+    },
+    'server': {
+        # Bearer token the local HTTP API requires in an Authorization header; empty requires none
+        'token': '',
+    },
+}
+
+
+def _merge(defaults, overrides):
+    """Recursively apply overrides on top of defaults"""
+    merged = copy.deepcopy(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_settings(path=SETTINGS_FILE):
+    """
+    Load settings from a JSON file on top of the defaults
+
+    Args:
+        path (str, optional): Settings file. Defaults to 'settings.json'.
+
+    Returns:
+        dict: Settings
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+    except FileNotFoundError:
+        overrides = {}
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Error loading settings from {os.path.abspath(path)}: {e}")
+        overrides = {}
+    return _merge(DEFAULT_SETTINGS, overrides)
+
+
+# Shared settings, loaded once at startup
+settings = load_settings()
@@ -0,0 +1,469 @@
+import os
+import time
+import logging
+import threading
+
+import httpx
+import ollama
+
+from chat_ui.utils.metrics import metrics
+from chat_ui.utils.settings import settings
+
+# Seconds a read may wait past the generation deadlines, so ModelChatThread
+# normally reports the deadline before the read fails
+READ_TIMEOUT_SLACK_S = 5
+
+
+def _field(entry, *names):
+    """Read the first present field of a dict or ollama response object"""
+    for name in names:
+        try:
+            value = entry[name]
+        except (KeyError, TypeError, AttributeError):
+            value = getattr(entry, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def configured_hosts():
+    """
+    Return the Ollama hosts to use
+
+    OLLAMA_HOSTS (comma separated) takes precedence over the 'ollama.hosts'
+    setting. With neither, the single default host of the ollama client is
+    used, which honours OLLAMA_HOST.
+
+    Returns:
+        list: Host URLs, [None] for the default host
+    """
+    env_hosts = os.environ.get('OLLAMA_HOSTS', '')
+    hosts = [host.strip() for host in env_hosts.split(',') if host.strip()]
+    return hosts or list(settings['ollama']['hosts']) or [None]
+
+
+def read_timeout(config=None):
+    """
+    Return the longest a stream may stay silent under any model's deadlines.
+
+    Clients are shared by all models, so the loosest first token and chunk
+    gap deadlines apply. A stalled stream then fails its read instead of
+    blocking its reader thread, and its endpoint is released.
+
+    Args:
+        config (dict, optional): Deadlines settings. Defaults to settings['deadlines'].
+
+    Returns:
+        float: Seconds, None when a deadline is disabled
+    """
+    config = config or settings['deadlines']
+    limits = []
+    for deadlines in [config] + list(config['models'].values()):
+        for phase in ('first_token_s', 'chunk_gap_s'):
+            value = deadlines.get(phase, config[phase])
+            if not value:
+                return None
+            limits.append(value)
+    return max(limits) + READ_TIMEOUT_SLACK_S
+
+
+def _retriable(error):
+    """Whether another host could succeed where a request failed"""
+    if isinstance(error, ollama.ResponseError):
+        # Missing model or server-side failure, the other hosts may do better
+        return error.status_code in (404, 500, 502, 503)
+    # Only failures to reach the host; anything else is a bug another host won't fix
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+def _model_missing(error):
+    """Whether a request failed because of the model rather than the host"""
+    return isinstance(error, ollama.ResponseError) and 400 <= error.status_code < 500
+
+
+def _host_kwargs(kwargs, endpoint, host_options):
+    """Apply the options configured for one host on top of a request's"""
+    overrides = (host_options or {}).get(endpoint.name)
+    if not overrides:
+        return kwargs
+    return dict(kwargs, options=dict(kwargs.get('options') or {}, **overrides))
+
+
+class Endpoint:
+    """State of one Ollama host, as seen by the pool"""
+
+    def __init__(self, host, client):
+        self.host = host
+        self.client = client
+        self.healthy = True
+        # Installed and loaded models, None until the first check
+        self.models = None
+        self.resident = set()
+        # Generations this process is running on the host
+        self.active = 0
+        self.latency = None
+        self.last_error = None
+
+    @property
+    def name(self):
+        return self.host or 'default'
+
+    def describe(self):
+        """Return the endpoint state as a plain dict"""
+        return {
+            'host': self.name,
+            'healthy': self.healthy,
+            'models': sorted(self.models or ()),
+            'resident': sorted(self.resident),
+            'active': self.active,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'last_error': self.last_error,
+        }
+
+
+class EndpointPool:
+    """
+    Routes requests across several Ollama hosts.
+
+    Hosts are checked periodically for health, installed models and models
+    loaded in memory. Each generation goes to the healthy host with the
+    least load, counting the generations this process runs there plus a
+    penalty when the model would have to be loaded first. A streamed
+    generation that fails before its first chunk is retried on the next
+    best host.
+    """
+
+    def __init__(self, hosts=None, check_interval=30, cold_start_cost=2, client_factory=None):
+        """
+        Initialize the pool
+
+        Args:
+            hosts (list, optional): Host URLs, None for the default host. Defaults to configured_hosts().
+            check_interval (int, optional): Seconds between health checks. Defaults to 30.
+            cold_start_cost (int, optional): Load added to hosts that would have to load
+                the model, in generations. Defaults to 2.
+            client_factory (callable, optional): Builds a client from a host URL.
+                Defaults to ollama.Client with the configured connect deadline.
+        """
+        if client_factory is None:
+            # Generations are watched by ModelChatThread, the read timeout only
+            # makes sure a stream it gave up on does not block forever
+            timeout = httpx.Timeout(
+                None, connect=settings['deadlines']['connect_s'] or None, read=read_timeout()
+            )
+            client_factory = lambda host: ollama.Client(host=host, timeout=timeout)
+        self.endpoints = [
+            Endpoint(host, client_factory(host))
+            for host in (hosts if hosts is not None else configured_hosts())
+        ]
+        self.check_interval = check_interval
+        self.cold_start_cost = cold_start_cost
+
+        self._lock = threading.Lock()
+        self._check_thread = None
+        self._stop_event = threading.Event()
+
+    def check(self, endpoint):
+        """
+        Refresh the health, installed models and loaded models of an endpoint
+
+        Args:
+            endpoint (Endpoint): Endpoint to check
+
+        Returns:
+            bool: True if the endpoint answered
+        """
+        start = time.perf_counter()
+        try:
+            entries = _field(endpoint.client.list(), 'models') or []
+        except Exception as e:
+            self._mark_failed(endpoint, e)
+            return False
+        latency = time.perf_counter() - start
+
+        models = {_field(entry, 'name', 'model') for entry in entries}
+        try:
+            loaded = _field(endpoint.client.ps(), 'models') or []
+            resident = {_field(entry, 'name', 'model') for entry in loaded}
+        except Exception as e:
+            # Older servers have no ps endpoint, keep what routing learned
+            logging.debug(f"Error listing loaded models on {endpoint.name}: {e}")
+            resident = None
+
+        with self._lock:
+            if not endpoint.healthy:
+                logging.info(f"Ollama endpoint {endpoint.name} is back")
+            endpoint.healthy = True
+            endpoint.models = models
+            if resident is not None:
+                endpoint.resident = resident
+            endpoint.latency = latency
+            endpoint.last_error = None
+        metrics.observe('pool.check', latency)
+        return True
+
+    def check_all(self):
+        """Check every endpoint"""
+        for endpoint in self.endpoints:
+            self.check(endpoint)
+
+    def start_background_checks(self):
+        """Check endpoints now and then periodically in a daemon thread"""
+        if self._check_thread and self._check_thread.is_alive():
+            return
+
+        def worker():
+            while True:
+                self.check_all()
+                if self._stop_event.wait(self.check_interval):
+                    return
+
+        self._stop_event.clear()
+        self._check_thread = threading.Thread(target=worker, daemon=True)
+        self._check_thread.start()
+
+    def stop(self):
+        """Stop background checks"""
+        self._stop_event.set()
+
+    def _record_failure(self, endpoint, model, error):
+        """
+        Account for a failed request before failing over: a missing model only
+        takes the host out of that model's routing, other errors mark it unhealthy
+        """
+        if _model_missing(error):
+            with self._lock:
+                if endpoint.models is not None:
+                    endpoint.models.discard(model)
+                endpoint.resident.discard(model)
+            logging.info(f"{model} is not available on {endpoint.name}: {error}")
+            metrics.incr('pool.model_misses')
+        else:
+            self._mark_failed(endpoint, error)
+
+    def _mark_failed(self, endpoint, error):
+        with self._lock:
+            if endpoint.healthy:
+                logging.warning(f"Ollama endpoint {endpoint.name} failed: {error}")
+                metrics.incr('pool.unhealthy')
+            endpoint.healthy = False
+            endpoint.last_error = str(error)
+
+    def _candidates(self, model, exclude=()):
+        """
+        Rank the endpoints able to serve a model, best first
+
+        Unhealthy endpoints come last rather than never, in case they recovered
+        since their last check.
+        """
+        with self._lock:
+            endpoints = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+            installed = [
+                endpoint for endpoint in endpoints
+                if endpoint.models is None or model is None or model in endpoint.models
+            ]
+
+            def rank(endpoint):
+                cold = model is not None and model not in endpoint.resident
+                return (
+                    not endpoint.healthy,
+                    endpoint.active + (self.cold_start_cost if cold else 0),
+                    endpoint.latency if endpoint.latency is not None else float('inf'),
+                )
+
+            return sorted(installed or endpoints, key=rank)
+
+    def _acquire(self, endpoint, model):
+        with self._lock:
+            endpoint.active += 1
+            if model:
+                # The server loads the model to serve the request
+                endpoint.resident.add(model)
+
+    def _release(self, endpoint):
+        with self._lock:
+            endpoint.active -= 1
+
+    def chat(self, model, messages, stream=False, info=None, host_options=None, **kwargs):
+        """
+        Send a chat request to the best endpoint for the model
+
+        Args:
+            model (str): Model name
+            messages (list): Messages as sent to the API
+            stream (bool, optional): Stream the response. Defaults to False.
+            info (dict, optional): Receives the name of the endpoint serving a
+                streamed request under 'endpoint'
+            host_options (dict, optional): Options added for specific hosts, by host URL
+            **kwargs: Other arguments of ollama chat, such as options
+
+        Returns:
+            The chat response, or a generator of chunks when streaming
+        """
+        if stream:
+            return self._stream('chat', model, info, host_options, messages=messages, **kwargs)
+        return self.call(
+            'chat', route=model, host_options=host_options, model=model, messages=messages, **kwargs
+        )
+
+    def generate(self, model, prompt, stream=False, info=None, host_options=None, **kwargs):
+        """
+        Send a completion request to the best endpoint for the model
+
+        Args:
+            model (str): Model name
+            prompt (str): Prompt, templated by the server
+            stream (bool, optional): Stream the response. Defaults to False.
+            info (dict, optional): Receives the name of the endpoint serving a
+                streamed request under 'endpoint'
+            host_options (dict, optional): Options added for specific hosts, by host URL
+            **kwargs: Other arguments of ollama generate, such as context or options
+
+        Returns:
+            The response, or a generator of chunks when streaming
+        """
+        if stream:
+            return self._stream('generate', model, info, host_options, prompt=prompt, **kwargs)
+        return self.call(
+            'generate', route=model, host_options=host_options, model=model, prompt=prompt, **kwargs
+        )
+
+    def call(self, method, *args, route=None, host_options=None, **kwargs):
+        """
+        Call a client method on the best endpoint, failing over to the next ones
+
+        Args:
+            method (str): Client method name, such as 'chat' or 'show'
+            *args: Positional arguments of the method
+            route (str, optional): Model the call is about, used for routing
+            host_options (dict, optional): Options added for specific hosts, by host URL
+            **kwargs: Keyword arguments of the method
+
+        Returns:
+            The method's result
+        """
+        error = None
+        for endpoint in self._candidates(route):
+            self._acquire(endpoint, route if method in ('chat', 'generate') else None)
+            try:
+                return getattr(endpoint.client, method)(*args, **_host_kwargs(kwargs, endpoint, host_options))
+            except Exception as e:
+                if not _retriable(e):
+                    raise
+                error = e
+                self._record_failure(endpoint, route, e)
+                metrics.incr('pool.failovers')
+            finally:
+                self._release(endpoint)
+        raise error or ConnectionError("No Ollama endpoint configured")
+
+    def _stream(self, method, model, info=None, host_options=None, **kwargs):
+        """Stream a chat or generate call, failing over until the first chunk is received"""
+        tried = []
+        error = ConnectionError("No Ollama endpoint configured")
+        while True:
+            candidates = self._candidates(model, exclude=tried)
+            if not candidates:
+                raise error
+            endpoint = candidates[0]
+            tried.append(endpoint)
+
+            self._acquire(endpoint, model)
+            if info is not None:
+                info['endpoint'] = endpoint.name
+            stream = None
+            try:
+                stream = getattr(endpoint.client, method)(
+                    model=model, stream=True, **_host_kwargs(kwargs, endpoint, host_options)
+                )
+                first_chunk = next(stream)
+            except StopIteration:
+                self._release(endpoint)
+                return
+            except Exception as e:
+                self._release(endpoint)
+                if not _retriable(e):
+                    raise
+                # Nothing was produced yet, so the request can move to another host
+                error = e
+                if isinstance(e, httpx.TimeoutException):
+                    phase = 'connect' if isinstance(e, httpx.ConnectTimeout) else 'first_token'
+                    self.record_timeout(endpoint.name, phase)
+                self._record_failure(endpoint, model, e)
+                metrics.incr('pool.failovers')
+                logging.warning(f"Retrying {model} elsewhere after {endpoint.name} failed: {e}")
+                continue
+
+            metrics.incr(f'pool.requests.{endpoint.name}')
+            try:
+                yield first_chunk
+                yield from stream
+            finally:
+                self._release(endpoint)
+                if hasattr(stream, 'close'):
+                    stream.close()
+            return
+
+    @staticmethod
+    def record_timeout(endpoint_name, phase):
+        """
+        Count a generation deadline that was hit
+
+        Args:
+            endpoint_name (str): Endpoint serving the generation, None if unknown
+            phase (str): 'connect', 'first_token', 'chunk_gap' or 'total'
+        """
+        metrics.incr('generate.timeouts')
+        metrics.incr(f'generate.timeouts.{phase}')
+        if endpoint_name:
+            metrics.incr(f'pool.timeouts.{endpoint_name}')
+
+    def list_models(self):
+        """
+        Return the models installed on any reachable endpoint
+
+        Returns:
+            list: Model entries as returned by ollama list, one per name
+        """
+        entries = {}
+        reached = False
+        error = None
+        for endpoint in self.endpoints:
+            try:
+                models = _field(endpoint.client.list(), 'models') or []
+            except Exception as e:
+                error = e
+                self._mark_failed(endpoint, e)
+                continue
+            reached = True
+            with self._lock:
+                endpoint.healthy = True
+                endpoint.models = {_field(entry, 'name', 'model') for entry in models}
+            for entry in models:
+                entries.setdefault(_field(entry, 'name', 'model'), entry)
+        if not reached and error is not None:
+            raise error
+        return list(entries.values())
+
+    def show(self, model):
+        """Describe a model using an endpoint that has it"""
+        return self.call('show', model, route=model)
+
+    def healthy_count(self):
+        """Return the number of endpoints that answered their last check"""
+        with self._lock:
+            return sum(endpoint.healthy for endpoint in self.endpoints)
+
+    def status(self):
+        """
+        Describe every endpoint
+
+        Returns:
+            list: Endpoint states as plain dicts
+        """
+        with self._lock:
+            return [endpoint.describe() for endpoint in self.endpoints]
+
+
+# Shared pool used across the application
+pool = EndpointPool(check_interval=settings['ollama']['check_interval'])
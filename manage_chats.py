@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import argparse
+
+from chat_ui.chat_manager import storage
+from chat_ui.chat_manager.manager import ChatManager
+from chat_ui.chat_manager.export import EXPORT_FORMATS, export_chats, import_chats
+
+
+def _format_size(num_bytes):
+    """Format a byte count for humans"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num_bytes) < 1024 or unit == 'GB':
+            return f"{num_bytes:.1f} {unit}" if unit != 'B' else f"{num_bytes} B"
+        num_bytes /= 1024
+
+
+def _time_load(path, data):
+    """Return the seconds needed to decode a chat file's bytes"""
+    start = time.perf_counter()
+    storage.decode_chat(path, data)
+    return time.perf_counter() - start
+
+
+def migrate(chats_dir, threshold, dry_run=False):
+    """
+    Rewrite every chat file in the format its size calls for, index the
+    files that have no offset index, and report disk savings and load-time impact
+
+    Args:
+        chats_dir (str): Chats directory
+        threshold (int): Size in bytes above which chats are compressed, None disables compression
+        dry_run (bool, optional): Only report what would change. Defaults to False.
+    """
+    totals = {'files': 0, 'changed': 0, 'indexed': 0, 'before': 0, 'after': 0, 'load_before': 0.0, 'load_after': 0.0}
+
+    for filename in sorted(os.listdir(chats_dir)):
+        if not storage.chat_id_from_filename(filename):
+            continue
+
+        path = os.path.join(chats_dir, filename)
+        try:
+            with open(path, 'rb') as f:
+                old_data = f.read()
+            chat = storage.decode_chat(path, old_data)
+            # Read the file before timing so only decoding is measured
+            load_before = _time_load(path, old_data)
+        except Exception as e:
+            print(f"Error reading chat file {filename}: {e}")
+            continue
+
+        suffix, new_data = storage.encode_chat(chat, threshold)
+        new_path = os.path.join(chats_dir, f"{chat['id']}{suffix}")
+        load_after = _time_load(new_path, new_data)
+
+        totals['files'] += 1
+        totals['before'] += len(old_data)
+        totals['after'] += len(new_data)
+        totals['load_before'] += load_before
+        totals['load_after'] += load_after
+
+        if new_path != path:
+            totals['changed'] += 1
+            print(f"{filename} -> {os.path.basename(new_path)}: "
+                  f"{_format_size(len(old_data))} -> {_format_size(len(new_data))}")
+            if not dry_run:
+                storage.write_chat_file(chats_dir, chat, threshold)
+        elif storage.read_chat_index(path) is None:
+            # Written before offset indexes, or by another tool
+            totals['indexed'] += 1
+            if not dry_run:
+                storage.write_chat_file(chats_dir, chat, threshold)
+
+    saved = totals['before'] - totals['after']
+    ratio = (saved / totals['before'] * 100) if totals['before'] else 0.0
+    print()
+    print(f"Chat files:     {totals['files']} ({totals['changed']} {'to convert' if dry_run else 'converted'})")
+    print(f"Unindexed:      {totals['indexed']} ({'to index' if dry_run else 'indexed'})")
+    print(f"Disk usage:     {_format_size(totals['before'])} -> {_format_size(totals['after'])} "
+          f"({_format_size(saved)} saved, {ratio:.1f}%)")
+    print(f"Decode time:    {totals['load_before'] * 1000:.1f} ms -> {totals['load_after'] * 1000:.1f} ms")
+
+
+def export_store(chats_dir, output, fmt, workers):
+    """
+    Export every chat into one bundle, one chat at a time
+
+    Args:
+        chats_dir (str): Chats directory
+        output (str): Output file, '-' for stdout
+        fmt (str): Bundle format
+        workers (int): Rendering processes for Markdown/HTML
+    """
+    chat_manager = ChatManager(chats_dir, preload=False)
+    out = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8')
+    try:
+        start = time.perf_counter()
+        count = export_chats(chat_manager.iter_chats(), out, fmt, workers)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        chat_manager.close()
+    print(f"Exported {count} chats as {fmt} in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+
+def import_store(chats_dir, source, batch_size, replace, threshold):
+    """
+    Import a JSONL bundle into the chats directory
+
+    Args:
+        chats_dir (str): Chats directory
+        source (str): JSONL bundle, '-' for stdin
+        batch_size (int): Chats written between two disk syncs
+        replace (bool): Overwrite existing chats
+        threshold (int): Size in bytes above which chats are compressed
+    """
+    os.makedirs(chats_dir, exist_ok=True)
+    stream = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8')
+    try:
+        counts = import_chats(chats_dir, stream, batch_size, replace, threshold)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print(f"Imported {counts['imported']} chats, skipped {counts['skipped']} existing, "
+          f"{counts['invalid']} invalid")
+
+
+def main():
+    """
+    Maintenance commands for the chat store
+    """
+    parser = argparse.ArgumentParser(description="Ollama Chat store maintenance")
+    parser.add_argument('--chats-dir', default='chats', help="Chats directory (default: chats)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser(
+        'migrate', help="Compress large chat files and decompress small ones"
+    )
+    migrate_parser.add_argument(
+        '--threshold', type=int, default=storage.DEFAULT_COMPRESS_THRESHOLD,
+        help="Size in bytes above which chats are compressed (default: %(default)s, 0 compresses everything)"
+    )
+    migrate_parser.add_argument(
+        '--no-compression', action='store_true', help="Store every chat as plain JSON"
+    )
+    migrate_parser.add_argument('--dry-run', action='store_true', help="Only report what would change")
+
+    export_parser = subparsers.add_parser('export', help="Export all chats into one bundle")
+    export_parser.add_argument('output', help="Output file ('-' for stdout)")
+    export_parser.add_argument('--format', choices=EXPORT_FORMATS, default='jsonl',
+                               help="Bundle format (default: %(default)s)")
+    export_parser.add_argument('--workers', type=int, default=None,
+                               help="Processes rendering Markdown/HTML (default: CPU count, 0 disables)")
+
+    import_parser = subparsers.add_parser('import', help="Import a JSONL bundle")
+    import_parser.add_argument('input', help="JSONL bundle ('-' for stdin)")
+    import_parser.add_argument('--batch-size', type=int, default=100,
+                               help="Chats written between two disk syncs (default: %(default)s)")
+    import_parser.add_argument('--replace', action='store_true', help="Overwrite chats that already exist")
+    import_parser.add_argument('--threshold', type=int, default=storage.DEFAULT_COMPRESS_THRESHOLD,
+                               help="Size in bytes above which chats are compressed (default: %(default)s)")
+
+    args = parser.parse_args()
+    chats_dir = os.path.abspath(args.chats_dir)
+
+    if args.command == 'migrate':
+        threshold = None if args.no_compression else args.threshold
+        migrate(chats_dir, threshold, dry_run=args.dry_run)
+    elif args.command == 'export':
+        export_store(chats_dir, args.output, args.format, args.workers)
+    elif args.command == 'import':
+        import_store(chats_dir, args.input, args.batch_size, args.replace, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import os
+import json
+import logging
+import threading
+
+from endpoint_pool import pool, _field
+
+# Upper bound for the context window requested by default, larger windows
+# cost memory on the server even when the chat is short
+MAX_DEFAULT_NUM_CTX = 8192
+
+
+def _as_dict(value):
+    """Convert an ollama response object to a plain dict"""
+    if value is None:
+        return {}
+    if hasattr(value, 'model_dump'):
+        return value.model_dump()
+    return dict(value)
+
+
+class ModelRegistry:
+    """
+    Cache of installed models and their metadata.
+
+    Metadata from ``list`` and ``show`` is stored on disk keyed by model
+    digest, so it is only fetched again when a model is pulled or updated.
+    The cache is refreshed in a background thread.
+    """
+
+    def __init__(self, cache_path='model_cache.json', refresh_interval=300):
+        """
+        Initialize the registry from its on-disk cache
+
+        Args:
+            cache_path (str, optional): Cache file. Defaults to 'model_cache.json'.
+            refresh_interval (int, optional): Seconds between background refreshes. Defaults to 300.
+        """
+        self.cache_path = os.path.abspath(cache_path)
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._refresh_thread = None
+        self._stop_event = threading.Event()
+
+        cache = self._load_cache()
+        # name -> digest, digest -> metadata
+        self._names = cache.get('names', {})
+        self._models = cache.get('models', {})
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, OSError) as e:
+            logging.error(f"Error loading model cache: {e}")
+            return {}
+
+    def _save_cache(self):
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'names': self._names, 'models': self._models}, f, indent=4)
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def _describe(name, entry, show):
+        """Build the cached metadata of a model from its list and show responses"""
+        details = _as_dict(_field(entry, 'details'))
+        model_info = _as_dict(_field(show, 'modelinfo', 'model_info'))
+        template = _field(show, 'template') or ''
+
+        architecture = model_info.get('general.architecture')
+        context_length = None
+        image_size = None
+        for key, value in model_info.items():
+            if key.endswith('.context_length') and context_length is None:
+                context_length = value
+            elif key.endswith('.vision.image_size') and image_size is None:
+                image_size = value
+
+        basename = (model_info.get('general.basename') or '').lower()
+        if '<｜User｜>' in template or 'deepseek' in basename or (architecture or '').startswith('deepseek'):
+            prompt_format = 'deepseek'
+        else:
+            prompt_format = None
+
+        return {
+            'name': name,
+            'size': _field(entry, 'size'),
+            'family': details.get('family'),
+            'families': details.get('families'),
+            'parameter_size': details.get('parameter_size'),
+            'quantization_level': details.get('quantization_level'),
+            'architecture': architecture,
+            'context_length': context_length,
+            'image_size': image_size,
+            'capabilities': list(_field(show, 'capabilities') or []),
+            'prompt_format': prompt_format,
+        }
+
+    def refresh(self):
+        """
+        Fetch the model list and describe models whose digest is unknown
+
+        Returns:
+            bool: True if the set of models changed
+        """
+        entries = pool.list_models()
+
+        names = {}
+        models = {}
+        for entry in entries:
+            name = _field(entry, 'name', 'model')
+            digest = _field(entry, 'digest') or name
+            names[name] = digest
+            with self._lock:
+                cached = self._models.get(digest)
+            if cached is None or 'image_size' not in cached:
+                # Unknown digest, or described before image sizes were recorded
+                try:
+                    cached = self._describe(name, entry, pool.show(name))
+                except Exception as e:
+                    logging.error(f"Error describing model {name}: {e}")
+                    cached = self._describe(name, entry, {})
+            models[digest] = cached
+
+        with self._lock:
+            changed = names != self._names
+            self._names = names
+            self._models = models
+            try:
+                self._save_cache()
+            except OSError as e:
+                logging.error(f"Error saving model cache: {e}")
+
+        if changed:
+            for listener in list(self._listeners):
+                listener(self.model_names())
+        return changed
+
+    def add_listener(self, callback):
+        """
+        Be notified when the installed models change
+
+        Args:
+            callback (callable): Called with the new list of names, from the refresh thread
+        """
+        self._listeners.append(callback)
+
+    def start_background_refresh(self):
+        """Refresh now and then periodically in a daemon thread"""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+
+        def worker():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logging.error(f"Error refreshing model registry: {e}")
+                if self._stop_event.wait(self.refresh_interval):
+                    return
+
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=worker, daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self):
+        """Stop background refreshes"""
+        self._stop_event.set()
+
+    def model_names(self):
+        """
+        Return the names of installed models, refreshing synchronously if
+        nothing is cached yet
+
+        Returns:
+            list: Model names
+        """
+        with self._lock:
+            empty = not self._names
+        if empty:
+            self.refresh()
+        with self._lock:
+            return sorted(self._names)
+
+    def get(self, model):
+        """
+        Return the cached metadata of a model
+
+        Args:
+            model (str): Model name
+
+        Returns:
+            dict: Metadata, empty if the model is unknown
+        """
+        with self._lock:
+            digest = self._names.get(model)
+            return dict(self._models.get(digest, {})) if digest else {}
+
+    def smallest_model(self):
+        """Return the name of the smallest installed model, or None"""
+        with self._lock:
+            sized = [
+                (self._models.get(digest, {}).get('size') or 0, name)
+                for name, digest in self._names.items()
+            ]
+        return min(sized)[1] if sized else None
+
+    def image_support(self, model):
+        """
+        Tell whether a model accepts images, and at which size
+
+        Args:
+            model (str): Model name
+
+        Returns:
+            tuple: (accepts images, None if unknown; input side in pixels or None)
+        """
+        info = self.get(model)
+        if not info:
+            return None, None
+        capabilities = info.get('capabilities') or []
+        accepts = 'vision' in capabilities or bool(info.get('image_size'))
+        # Older servers don't report capabilities
+        return (accepts if capabilities or accepts else None), info.get('image_size')
+
+    def prompt_format(self, model):
+        """
+        Return the prompt format a model expects
+
+        Args:
+            model (str): Model name
+
+        Returns:
+            str: Format name such as 'deepseek', or None for the plain chat format
+        """
+        return self.get(model).get('prompt_format')
+
+    def default_options(self, model):
+        """
+        Request options tuned to a model's metadata
+
+        Args:
+            model (str): Model name
+
+        Returns:
+            dict: Options such as num_ctx, empty if nothing is known
+        """
+        options = {}
+        context_length = self.get(model).get('context_length')
+        if context_length:
+            options['num_ctx'] = min(int(context_length), MAX_DEFAULT_NUM_CTX)
+        return options
+
+
+# Shared instance used across the application
+registry = ModelRegistry()
@@ -1,10 +1,18 @@
-import ollama
 import threading
 import queue
 import re
+import json
+import time
 import traceback
 import logging
 
+from model_registry import registry
+from endpoint_pool import pool
+from prompt_adapters import get_adapter
+from chat_ui.utils.images import image_encoder
+from chat_ui.utils.metrics import metrics
+from chat_ui.utils.settings import settings
+
 # Configure logging
 logging.basicConfig(
     level=logging.DEBUG, 
@@ -13,6 +21,141 @@ logging.basicConfig(
     filemode='a'
 )
 
+DEADLINE_PHASES = ('first_token_s', 'chunk_gap_s', 'total_s')
+
+
+def deadlines_for(model):
+    """
+    Return the generation deadlines of a model
+
+    Args:
+        model (str): Model name
+
+    Returns:
+        dict: Seconds for first_token_s, chunk_gap_s and total_s, None when disabled
+    """
+    config = settings['deadlines']
+    overrides = config['models'].get(model) or config['models'].get((model or '').split(':')[0]) or {}
+    deadlines = {}
+    for phase in DEADLINE_PHASES:
+        deadlines[phase] = overrides.get(phase, config[phase]) or None
+    return deadlines
+
+
+def profile_names():
+    """Return the names of the configured performance profiles"""
+    return list(settings['profiles']['presets'])
+
+
+def generation_profile(name=None):
+    """
+    Return the request settings of a performance profile
+
+    Args:
+        name (str, optional): Profile name. Unknown names and None use the default profile.
+
+    Returns:
+        dict: 'options', 'keep_alive' (None for the server default) and per-host
+            option overrides under 'hosts'
+    """
+    config = settings['profiles']
+    presets = config['presets']
+    if name is not None and name not in presets:
+        logging.warning(f"Unknown performance profile {name}, using {config['default']}")
+    preset = presets.get(name) or presets.get(config['default']) or {}
+    return {
+        'options': dict(preset.get('options') or {}),
+        'keep_alive': preset.get('keep_alive'),
+        'hosts': dict(preset.get('hosts') or {}),
+    }
+
+
+def _wire_size(payload):
+    """Return the size in bytes of a request body"""
+    return len(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+class GenerationTimeout(Exception):
+    """Raised when a streamed generation misses one of its deadlines"""
+
+    WAITED_FOR = {
+        'first_token': "first token",
+        'chunk_gap': "new token",
+        'total': "complete reply",
+    }
+
+    def __init__(self, phase, seconds):
+        super().__init__(f"no {self.WAITED_FOR[phase]} within {seconds:g} s")
+        self.phase = phase
+        self.seconds = seconds
+
+
+def stream_with_deadlines(open_stream, deadlines):
+    """
+    Yield the chunks of a streamed generation, enforcing deadlines
+
+    The stream is read by a helper thread so a silent server can't block
+    the caller. When a deadline is missed the helper stops at its next
+    chunk, or when the client's read timeout (see endpoint_pool.read_timeout)
+    ends a stalled read, and closes the stream, which drops the connection
+    and releases the endpoint.
+
+    Args:
+        open_stream (callable): Returns the stream of response chunks, called by the helper
+        deadlines (dict): Deadlines from deadlines_for()
+
+    Raises:
+        GenerationTimeout: A deadline was missed
+    """
+    chunks = queue.Queue()
+    abandoned = threading.Event()
+
+    def reader():
+        stream = open_stream()
+        try:
+            for chunk in stream:
+                if abandoned.is_set():
+                    return
+                chunks.put(('chunk', chunk))
+            chunks.put(('end', None))
+        except Exception as e:
+            chunks.put(('error', e))
+        finally:
+            stream.close()
+
+    threading.Thread(target=reader, daemon=True).start()
+
+    start = last_chunk = time.perf_counter()
+    first = True
+    try:
+        while True:
+            now = time.perf_counter()
+            if first:
+                phase, limit, since = 'first_token', deadlines['first_token_s'], start
+            else:
+                phase, limit, since = 'chunk_gap', deadlines['chunk_gap_s'], last_chunk
+            wait = limit - (now - since) if limit else None
+            if deadlines['total_s']:
+                total_wait = deadlines['total_s'] - (now - start)
+                if wait is None or total_wait < wait:
+                    phase, limit, wait = 'total', deadlines['total_s'], total_wait
+
+            try:
+                kind, value = chunks.get(timeout=max(wait, 0) if wait is not None else None)
+            except queue.Empty:
+                raise GenerationTimeout(phase, limit)
+
+            if kind == 'error':
+                raise value
+            if kind == 'end':
+                return
+            first = False
+            last_chunk = time.perf_counter()
+            yield value
+    finally:
+        abandoned.set()
+
+
 class OllamaModelHandler:
     @staticmethod
     def get_available_models():
@@ -23,13 +166,27 @@ class OllamaModelHandler:
             list: Names of available models
         """
         try:
-            models = ollama.list()
-            return [model['name'] for model in models['models']]
+            return registry.model_names()
         except Exception as e:
             logging.error(f"Error retrieving models: {e}")
             print(f"Error retrieving models: {e}")
             return []
 
+    @staticmethod
+    def get_smallest_model():
+        """
+        Retrieve the smallest installed model, used for background tasks
+        
+        Returns:
+            str: Name of the smallest model, or None if no model is available
+        """
+        try:
+            registry.model_names()
+            return registry.smallest_model()
+        except Exception as e:
+            logging.error(f"Error retrieving models: {e}")
+            return None
+
     @staticmethod
     def generate_response(model, messages):
         """
@@ -43,15 +200,15 @@ class OllamaModelHandler:
             str: Generated response
         """
         try:
-            # Special handling for DeepSeek model
-            if 'deepseek' in model.lower():
-                messages = OllamaModelHandler._prepare_deepseek_messages(messages)
+            # Format the history for the model family (e.g. DeepSeek role tokens)
+            messages = get_adapter(model).format_messages(messages)
             
             logging.debug(f"Sending messages to model {model}: {messages}")
             
-            response = ollama.chat(
+            response = pool.chat(
                 model=model, 
-                messages=messages
+                messages=messages,
+                options=registry.default_options(model)
             )
             
             logging.debug(f"Received response from {model}: {response}")
@@ -62,56 +219,286 @@ class OllamaModelHandler:
             return f"Error generating response: {e}"
 
     @staticmethod
-    def _prepare_deepseek_messages(messages):
+    def stream_chat(model, messages, options=None, info=None, profile=None):
         """
-        Prepare messages for DeepSeek model with special formatting
+        Stream a chat completion from the specified model, on the
+        endpoint of the pool best placed to serve it
         
         Args:
-            messages (list): Original conversation messages
+            model (str): Name of the Ollama model
+            messages (list): Conversation history
+            options (dict, optional): Model options sent with the request,
+                on top of the defaults tuned for the model and the profile's
+            info (dict, optional): Receives the name of the serving endpoint under 'endpoint'
+            profile (str, optional): Performance profile. Defaults to the default profile.
         
+        Yields:
+            dict: Raw response chunks, the last one has 'done' set
+        """
+        # Format the history for the model family; only new turns are formatted
+        request_messages = get_adapter(model).format_messages(messages)
+        if any(msg.get('images') for msg in request_messages):
+            request_messages = OllamaModelHandler._with_images(model, request_messages)
+        yield from pool.chat(
+            model=model,
+            messages=request_messages,
+            stream=True,
+            info=info,
+            **OllamaModelHandler._request_kwargs(model, options, profile)
+        )
+
+    @staticmethod
+    def _request_kwargs(model, options=None, profile=None):
+        """Return the options, keep_alive and host options of a request"""
+        profile = generation_profile(profile)
+        request_options = registry.default_options(model)
+        request_options.update(profile['options'])
+        request_options.update(options or {})
+        kwargs = {'options': request_options} if request_options else {}
+        if profile['keep_alive'] is not None:
+            kwargs['keep_alive'] = profile['keep_alive']
+        if profile['hosts']:
+            kwargs['host_options'] = profile['hosts']
+        return kwargs
+
+    @staticmethod
+    def _context_request(messages, context):
+        """
+        Split a history into what a generate request with context needs
+
+        Args:
+            messages (list): Conversation history, ending with the new user message
+            context (array): Context of the history before that message, None if unknown
+
         Returns:
-            list: Formatted messages for DeepSeek
+            tuple: (system prompt or None, message to send), None when the history
+                doesn't end with a user message
         """
-        formatted_messages = []
-        
-        # Add system message if exists
-        system_message = next((msg for msg in messages if msg.get('role') == 'system'), None)
-        if system_message:
-            formatted_messages.append({
-                'role': 'system',
-                'content': system_message['content']
+        if not messages or messages[-1]['role'] != 'user':
+            return None
+        earlier = messages[:-1]
+        if context is not None and earlier:
+            return None, messages[-1]
+        system = '\n\n'.join(msg['content'] for msg in earlier if msg['role'] == 'system') or None
+        turns = [msg for msg in earlier if msg['role'] != 'system']
+        if not turns:
+            # A new conversation starts its context with its first turn
+            return system, messages[-1]
+        # No context covers the history, after an edit, a regeneration, a turn sent
+        # with the whole history or in a chat older than conversation mode: send
+        # the history as a transcript in one turn, the context of its reply
+        # covers it and the following turns extend that context again
+        metrics.incr('context.reseeds')
+        return system, OllamaModelHandler._transcript_turn(turns + [messages[-1]])
+
+    @staticmethod
+    def _transcript_turn(messages):
+        """
+        Merge conversation turns into a single user message
+
+        Args:
+            messages (list): User and assistant messages, the last one being the new user turn
+
+        Returns:
+            dict: User message with the transcript and every attached image
+        """
+        names = {'user': 'User', 'assistant': 'Assistant'}
+        transcript = '\n\n'.join(f"{names.get(msg['role'], msg['role'])}: {msg['content']}" for msg in messages)
+        message = {'role': 'user', 'content': f"{transcript}\n\n{names['assistant']}:"}
+        images = [image for msg in messages for image in (msg.get('images') or [])]
+        if images:
+            message['images'] = images
+        return message
+
+    @staticmethod
+    def stream_conversation(model, messages, context=None, info=None, profile=None):
+        """
+        Stream a reply through /api/generate, sending the context returned with
+        the previous reply and the new turn instead of the whole history.
+        Histories the context does not cover, and requests the server rejects
+        before answering, go through stream_chat instead.
+
+        Args:
+            model (str): Name of the Ollama model
+            messages (list): Conversation history, ending with the new user message
+            context (array, optional): Context of the history before that message
+            info (dict, optional): Receives 'endpoint', the 'mode' used ('context' or
+                'history') and the request's size in bytes under 'request_bytes'. Context
+                requests also get the size the full history would have had under
+                'history_bytes'. Sizes leave images out.
+            profile (str, optional): Performance profile. Defaults to the default profile.
+
+        Yields:
+            dict: Response chunks shaped like chat chunks; the last one has 'done' set
+                and, in context mode, the new 'context'
+        """
+        info = info if info is not None else {}
+        request = OllamaModelHandler._context_request(messages, context)
+        if request is not None:
+            system, message = request
+            adapter = get_adapter(model)
+            prompt = adapter.format_messages([message])
+            if prompt and prompt[0].get('images'):
+                prompt = OllamaModelHandler._with_images(model, prompt)
+            kwargs = OllamaModelHandler._request_kwargs(model, profile=profile)
+            if context is not None:
+                kwargs['context'] = list(context)
+            if system:
+                kwargs['system'] = system
+            if prompt and prompt[0].get('images'):
+                kwargs['images'] = prompt[0]['images']
+            prompt_text = prompt[0]['content'] if prompt else message['content']
+
+            info['mode'] = 'context'
+            info['request_bytes'] = _wire_size(dict(kwargs, model=model, prompt=prompt_text))
+            info['history_bytes'] = _wire_size({
+                'model': model,
+                'messages': [
+                    {key: value for key, value in msg.items() if key != 'images'}
+                    for msg in adapter.format_messages(messages)
+                ],
+                'options': kwargs.get('options'),
             })
+            stream = pool.generate(model=model, prompt=prompt_text, stream=True, info=info, **kwargs)
+            started = False
+            try:
+                for chunk in stream:
+                    started = True
+                    reply = dict(chunk)
+                    reply['message'] = {'role': 'assistant', 'content': reply.pop('response', '')}
+                    yield reply
+                return
+            except Exception as e:
+                if started:
+                    raise
+                logging.warning(f"Context request to {model} failed, sending the full history: {e}")
+                metrics.incr('context.fallbacks')
+            finally:
+                stream.close()
+
+        # The history path, also measured so both can be compared
+        info['mode'] = 'history'
+        request_messages = get_adapter(model).format_messages(messages)
+        kwargs = OllamaModelHandler._request_kwargs(model, profile=profile)
+        info['request_bytes'] = _wire_size({
+            'model': model,
+            'messages': [{key: value for key, value in msg.items() if key != 'images'} for msg in request_messages],
+            'options': kwargs.get('options'),
+        })
+        yield from OllamaModelHandler.stream_chat(model, messages, info=info, profile=profile)
+
+    @staticmethod
+    def _with_images(model, messages):
+        """
+        Encode the attached images of request messages, at the size the model
+        works at, or drop them for models known not to accept images
+
+        Args:
+            model (str): Name of the Ollama model
+            messages (list): Formatted messages, 'images' holding file paths
+
+        Returns:
+            list: Messages ready to send
+        """
+        accepts, image_size = registry.image_support(model)
+        if accepts is False:
+            logging.warning(f"{model} does not accept images, sending the text only")
+            return [
+                {key: value for key, value in msg.items() if key != 'images'}
+                for msg in messages
+            ]
+        return image_encoder.encode_messages(messages, image_size or settings['images']['max_side'])
+
+    @staticmethod
+    def prefill(model, messages, cancel_event=None, profile=None):
+        """
+        Send the history with no output requested, so the server evaluates
+        it and keeps the result in its prompt cache for the next request
+        
+        Args:
+            model (str): Name of the Ollama model
+            messages (list): Conversation history to evaluate
+            cancel_event (threading.Event, optional): Set to abandon the request
+            profile (str, optional): Performance profile of the chat
         
-        # Format user and assistant messages
-        for msg in messages:
-            if msg['role'] == 'user':
-                formatted_messages.append({
-                    'role': 'user',
-                    'content': f"<｜User｜>{msg['content']}"
-                })
-            elif msg['role'] == 'assistant':
-                formatted_messages.append({
-                    'role': 'assistant',
-                    'content': f"<｜Assistant｜>{msg['content']}"
-                })
-        
-        return formatted_messages
+        Returns:
+            dict: prompt_eval_count and prompt_eval_duration (ns), empty if cancelled
+        """
+        # Same options as a real request, a different num_ctx would reload the model
+        stream = OllamaModelHandler.stream_chat(
+            model, messages, options={'num_predict': 0}, profile=profile
+        )
+        try:
+            for chunk in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    return {}
+                if chunk['done']:
+                    return {
+                        'prompt_eval_count': chunk.get('prompt_eval_count') or 0,
+                        'prompt_eval_duration': chunk.get('prompt_eval_duration') or 0,
+                    }
+        finally:
+            # Closing the stream drops the connection of a cancelled request
+            stream.close()
+        return {}
 
 class ModelChatThread:
-    def __init__(self, model, messages, response_queue):
+    # Interactive generations in progress, background tasks wait for zero
+    _active_generations = 0
+    _activity = threading.Condition()
+
+    @classmethod
+    def active_generations(cls):
+        """Return the number of interactive generations in progress"""
+        with cls._activity:
+            return cls._active_generations
+
+    @classmethod
+    def wait_until_idle(cls, timeout=None):
+        """
+        Block until no interactive generation is running
+        
+        Args:
+            timeout (float, optional): Maximum seconds to wait
+        
+        Returns:
+            bool: True if idle, False on timeout
+        """
+        with cls._activity:
+            return cls._activity.wait_for(lambda: cls._active_generations == 0, timeout)
+
+    def __init__(self, model, messages, response_queue, on_token=None, profile=None,
+                 reuse_context=False, context=None):
         """
         Initialize a chat thread for generating model responses
         
         Args:
             model (str): Name of the Ollama model
             messages (list): Conversation history
-            response_queue (queue.Queue): Queue to send responses
+            response_queue (queue.Queue): Queue to send responses, None when
+                the generation is run synchronously with generate()
+            on_token (callable, optional): Called from the generating thread with
+                each raw content chunk as it is streamed
+            profile (str, optional): Performance profile of the chat. Defaults to the default profile.
+            reuse_context (bool, optional): Conversation mode: send the context returned with
+                the previous reply and the new turn instead of the history, see
+                OllamaModelHandler.stream_conversation. Defaults to False.
+            context (array, optional): Context of the history before the last message
         """
         self.model = model
+        self.profile = profile
+        self.reuse_context = reuse_context
+        self.context_in = context
+        # Context returned with the reply in conversation mode, to store for the next turn
+        self.context = None
         self.messages = messages
         self.response_queue = response_queue
+        self.on_token = on_token
         self._thread = None
 
+        # Timing and token statistics of the last generation
+        self.stats = {}
+
     def start(self):
         """Start the chat thread"""
         self._thread = threading.Thread(target=self._run, daemon=True)
@@ -164,27 +551,80 @@ class ModelChatThread:
             logging.error(traceback.format_exc())
             return response
 
-    def _run(self):
+    def generate(self):
         """
-        Run the chat generation in a separate thread
-        Streams and collects the full response
+        Stream and collect the full response on the calling thread
+        
+        Returns:
+            tuple: (response, think_content, is_complete)
+        """
+        with ModelChatThread._activity:
+            ModelChatThread._active_generations += 1
+        try:
+            return self._generate()
+        finally:
+            with ModelChatThread._activity:
+                ModelChatThread._active_generations -= 1
+                ModelChatThread._activity.notify_all()
+
+    def _stream(self, deadlines, info):
+        """
+        Yield the response chunks, enforcing the generation deadlines
+
+        Args:
+            deadlines (dict): Deadlines from deadlines_for()
+            info (dict): Receives the serving endpoint
+
+        Raises:
+            GenerationTimeout: A deadline was missed
         """
+        def open_stream():
+            if self.reuse_context:
+                return OllamaModelHandler.stream_conversation(
+                    self.model, self.messages, self.context_in, info=info, profile=self.profile
+                )
+            return OllamaModelHandler.stream_chat(
+                self.model, self.messages, info=info, profile=self.profile
+            )
+
+        yield from stream_with_deadlines(open_stream, deadlines)
+
+    def _generate(self):
+        """Stream the response and clean it, see generate()"""
+        info = {}
         try:
             logging.debug(f"Starting chat thread for model {self.model}")
             logging.debug(f"Messages: {self.messages}")
             
             # Stream the response
+            start = time.perf_counter()
+            self.stats = {}
+            self.context = None
             full_response = ""
-            for chunk in ollama.chat(
-                model=self.model, 
-                messages=self.messages,
-                stream=True
-            ):
+            for chunk in self._stream(deadlines_for(self.model), info):
+                if 'first_token_s' not in self.stats:
+                    self.stats['first_token_s'] = time.perf_counter() - start
                 if chunk['done']:
+                    for key in ('prompt_eval_count', 'prompt_eval_duration', 'eval_count', 'eval_duration'):
+                        if chunk.get(key) is not None:
+                            self.stats[key] = chunk[key]
+                    if chunk.get('context') is not None:
+                        self.context = chunk['context']
                     break
                 if 'message' in chunk:
                     part = chunk['message'].get('content', '')
                     full_response += part
+                    if part and self.on_token:
+                        self.on_token(part)
+            self.stats['total_s'] = time.perf_counter() - start
+            self.stats['endpoint'] = info.get('endpoint')
+            metrics.observe('generate.total', self.stats['total_s'])
+            if 'first_token_s' in self.stats:
+                metrics.observe('generate.first_token', self.stats['first_token_s'])
+            if self.stats.get('prompt_eval_duration'):
+                metrics.observe('generate.prompt_eval', self.stats['prompt_eval_duration'] / 1e9)
+            if self.reuse_context:
+                self._record_conversation(info)
             
             logging.debug(f"Full response received: {full_response}")
             
@@ -198,29 +638,50 @@ class ModelChatThread:
             logging.debug(f"Final clean response: {final_clean_response}")
             logging.debug(f"Final clean think content: {final_clean_think}")
             
-            # Send the complete response with think content
+            # Return the complete response with think content
             if final_clean_response:
-                self.response_queue.put((
-                    self.model, 
-                    final_clean_response, 
-                    final_clean_think, 
-                    True
-                ))
-            else:
-                logging.warning("No clean response generated")
-                self.response_queue.put((
-                    self.model, 
-                    "I'm sorry, but I couldn't generate a meaningful response.", 
-                    "", 
-                    False
-                ))
+                return final_clean_response, final_clean_think, True
+
+            logging.warning("No clean response generated")
+            return "I'm sorry, but I couldn't generate a meaningful response.", "", False
+
+        except GenerationTimeout as e:
+            self.stats['timeout'] = e.phase
+            self.stats['endpoint'] = info.get('endpoint')
+            pool.record_timeout(info.get('endpoint'), e.phase)
+            error_msg = f"{self.model} timed out: {e}"
+            logging.warning(f"{error_msg} (endpoint {info.get('endpoint') or 'unknown'})")
+            return error_msg, "", False
         
         except Exception as e:
             # Error handling
             error_msg = f"Error in chat with {self.model}: {str(e)}"
             logging.error(error_msg)
             logging.error(traceback.format_exc())
-            self.response_queue.put((self.model, error_msg, "", False))
+            return error_msg, "", False
+
+    def _record_conversation(self, info):
+        """Report the request size and prompt evaluation time of a conversation mode turn"""
+        mode = info.get('mode')
+        if mode is None:
+            return
+        self.stats['mode'] = mode
+        self.stats['request_bytes'] = info.get('request_bytes')
+        metrics.incr(f'{mode}.requests')
+        metrics.incr(f'{mode}.request_bytes', info.get('request_bytes') or 0)
+        if mode == 'context':
+            self.stats['history_bytes'] = info.get('history_bytes')
+            metrics.incr('context.history_bytes', info.get('history_bytes') or 0)
+        if self.stats.get('prompt_eval_duration'):
+            metrics.observe(f'{mode}.prompt_eval', self.stats['prompt_eval_duration'] / 1e9)
+
+    def _run(self):
+        """
+        Run the chat generation in a separate thread
+        and send the result to the response queue
+        """
+        response, think_content, is_complete = self.generate()
+        self.response_queue.put((self.model, response, think_content, is_complete))
 
 class ResponseSignal:
     def __init__(self):
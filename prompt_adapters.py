@@ -0,0 +1,114 @@
+from model_registry import registry
+from chat_ui.utils.settings import settings
+
+
+class PromptAdapter:
+    """
+    Formats conversation messages for a family of models.
+
+    Each message is formatted once: the result is cached on compact
+    Message objects, so resending a growing history only formats the turns
+    added since the previous request.
+    """
+
+    name = 'plain'
+
+    def format_message(self, msg):
+        """
+        Format a single message
+
+        Args:
+            msg (Mapping): Message with 'role' and 'content'
+
+        Returns:
+            dict: Message as sent to the API, or None to leave it out
+        """
+        return {'role': msg['role'], 'content': msg['content']}
+
+    def format_messages(self, messages):
+        """
+        Format a conversation, reusing the cached form of messages
+        already formatted by this adapter
+
+        Args:
+            messages (list): Conversation history
+
+        Returns:
+            list: Messages as sent to the API
+        """
+        formatted_messages = []
+        for msg in messages:
+            cached = getattr(msg, 'formatted', None)
+            if cached is not None and cached[0] == self.name:
+                formatted = cached[1]
+            else:
+                formatted = self.format_message(msg)
+                if hasattr(msg, 'formatted'):
+                    msg.formatted = (self.name, formatted)
+            if formatted is not None and msg.get('images'):
+                # Image paths are carried along, they are encoded just before sending
+                formatted = dict(formatted, images=list(msg['images']))
+            if formatted is not None:
+                formatted_messages.append(formatted)
+        return formatted_messages
+
+
+class DeepSeekAdapter(PromptAdapter):
+    """Prefixes turns with the DeepSeek role tokens"""
+
+    name = 'deepseek'
+
+    PREFIXES = {
+        'user': '<｜User｜>',
+        'assistant': '<｜Assistant｜>',
+    }
+
+    def format_message(self, msg):
+        role = msg['role']
+        if role == 'system':
+            return {'role': 'system', 'content': msg['content']}
+        prefix = self.PREFIXES.get(role)
+        if prefix is None:
+            return None
+        return {'role': role, 'content': f"{prefix}{msg['content']}"}
+
+
+_ADAPTERS = {}
+_DEFAULT_ADAPTER = PromptAdapter()
+
+
+def register_adapter(prompt_format, adapter):
+    """
+    Register the adapter used for a prompt format or model family
+
+    Args:
+        prompt_format (str): Format or family name reported by the model registry
+        adapter (PromptAdapter): Adapter instance
+    """
+    _ADAPTERS[prompt_format] = adapter
+
+
+def get_adapter(model):
+    """
+    Return the adapter for a model
+
+    Args:
+        model (str): Model name
+
+    Returns:
+        PromptAdapter: Adapter set for the model in settings, else the one for
+            the prompt format or family in its registry metadata, the plain
+            adapter otherwise
+    """
+    overrides = settings['prompt_formats']['models']
+    override = overrides.get(model) or overrides.get((model or '').split(':')[0])
+    if override:
+        return _ADAPTERS.get(override, _DEFAULT_ADAPTER)
+    info = registry.get(model)
+    for key in (info.get('prompt_format'), info.get('family')):
+        if key in _ADAPTERS:
+            return _ADAPTERS[key]
+    return _DEFAULT_ADAPTER
+
+
+register_adapter('deepseek', DeepSeekAdapter())
@@ -0,0 +1,371 @@
+import hmac
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from chat_ui.chat_manager.manager import ChatManager
+from chat_ui.chat_manager.titles import TitleService
+from chat_ui.chat_manager.messages import to_json
+from chat_ui.utils.settings import settings
+from models import OllamaModelHandler, ModelChatThread
+from endpoint_pool import pool
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+# Generations streamed at the same time, further ones wait for a free worker
+DEFAULT_MAX_GENERATIONS = 32
+# Host headers accepted besides the bound interface, so a DNS-rebinding page can't reach the API
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+REASONS = {
+    200: 'OK', 201: 'Created', 400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden', 404: 'Not Found',
+    405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class HTTPError(Exception):
+    """Error answered with a JSON body and the given status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def chat_summary(chat):
+    """
+    Describe a chat without its messages
+
+    Args:
+        chat (dict): Chat session
+
+    Returns:
+        dict: id, title, model, timestamps and message count
+    """
+    return {
+        'id': chat['id'],
+        'title': chat.get('title'),
+        'model': chat.get('model'),
+        'profile': chat.get('profile'),
+        'created_at': chat.get('created_at'),
+        'last_updated': chat.get('last_updated'),
+        'message_count': len(chat.get('messages', [])),
+    }
+
+
+class ChatAPIServer:
+    """
+    Local HTTP API over the chat store, built on asyncio.
+
+    All ChatManager calls happen on the event loop thread; generations run
+    in worker threads of their own and stream their tokens back as
+    Server-Sent Events. Long generations therefore never hold up the
+    default executor used by short requests such as /models.
+    """
+
+    def __init__(self, chat_manager, host='127.0.0.1', port=8765, max_generations=DEFAULT_MAX_GENERATIONS,
+                 token=None):
+        """
+        Initialize the server
+
+        Args:
+            chat_manager (ChatManager): Chat store shared with the desktop app
+            host (str, optional): Interface to bind. Defaults to '127.0.0.1'.
+            port (int, optional): Port to listen on. Defaults to 8765.
+            max_generations (int, optional): Generations streamed at the same time.
+                Defaults to DEFAULT_MAX_GENERATIONS.
+            token (str, optional): Bearer token every request must carry. Defaults to
+                the 'server.token' setting, empty requires none.
+        """
+        self.chat_manager = chat_manager
+        self.host = host
+        self.port = port
+        self.token = settings['server']['token'] if token is None else token
+        self._allowed_hosts = LOCAL_HOSTS | ({host} if host not in ('', '0.0.0.0', '::') else set())
+        self._generations = ThreadPoolExecutor(max_workers=max_generations, thread_name_prefix="generate")
+        # Started with the event loop, which titles are applied on
+        self.title_service = None
+        # Chats with a generation in progress
+        self._busy_chats = set()
+
+    async def serve_forever(self):
+        """Listen for connections until cancelled"""
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        loop = asyncio.get_running_loop()
+        self.title_service = TitleService(self.chat_manager, dispatch=loop.call_soon_threadsafe)
+        # Chats saved by the desktop app or batch runs show up without a restart
+        self.chat_manager.watch(dispatch=loop.call_soon_threadsafe)
+        print(f"Ollama Chat API listening on http://{self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """Stop the generation workers without waiting for queued generations"""
+        self._generations.shutdown(wait=False, cancel_futures=True)
+
+    async def _read_request(self, reader):
+        """Parse the request line, headers and body"""
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+
+        url = urlsplit(target)
+        return method.upper(), url.path.rstrip('/') or '/', parse_qs(url.query), headers, body
+
+    def _check_access(self, headers):
+        """
+        Refuse requests a web page could make: browsers send an Origin header
+        with cross-site requests, and a DNS-rebinding page reaches the API
+        under its own host name
+        """
+        host = urlsplit(f"//{headers.get('host', '')}").hostname
+        if host not in self._allowed_hosts:
+            raise HTTPError(403, "Unexpected Host header")
+        if 'origin' in headers:
+            raise HTTPError(403, "Requests from web pages are not allowed")
+        if self.token:
+            scheme, _, token = headers.get('authorization', '').partition(' ')
+            if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip(), self.token):
+                raise HTTPError(401, "Missing or invalid bearer token")
+
+    async def _send_json(self, writer, status, payload):
+        """Write a complete JSON response"""
+        body = json.dumps(payload, ensure_ascii=False, default=to_json).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+
+    async def _handle_connection(self, reader, writer):
+        """Serve one request per connection"""
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            method, path, query, headers, body = request
+            self._check_access(headers)
+            await self._dispatch(writer, method, path, query, body)
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {'error': e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"Error handling API request: {e}")
+            try:
+                await self._send_json(writer, 500, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_body(body):
+        """Decode a JSON request body"""
+        if not body:
+            return {}
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise HTTPError(400, "Body must be JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+    @staticmethod
+    def _int_param(query, name, default=None):
+        """Read a non-negative integer query parameter"""
+        value = query.get(name, [None])[0]
+        if value is None:
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            number = -1
+        if number < 0:
+            raise HTTPError(400, f"'{name}' must be a non-negative integer")
+        return number
+
+    def _get_chat(self, chat_id):
+        chat = self.chat_manager.get_chat_by_id(chat_id)
+        if chat is None:
+            raise HTTPError(404, f"Chat {chat_id} not found")
+        return chat
+
+    async def _dispatch(self, writer, method, path, query, body):
+        """Route a request to its handler"""
+        parts = [part for part in path.split('/') if part]
+
+        if parts == ['models'] and method == 'GET':
+            models = await asyncio.get_running_loop().run_in_executor(
+                None, OllamaModelHandler.get_available_models
+            )
+            return await self._send_json(writer, 200, {'models': models})
+
+        if parts == ['endpoints'] and method == 'GET':
+            return await self._send_json(writer, 200, {'endpoints': pool.status()})
+
+        if parts == ['chats']:
+            if method == 'GET':
+                offset = self._int_param(query, 'offset', 0)
+                limit = self._int_param(query, 'limit')
+                chat_filter = {key: query[key][0] for key in ('model', 'since', 'until') if key in query}
+                chats = self.chat_manager.list_chats(offset, limit, filter=chat_filter)
+                return await self._send_json(writer, 200, {'chats': [chat_summary(c) for c in chats]})
+            if method == 'POST':
+                data = self._parse_body(body)
+                chat = self.chat_manager.create_new_chat(data.get('model'), data.get('profile'))
+                return await self._send_json(writer, 201, chat_summary(chat))
+            raise HTTPError(405, "Use GET or POST")
+
+        if len(parts) == 2 and parts[0] == 'chats':
+            if method != 'GET':
+                raise HTTPError(405, "Use GET")
+            return await self._send_json(writer, 200, chat_summary(self._get_chat(parts[1])))
+
+        if len(parts) == 3 and parts[0] == 'chats' and parts[2] == 'messages':
+            chat = self._get_chat(parts[1])
+            if method == 'GET':
+                offset = self._int_param(query, 'offset', 0)
+                limit = self._int_param(query, 'limit')
+                reverse = query.get('reverse', ['0'])[0].lower() in ('1', 'true', 'yes')
+                messages = self.chat_manager.get_chat_messages(chat, offset, limit, reverse)
+                return await self._send_json(writer, 200, {'messages': messages})
+            if method == 'POST':
+                return await self._stream_reply(writer, chat, self._parse_body(body))
+            raise HTTPError(405, "Use GET or POST")
+
+        raise HTTPError(404, f"No route for {path}")
+
+    async def _send_event(self, writer, event, payload):
+        """Write one Server-Sent Event"""
+        data = json.dumps(payload, ensure_ascii=False)
+        writer.write(f"event: {event}\ndata: {data}\n\n".encode('utf-8'))
+        await writer.drain()
+
+    async def _stream_reply(self, writer, chat, data):
+        """Add a user message and stream the assistant reply as SSE"""
+        content = data.get('content')
+        if not isinstance(content, str) or not content.strip():
+            raise HTTPError(400, "'content' is required")
+        if chat['id'] in self._busy_chats:
+            raise HTTPError(409, "A reply is already being generated for this chat")
+
+        model = data.get('model') or chat.get('model')
+        if not model:
+            raise HTTPError(400, "The chat has no model, pass 'model'")
+
+        self._busy_chats.add(chat['id'])
+        try:
+            self.chat_manager.add_message(chat, 'user', content)
+            messages = list(self.chat_manager.get_chat_messages(chat))
+
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/event-stream; charset=utf-8\r\n"
+                b"Cache-Control: no-cache\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+            await writer.drain()
+
+            loop = asyncio.get_running_loop()
+            tokens = asyncio.Queue()
+
+            def on_token(part):
+                loop.call_soon_threadsafe(tokens.put_nowait, part)
+
+            # Contexts are stored for the chat's model only
+            reuse_context = settings['context_reuse']['enabled'] and model == chat.get('model')
+            context = self.chat_manager.get_context(chat) if reuse_context else None
+            thread = ModelChatThread(
+                model, messages, None, on_token=on_token, profile=chat.get('profile'),
+                reuse_context=reuse_context, context=context
+            )
+            generation = loop.run_in_executor(self._generations, thread.generate)
+
+            client_connected = True
+            while not generation.done() or not tokens.empty():
+                getter = asyncio.ensure_future(tokens.get())
+                done, _ = await asyncio.wait({getter, generation}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    continue
+                if client_connected:
+                    try:
+                        await self._send_event(writer, 'token', {'content': getter.result()})
+                    except ConnectionError:
+                        # Keep generating so the reply is still stored
+                        client_connected = False
+
+            response, think_content, is_complete = await generation
+            if is_complete:
+                self.chat_manager.add_message(chat, 'assistant', response)
+                if reuse_context:
+                    self.chat_manager.set_context(chat, thread.context)
+                self.title_service.request_title(chat)
+
+            if client_connected:
+                await self._send_event(writer, 'done', {
+                    'response': response,
+                    'think': think_content,
+                    'ok': is_complete,
+                    'stats': thread.stats,
+                })
+        finally:
+            self._busy_chats.discard(chat['id'])
+
+
+def main():
+    """
+    Run the local chat API server
+    """
+    parser = argparse.ArgumentParser(description="Serve the Ollama Chat store over a local HTTP API")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to bind (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on (default: %(default)s)")
+    parser.add_argument('--chats-dir', default='chats', help="Chats directory (default: chats)")
+    parser.add_argument('--max-generations', type=int, default=DEFAULT_MAX_GENERATIONS,
+                        help="Generations streamed at the same time (default: %(default)s)")
+    parser.add_argument('--token', help="Bearer token required from clients (default: the server.token setting)")
+    args = parser.parse_args()
+
+    chat_manager = ChatManager(args.chats_dir)
+    server = ChatAPIServer(chat_manager, args.host, args.port, args.max_generations, args.token)
+    pool.start_background_checks()
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        pool.stop()
+        chat_manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StandinConfig:
+    """Behaviour of a stand-in server, shared by its request handlers"""
+
+    def __init__(self, name, models, first_token_delay=0.2, token_delay=0.02,
+                 fail_rate=0.0, stall_after=None, reply_words=40):
+        self.name = name
+        self.models = models
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.fail_rate = fail_rate
+        self.stall_after = stall_after
+        self.reply_words = reply_words
+
+        self.lock = threading.Lock()
+        self.loaded = set()
+        self.requests = 0
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """
+    Answers the subset of the Ollama API the app uses, with made-up replies
+    """
+
+    config = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        config = self.config
+        if self.path == '/api/tags':
+            return self._send_json(200, {'models': [
+                {'name': model, 'model': model, 'size': 1_000_000_000, 'digest': f"standin-{model}",
+                 'details': {'family': 'llama', 'parameter_size': '1B'}}
+                for model in config.models
+            ]})
+        if self.path == '/api/ps':
+            with config.lock:
+                loaded = sorted(config.loaded)
+            return self._send_json(200, {'models': [{'name': model, 'model': model} for model in loaded]})
+        self._send_json(404, {'error': f"no route for {self.path}"})
+
+    def do_POST(self):
+        config = self.config
+        try:
+            body = self._read_json()
+        except json.JSONDecodeError as e:
+            return self._send_json(400, {'error': str(e)})
+
+        if self.path == '/api/show':
+            model = body.get('model') or body.get('name')
+            if model not in config.models:
+                return self._send_json(404, {'error': f"model '{model}' not found"})
+            return self._send_json(200, {
+                'template': '{{ .Prompt }}',
+                'model_info': {'general.architecture': 'llama', 'llama.context_length': 8192},
+                'capabilities': ['completion'],
+            })
+
+        if self.path in ('/api/chat', '/api/generate'):
+            return self._generate(body, chat=self.path == '/api/chat')
+
+        self._send_json(404, {'error': f"no route for {self.path}"})
+
+    def _generate(self, body, chat):
+        config = self.config
+        model = body.get('model')
+        if model not in config.models:
+            return self._send_json(404, {'error': f"model '{model}' not found"})
+        if random.random() < config.fail_rate:
+            return self._send_json(500, {'error': f"{config.name} failed on purpose"})
+
+        with config.lock:
+            config.loaded.add(model)
+            config.requests += 1
+
+        prompt_tokens = sum(len(str(message.get('content', '')).split())
+                            for message in body.get('messages', [])) or len(body.get('prompt', '').split())
+        num_predict = (body.get('options') or {}).get('num_predict')
+        words = config.reply_words if num_predict is None else min(num_predict, config.reply_words)
+        tokens = [f"{config.name}-word{i} " for i in range(words)]
+
+        def chunk(content, done=False):
+            payload = {
+                'model': model,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'done': done,
+            }
+            if chat:
+                payload['message'] = {'role': 'assistant', 'content': content}
+            else:
+                payload['response'] = content
+            if done:
+                payload.update({
+                    'done_reason': 'stop',
+                    'prompt_eval_count': prompt_tokens,
+                    'prompt_eval_duration': prompt_tokens * 1_000_000,
+                    'eval_count': len(tokens),
+                    'eval_duration': int(len(tokens) * config.token_delay * 1e9),
+                })
+                if not chat:
+                    payload['context'] = list(range(prompt_tokens + len(tokens)))
+            return payload
+
+        time.sleep(config.first_token_delay)
+
+        if body.get('stream', True) is False:
+            final = chunk(''.join(tokens), done=True)
+            return self._send_json(200, final)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write(payload):
+            data = (json.dumps(payload) + '\n').encode('utf-8')
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            for i, token in enumerate(tokens):
+                if config.stall_after is not None and i >= config.stall_after:
+                    # Keep the connection open without sending anything
+                    time.sleep(3600)
+                write(chunk(token))
+                time.sleep(config.token_delay)
+            write(chunk('', done=True))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def main():
+    """
+    Run stand-in Ollama servers, to try several endpoints without GPUs
+    """
+    parser = argparse.ArgumentParser(description="Stand-in Ollama servers for local testing")
+    parser.add_argument('ports', type=int, nargs='+', help="Ports to serve on, one server each")
+    parser.add_argument('-m', '--models', default='standin', help="Comma separated model names (default: %(default)s)")
+    parser.add_argument('--first-token-delay', type=float, default=0.2,
+                        help="Seconds before the first chunk (default: %(default)s)")
+    parser.add_argument('--token-delay', type=float, default=0.02,
+                        help="Seconds between chunks (default: %(default)s)")
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help="Fraction of generations answered with a server error (default: %(default)s)")
+    parser.add_argument('--stall-after', type=int, default=None,
+                        help="Stop sending after this many chunks, keeping the connection open")
+    parser.add_argument('--words', type=int, default=40, help="Words per reply (default: %(default)s)")
+    args = parser.parse_args()
+
+    models = [model.strip() for model in args.models.split(',') if model.strip()]
+    servers = []
+    for port in args.ports:
+        config = StandinConfig(
+            f"standin{port}", models, args.first_token_delay, args.token_delay,
+            args.fail_rate, args.stall_after, args.words
+        )
+        handler = type('Handler', (StandinHandler,), {'config': config})
+        server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        print(f"Stand-in Ollama server on http://127.0.0.1:{port} ({', '.join(models)})")
+
+    hosts = ','.join(f"http://127.0.0.1:{port}" for port in args.ports)
+    print(f"Try it with: OLLAMA_HOSTS={hosts} python main.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
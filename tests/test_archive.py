@@ -0,0 +1,83 @@
+import os
+
+from chat_ui.chat_manager.archive import ChatArchive
+
+
+def make_chat(chat_id, title=None):
+    return {
+        'id': chat_id,
+        'title': title,
+        'model': 'llama3',
+        'messages': [{'role': 'user', 'content': f"hello from {chat_id}"}],
+    }
+
+
+def test_restore_round_trip(tmp_path):
+    archive = ChatArchive(str(tmp_path / 'archive'), retention_days=None)
+    archive.archive_chats([make_chat('a', 'First'), make_chat('b')])
+
+    assert {entry['id'] for entry in archive.list_archived()} == {'a', 'b'}
+    assert archive.restore_chat('a') == make_chat('a', 'First')
+    assert archive.restore_chat('a') is None
+    assert [entry['id'] for entry in archive.list_archived()] == ['b']
+
+
+def test_index_is_shared_between_instances(tmp_path):
+    first = ChatArchive(str(tmp_path / 'archive'), retention_days=None)
+    second = ChatArchive(str(tmp_path / 'archive'), retention_days=None)
+    first.archive_chats([make_chat('a')])
+
+    assert second.get_archived_chat('a') == make_chat('a')
+
+
+def test_compaction_rewrites_mostly_dead_segments(tmp_path):
+    archive = ChatArchive(str(tmp_path / 'archive'), retention_days=None)
+    for chat_id in 'abc':
+        archive.archive_chats([make_chat(chat_id)])
+    archive.restore_chat('a')
+    archive.restore_chat('b')
+    old_segment = archive._index['entries']['c']['segment']
+
+    result = archive.compact()
+
+    assert result['removed_segments'] == 1
+    assert not os.path.exists(archive._segment_path(old_segment))
+    assert archive._index['entries']['c']['segment'] != old_segment
+    assert archive.get_archived_chat('c') == make_chat('c')
+
+
+def test_compaction_keeps_segment_with_corrupt_batch(tmp_path):
+    archive = ChatArchive(str(tmp_path / 'archive'), retention_days=None)
+    for chat_id in 'abc':
+        archive.archive_chats([make_chat(chat_id)])
+    archive.restore_chat('a')
+    archive.restore_chat('b')
+    entry = dict(archive._index['entries']['c'])
+
+    # Overwrite the middle of the gzip member holding chat c
+    path = archive._segment_path(entry['segment'])
+    with open(path, 'r+b') as f:
+        f.seek(entry['offset'] + entry['length'] // 2)
+        f.write(b'\xff' * 8)
+
+    result = archive.compact()
+
+    assert result['removed_segments'] == 0
+    assert os.path.exists(path)
+    assert archive._index['entries']['c'] == entry
+    assert entry['segment'] in archive._index['segments']
+
+
+def test_unreadable_legacy_files_are_kept(tmp_path):
+    legacy_dir = tmp_path / 'deleted'
+    legacy_dir.mkdir()
+    (legacy_dir / 'deleted_good.json').write_text('{"id": "good", "messages": []}', encoding='utf-8')
+    (legacy_dir / 'deleted_bad.json').write_text('{not json', encoding='utf-8')
+    archive = ChatArchive(str(tmp_path / 'archive'), retention_days=None, legacy_dirs=[str(legacy_dir)])
+
+    result = archive.compact()
+
+    assert result['imported'] == 1
+    assert archive.get_archived_chat('good') == {'id': 'good', 'messages': []}
+    assert not (legacy_dir / 'deleted_good.json').exists()
+    assert (legacy_dir / 'deleted_bad.json').exists()
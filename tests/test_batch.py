@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+pytest.importorskip('ollama')
+
+from batch import BatchRunner, read_jobs
+
+
+def test_read_jobs_skips_invalid_lines(tmp_path):
+    path = tmp_path / 'jobs.jsonl'
+    path.write_text('\n'.join([
+        json.dumps({'prompt': 'hello', 'system': 'be brief'}),
+        json.dumps({'messages': [{'role': 'user'}]}),
+        json.dumps({'messages': []}),
+        json.dumps(['not', 'an', 'object']),
+        json.dumps({'id': 'conv', 'messages': [{'role': 'user', 'content': 'hi'}]}),
+        '{broken',
+    ]), encoding='utf-8')
+
+    jobs = list(read_jobs(str(path)))
+
+    assert [job['id'] for job in jobs] == [1, 'conv']
+    assert jobs[0]['messages'] == [
+        {'role': 'system', 'content': 'be brief'},
+        {'role': 'user', 'content': 'hello'},
+    ]
+
+
+def test_failing_job_does_not_abort_the_run():
+    runner = BatchRunner(['llama3'], concurrency=2)
+
+    def run_one(job, model):
+        if job['id'] == 'bad':
+            raise KeyError('content')
+        return {'id': job['id'], 'model': model, 'ok': True, 'timeout': None,
+                'total_ms': 1.0, 'ttft_ms': 1.0, 'eval_count': 1}
+
+    runner.run_one = run_one
+    jobs = [{'id': job_id, 'messages': []} for job_id in ('a', 'bad', 'b', 'c')]
+    runner.run(jobs)
+
+    results = {result['id']: result for result in runner.results}
+    assert set(results) == {'a', 'bad', 'b', 'c'}
+    assert results['bad']['ok'] is False and 'KeyError' in results['bad']['error']
+    assert runner.report(1.0)['errors'] == 1
+
+
+@pytest.mark.parametrize('concurrency', ['0', '-2'])
+def test_concurrency_must_be_positive(monkeypatch, concurrency):
+    monkeypatch.setattr('sys.argv', ['batch.py', '-', '-m', 'llama3', '-c', concurrency])
+    from batch import main
+
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == 2
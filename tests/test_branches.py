@@ -0,0 +1,69 @@
+from chat_ui.chat_manager.manager import ChatManager
+from chat_ui.chat_manager.messages import PagedMessageList, active_path, children_map, parent_index
+
+
+def tree():
+    # 0 - 1 - 2
+    #      \- 3 - 4
+    #  5 (new root)
+    return [
+        {'role': 'user', 'content': 'q'},
+        {'role': 'assistant', 'content': 'a'},
+        {'role': 'user', 'content': 'follow-up'},
+        {'role': 'user', 'content': 'edited follow-up', 'parent': 1},
+        {'role': 'assistant', 'content': 'answer'},
+        {'role': 'user', 'content': 'other chat', 'parent': -1},
+    ]
+
+
+def test_parent_index_is_implicit_unless_stored():
+    messages = tree()
+
+    assert [parent_index(messages, i) for i in range(len(messages))] == [-1, 0, 1, 1, 3, -1]
+
+
+def test_parents_must_come_earlier():
+    messages = [{'role': 'user', 'content': 'a', 'parent': 1}, {'role': 'user', 'content': 'b', 'parent': 1}]
+
+    assert [parent_index(messages, i) for i in range(2)] == [-1, 0]
+    assert active_path(messages) == [0, 1]
+
+
+def test_active_path_follows_the_head():
+    messages = tree()
+
+    assert active_path(messages) == [5]
+    assert active_path(messages, 4) == [0, 1, 3, 4]
+    assert active_path(messages, 2) == [0, 1, 2]
+    assert active_path(messages, 99) == [5]
+    assert children_map(messages) == {-1: [0, 5], 0: [1], 1: [2, 3], 3: [4]}
+
+
+def test_paged_list_reads_no_message_for_the_path():
+    messages = tree()
+    parents = {i: m['parent'] for i, m in enumerate(messages) if 'parent' in m}
+    paged = PagedMessageList(len(messages), [(0, 3), (3, 3)], lambda block: 1 / 0, parents)
+
+    assert active_path(paged, 4) == [0, 1, 3, 4]
+    assert not paged.loaded
+
+
+def test_manager_branches(tmp_path):
+    manager = ChatManager(str(tmp_path))
+    try:
+        chat = manager.create_new_chat('llama3')
+        for role, content in [('user', 'q'), ('assistant', 'a'), ('user', 'follow-up')]:
+            manager.add_message(chat, role, content)
+        manager.add_message(chat, 'user', 'edited follow-up', parent=1)
+
+        assert manager.get_active_path(chat) == [0, 1, 3]
+        assert manager.get_siblings(chat, 3) == [2, 3]
+        assert manager.get_branch_choices(chat) == {3: [2, 3]}
+
+        manager.switch_branch(chat, 2)
+        assert manager.get_active_path(chat) == [0, 1, 2]
+        manager.add_message(chat, 'assistant', 'answer')
+        assert manager.get_parent(chat, 4) == 2
+        assert manager.get_active_path(chat) == [0, 1, 2, 4]
+    finally:
+        manager.close()
@@ -0,0 +1,88 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+ollama = pytest.importorskip('ollama')
+pytest.importorskip('httpx')
+
+from endpoint_pool import EndpointPool
+from standin_server import StandinConfig, StandinHandler
+
+
+@pytest.fixture
+def standin():
+    servers = []
+
+    def start(name, models=('standin',), **behaviour):
+        config = StandinConfig(name, list(models), first_token_delay=0, token_delay=0, reply_words=3, **behaviour)
+        handler = type('Handler', (StandinHandler,), {'config': config})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", config
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def reply(chunks):
+    return ''.join(chunk['message']['content'] for chunk in chunks)
+
+
+def test_stream_fails_over_before_first_chunk(standin):
+    failing, failing_config = standin('a', fail_rate=1.0)
+    working, working_config = standin('b')
+    pool = EndpointPool([failing, working])
+    info = {}
+
+    chunks = list(pool.chat('standin', [{'role': 'user', 'content': 'hi'}], stream=True, info=info))
+
+    assert reply(chunks) == 'b-word0 b-word1 b-word2 '
+    assert info['endpoint'] == working
+    failed, served = pool.endpoints
+    assert not failed.healthy and served.healthy
+    assert failed.active == served.active == 0
+    assert working_config.requests == 1
+
+
+def test_missing_model_only_excludes_the_host_for_that_model(standin):
+    other, _ = standin('a', models=('other',))
+    working, _ = standin('b')
+    pool = EndpointPool([other, working])
+
+    response = pool.call('chat', route='standin', model='standin', messages=[], stream=False)
+
+    assert response['message']['content'] == 'b-word0 b-word1 b-word2 '
+    assert pool.endpoints[0].healthy
+
+    pool.check_all()
+    assert pool._candidates('standin')[0].host == working
+    assert pool._candidates('other')[0].host == other
+
+
+def test_checked_pool_prefers_hosts_with_the_model_loaded(standin):
+    cold, _ = standin('a')
+    warm, warm_config = standin('b')
+    warm_config.loaded.add('standin')
+    pool = EndpointPool([cold, warm])
+    pool.check_all()
+
+    info = {}
+    list(pool.generate('standin', 'hi', stream=True, info=info))
+
+    assert info['endpoint'] == warm
+
+
+def test_error_of_the_last_host_is_raised(standin):
+    first, _ = standin('a', fail_rate=1.0)
+    second, _ = standin('b', fail_rate=1.0)
+    pool = EndpointPool([first, second])
+
+    with pytest.raises(ollama.ResponseError) as error:
+        list(pool.chat('standin', [], stream=True))
+    assert error.value.status_code == 500
+    assert not any(endpoint.healthy for endpoint in pool.endpoints)
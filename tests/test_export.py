@@ -0,0 +1,47 @@
+import io
+import json
+
+from chat_ui.chat_manager import storage
+from chat_ui.chat_manager.export import export_chats, import_chats
+
+
+def make_chat(chat_id, messages=None):
+    return {
+        'id': chat_id,
+        'model': 'llama3',
+        'messages': messages if messages is not None else [
+            {'role': 'user', 'content': 'hello', 'timestamp': '2024-01-01T10:00:00'},
+            {'role': 'assistant', 'content': 'hi', 'timestamp': '2024-01-01T10:00:05'},
+        ],
+    }
+
+
+def test_export_import_round_trip(tmp_path):
+    bundle = io.StringIO()
+    assert export_chats([make_chat('a'), make_chat('b')], bundle, 'jsonl') == 2
+
+    chats_dir = str(tmp_path)
+    counts = import_chats(chats_dir, io.StringIO(bundle.getvalue()), batch_size=1)
+
+    assert counts == {'imported': 2, 'skipped': 0, 'invalid': 0}
+    for chat_id in 'ab':
+        assert storage.read_chat_file(storage.find_chat_file(chats_dir, chat_id)) == make_chat(chat_id)
+
+
+def test_import_skips_existing_and_invalid_chats(tmp_path):
+    chats_dir = str(tmp_path)
+    storage.write_chat_file(chats_dir, make_chat('existing'))
+    lines = [
+        json.dumps(make_chat('existing')),
+        json.dumps(make_chat('no-role', [{'content': 'orphan'}])),
+        json.dumps(make_chat('not-a-dict', ['hello'])),
+        json.dumps(make_chat('../escape')),
+        '{not json',
+        json.dumps(make_chat('good')),
+    ]
+
+    counts = import_chats(chats_dir, io.StringIO('\n'.join(lines)))
+
+    assert counts == {'imported': 1, 'skipped': 1, 'invalid': 4}
+    assert storage.find_chat_file(chats_dir, 'no-role') is None
+    assert storage.find_chat_file(chats_dir, 'good') is not None
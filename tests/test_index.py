@@ -0,0 +1,58 @@
+import random
+from datetime import date
+
+import pytest
+
+from chat_ui.chat_manager.index import ChatIndex
+
+
+def chat(chat_id, timestamp):
+    return {'id': chat_id, 'last_updated': timestamp}
+
+
+@pytest.fixture
+def index(monkeypatch):
+    # Small blocks so a few chats split them
+    monkeypatch.setattr(ChatIndex, 'BLOCK_SIZE', 2)
+    return ChatIndex()
+
+
+def test_page_is_most_recent_first(index):
+    index.touch(chat('a', '2024-01-01T10:00:00'))
+    index.touch(chat('b', '2024-01-03T10:00:00'))
+    index.touch(chat('c', '2024-01-02T10:00:00'))
+    index.touch(chat('a', '2024-01-04T10:00:00'))
+
+    assert len(index) == 3
+    assert index.page() == ['a', 'b', 'c']
+    assert index.page(offset=1, limit=1) == ['b']
+    assert index.page(offset=5) == []
+
+
+def test_page_by_date_range_and_predicate(index):
+    for day in range(1, 10):
+        index.touch(chat(f"chat{day}", f"2024-01-0{day}T12:00:00"))
+    index.remove('chat5')
+
+    assert index.page(since=date(2024, 1, 3), until='2024-01-07') == ['chat6', 'chat4', 'chat3']
+    assert index.page(limit=2, predicate=lambda chat_id: chat_id[-1] in '13579') == ['chat9', 'chat7']
+    assert index.page(offset=1, limit=2, predicate=lambda chat_id: chat_id != 'chat8') == ['chat7', 'chat6']
+
+
+def test_matches_a_sorted_list(index):
+    rng = random.Random(0)
+    expected = {}
+    for _ in range(2000):
+        chat_id = f"chat{rng.randrange(60)}"
+        if rng.random() < 0.2:
+            index.remove(chat_id)
+            expected.pop(chat_id, None)
+        else:
+            timestamp = f"2024-01-01T{rng.randrange(24):02d}:{rng.randrange(60):02d}:00"
+            index.touch(chat(chat_id, timestamp))
+            expected[chat_id] = timestamp
+        ordered = [chat_id for _, chat_id in sorted(((t, c) for c, t in expected.items()), reverse=True)]
+        offset, limit = rng.randrange(10), rng.randrange(1, 10)
+        assert index.page(offset, limit) == ordered[offset:offset + limit]
+    assert len(index) == len(expected)
+    assert index.page(since='2024-01-01T12') == [c for c in ordered if expected[c] >= '2024-01-01T12']
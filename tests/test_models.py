@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip('ollama')
+
+from models import OllamaModelHandler
+
+
+def test_context_covers_the_history():
+    messages = [
+        {'role': 'user', 'content': 'hello'},
+        {'role': 'assistant', 'content': 'hi'},
+        {'role': 'user', 'content': 'how are you?'},
+    ]
+
+    assert OllamaModelHandler._context_request(messages, [1, 2, 3]) == (None, messages[-1])
+
+
+def test_first_turn_starts_a_context():
+    messages = [
+        {'role': 'system', 'content': 'be brief'},
+        {'role': 'user', 'content': 'hello'},
+    ]
+
+    assert OllamaModelHandler._context_request(messages, None) == ('be brief', messages[-1])
+
+
+def test_history_without_context_is_sent_as_one_turn():
+    messages = [
+        {'role': 'system', 'content': 'be brief'},
+        {'role': 'user', 'content': 'look', 'images': ['a.png']},
+        {'role': 'assistant', 'content': 'a cat'},
+        {'role': 'user', 'content': 'what colour?'},
+    ]
+
+    system, message = OllamaModelHandler._context_request(messages, None)
+
+    assert system == 'be brief'
+    assert message == {
+        'role': 'user',
+        'content': "User: look\n\nAssistant: a cat\n\nUser: what colour?\n\nAssistant:",
+        'images': ['a.png'],
+    }
+
+
+def test_history_must_end_with_a_user_turn():
+    messages = [{'role': 'user', 'content': 'hello'}, {'role': 'assistant', 'content': 'hi'}]
+
+    assert OllamaModelHandler._context_request(messages, None) is None
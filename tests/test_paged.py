@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from chat_ui.chat_manager import storage
+from chat_ui.chat_manager.manager import ChatManager
+from chat_ui.chat_manager.messages import PagedMessageList
+
+
+def make_chat(chat_id, count, size=100):
+    return {
+        'id': chat_id,
+        'title': 'Long chat',
+        'messages': [
+            {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f"{i:05d} " + 'x' * size}
+            for i in range(count)
+        ],
+    }
+
+
+def write_indexed(tmp_path, chat, compress_threshold=None):
+    path = storage.write_chat_file(str(tmp_path), chat, compress_threshold=compress_threshold)
+    return path, storage.read_chat_index(path)
+
+
+@pytest.mark.parametrize('compress_threshold', [None, 0])
+def test_indexed_blocks_cover_every_message(tmp_path, compress_threshold):
+    chat = make_chat('a', 3000)
+    path, index = write_indexed(tmp_path, chat, compress_threshold)
+
+    assert storage.read_chat_file(path) == chat
+    assert len(index['blocks']) > 1
+    firsts = [first for _, _, first, _ in index['blocks']]
+    assert firsts == sorted(firsts) and firsts[0] == 0
+    assert sum(count for _, _, _, count in index['blocks']) == index['count'] == 3000
+    for offset, length, first, count in index['blocks']:
+        assert storage.read_messages(path, index, first, first + count) == chat['messages'][first:first + count]
+
+
+def test_read_messages_spans_blocks(tmp_path):
+    chat = make_chat('a', 3000)
+    path, index = write_indexed(tmp_path, chat)
+    _, _, first, count = index['blocks'][1]
+
+    assert storage.read_messages(path, index, first - 3, first + count + 3) == \
+        chat['messages'][first - 3:first + count + 3]
+    assert storage.read_chat_header(path, index) == {'id': 'a', 'title': 'Long chat', 'messages': []}
+
+
+def test_read_messages_rejects_rewritten_file(tmp_path):
+    path, index = write_indexed(tmp_path, make_chat('a', 10))
+    storage.write_chat_file(str(tmp_path), make_chat('a', 11), compress_threshold=None)
+
+    with pytest.raises(ValueError):
+        storage.read_messages(path, index, 0, 5)
+
+
+def make_paged(count=10, block=4):
+    messages = [{'role': 'user', 'content': str(i)} for i in range(count)]
+    blocks = [(first, min(block, count - first)) for first in range(0, count, block)]
+    reads = []
+
+    def read_block(position):
+        reads.append(position)
+        first, size = blocks[position]
+        return messages[first:first + size]
+
+    return PagedMessageList(count, blocks, read_block), reads
+
+
+def test_paged_list_reads_blocks_on_demand():
+    paged, reads = make_paged()
+
+    assert len(paged) == 10 and not paged.loaded
+    assert paged[-1]['content'] == '9'
+    assert reads == [2]
+    assert [message['content'] for message in paged[3:5]] == ['3', '4']
+    assert reads == [2, 0, 1]
+    assert paged.loaded
+    assert [message['content'] for message in paged] == [str(i) for i in range(10)]
+    assert reads == [2, 0, 1]
+
+
+def test_paged_copy_keeps_unread_blocks_unread():
+    paged, reads = make_paged()
+    paged[0]
+    copy = paged.copy()
+
+    assert reads == [0]
+    assert [message['content'] for message in copy] == [str(i) for i in range(10)]
+    assert reads == [0, 1, 2]
+    assert not paged.loaded
+    copy.append({'role': 'assistant', 'content': 'new'})
+    assert len(copy) == 11 and len(paged) == 10
+
+
+def test_manager_loads_long_chats_lazily(tmp_path):
+    chat = make_chat('a', 3000)
+    storage.write_chat_file(str(tmp_path), chat, compress_threshold=None)
+    manager = ChatManager(str(tmp_path), lazy_threshold=100)
+    try:
+        messages = manager.get_chat_by_id('a')['messages']
+        assert isinstance(messages, PagedMessageList) and not messages.loaded
+        assert messages[-1]['content'] == chat['messages'][-1]['content']
+        assert not messages.loaded
+
+        for filename in os.listdir(tmp_path):
+            if filename.startswith('a.'):
+                os.remove(tmp_path / filename)
+        with pytest.raises(FileNotFoundError):
+            messages[0]
+    finally:
+        manager.close()
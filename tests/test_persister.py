@@ -0,0 +1,68 @@
+import threading
+
+from chat_ui.chat_manager.persister import ChatPersister
+from chat_ui.utils.metrics import Metrics
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.writes = []
+        self.lock = threading.Lock()
+
+    def __call__(self, chat):
+        with self.lock:
+            self.writes.append((chat['id'], list(chat['messages'])))
+
+
+def test_saves_within_the_window_coalesce():
+    writer = RecordingWriter()
+    persister = ChatPersister(writer, coalesce_window=60, metrics=Metrics())
+    chat = {'id': 'a', 'messages': []}
+    for i in range(5):
+        chat['messages'].append(i)
+        persister.schedule(chat)
+    persister.schedule({'id': 'b', 'messages': ['x']})
+
+    assert persister.has_pending('a') and persister.pending_count() == 2
+    assert persister.flush(timeout=5)
+    assert sorted(writer.writes) == [('a', [0, 1, 2, 3, 4]), ('b', ['x'])]
+    assert persister.stats()['coalesced'] == 4
+    persister.close()
+
+
+def test_snapshot_ignores_later_changes():
+    writer = RecordingWriter()
+    persister = ChatPersister(writer, coalesce_window=60, metrics=Metrics())
+    chat = {'id': 'a', 'messages': [1]}
+    persister.schedule(chat)
+    chat['messages'].append(2)
+    persister.flush(timeout=5)
+
+    assert writer.writes == [('a', [1])]
+    persister.close()
+
+
+def test_close_flushes_and_cancel_drops():
+    writer = RecordingWriter()
+    persister = ChatPersister(writer, coalesce_window=60, metrics=Metrics())
+    persister.schedule({'id': 'a', 'messages': []})
+    persister.schedule({'id': 'b', 'messages': []})
+    persister.cancel('b')
+    persister.close()
+
+    assert writer.writes == [('a', [])]
+    persister.schedule({'id': 'c', 'messages': []})
+    assert writer.writes[-1] == ('c', [])
+
+
+def test_write_errors_are_counted():
+    def failing(chat):
+        raise OSError("disk full")
+
+    persister = ChatPersister(failing, coalesce_window=0, metrics=Metrics())
+    persister.schedule({'id': 'a', 'messages': []})
+
+    assert persister.flush(timeout=5)
+    assert persister.stats()['errors'] == 1
+    assert not persister.has_pending('a')
+    persister.close()
@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip('ollama')
+
+import prompt_adapters
+from chat_ui.utils.settings import settings
+from prompt_adapters import DeepSeekAdapter, get_adapter
+
+
+@pytest.fixture
+def metadata(monkeypatch):
+    models = {}
+    monkeypatch.setattr(prompt_adapters.registry, 'get', lambda model: models.get(model, {}))
+    monkeypatch.setitem(settings['prompt_formats'], 'models', {})
+    return models
+
+
+def test_adapter_follows_registry_metadata(metadata):
+    metadata['r1-distill:8b'] = {'family': 'qwen2', 'prompt_format': 'deepseek'}
+
+    assert isinstance(get_adapter('r1-distill:8b'), DeepSeekAdapter)
+    assert get_adapter('llama3').name == 'plain'
+
+
+def test_model_name_alone_picks_no_adapter(metadata):
+    assert get_adapter('deepseek-lookalike').name == 'plain'
+
+
+def test_settings_override_metadata(metadata):
+    metadata['custom:7b'] = {'prompt_format': 'deepseek'}
+    settings['prompt_formats']['models'].update({'custom': 'plain', 'other-distill': 'deepseek'})
+
+    assert get_adapter('custom:7b').name == 'plain'
+    assert isinstance(get_adapter('other-distill:14b'), DeepSeekAdapter)
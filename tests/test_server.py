@@ -0,0 +1,114 @@
+import json
+import asyncio
+
+import pytest
+
+pytest.importorskip('ollama')
+
+from chat_ui.chat_manager.manager import ChatManager
+from server import ChatAPIServer
+
+
+class RecordingWriter:
+    """Stands in for an asyncio StreamWriter, keeping what is written"""
+
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def chat_manager(tmp_path):
+    manager = ChatManager(str(tmp_path / 'chats'), save_delay=0)
+    yield manager
+    manager.close()
+
+
+def request(server, method, target, body=None, headers=None):
+    """Send one request through the server and return its status and JSON body"""
+    headers = dict({'Host': '127.0.0.1:8765'}, **(headers or {}))
+    payload = body.encode('utf-8') if isinstance(body, str) else json.dumps(body).encode('utf-8') if body is not None else b''
+    if payload:
+        headers['Content-Length'] = str(len(payload))
+    raw = f"{method} {target} HTTP/1.1\r\n" + ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw.encode('latin-1') + b"\r\n" + payload)
+        reader.feed_eof()
+        writer = RecordingWriter()
+        await server._handle_connection(reader, writer)
+        return writer.data
+
+    response = asyncio.run(run())
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split(b' ')[1]), json.loads(body)
+
+
+def test_create_list_and_get_chats(chat_manager):
+    server = ChatAPIServer(chat_manager, token='')
+
+    status, created = request(server, 'POST', '/chats', {'model': 'llama3'})
+    assert status == 201 and created['model'] == 'llama3'
+
+    status, listing = request(server, 'GET', '/chats?limit=10')
+    assert status == 200
+    assert [chat['id'] for chat in listing['chats']] == [created['id']]
+
+    status, summary = request(server, 'GET', f"/chats/{created['id']}")
+    assert status == 200 and summary['message_count'] == 0
+
+    status, messages = request(server, 'GET', f"/chats/{created['id']}/messages?reverse=1")
+    assert status == 200 and messages == {'messages': []}
+
+
+@pytest.mark.parametrize('method, target, body, status', [
+    ('GET', '/chats/missing', None, 404),
+    ('GET', '/nowhere', None, 404),
+    ('DELETE', '/chats', None, 405),
+    ('GET', '/chats?limit=-1', None, 400),
+    ('GET', '/chats?offset=abc', None, 400),
+    ('POST', '/chats', '{not json', 400),
+    ('POST', '/chats', [], 400),
+    ('POST', '/chats', 'x', 400),
+])
+def test_client_errors(chat_manager, method, target, body, status):
+    server = ChatAPIServer(chat_manager, token='')
+
+    assert request(server, method, target, body)[0] == status
+
+
+def test_reply_requires_content(chat_manager):
+    server = ChatAPIServer(chat_manager, token='')
+    chat = chat_manager.create_new_chat('llama3')
+
+    assert request(server, 'POST', f"/chats/{chat['id']}/messages", {'content': ' '})[0] == 400
+
+
+@pytest.mark.parametrize('headers', [
+    {'Origin': 'http://example.com'},
+    {'Host': 'attacker.example:8765'},
+    {'Host': ''},
+])
+def test_web_pages_are_refused(chat_manager, headers):
+    server = ChatAPIServer(chat_manager, token='')
+
+    assert request(server, 'POST', '/chats', {'model': 'llama3'}, headers)[0] == 403
+    assert chat_manager.list_chats() == []
+
+
+def test_token_is_required_when_configured(chat_manager):
+    server = ChatAPIServer(chat_manager, token='secret')
+
+    assert request(server, 'GET', '/chats')[0] == 401
+    assert request(server, 'GET', '/chats', headers={'Authorization': 'Bearer wrong'})[0] == 401
+    assert request(server, 'GET', '/chats', headers={'Authorization': 'Bearer secret'})[0] == 200
+    assert request(server, 'GET', '/chats', headers={'Host': 'localhost', 'Authorization': 'Bearer secret'})[0] == 200
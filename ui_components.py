@@ -3,19 +3,15 @@ from CTkMessagebox import CTkMessagebox
 
 class ChatListItem(ctk.CTkFrame):
     """A custom widget for displaying chat list items"""
-    def __init__(self, master, chat, on_click_callback, **kwargs):
+    def __init__(self, master, chat, on_click_callback, on_hover_callback=None, **kwargs):
         super().__init__(master, fg_color="transparent", **kwargs)
         self.chat = chat
         self.on_click_callback = on_click_callback
+        self.on_hover_callback = on_hover_callback
 
-        # Chat title with truncation
-        title = chat.get('title', 'Untitled Chat')
-        if len(title) > 25:
-            title = title[:25] + '...'
-        
         self.chat_title = ctk.CTkLabel(
             self, 
-            text=title, 
+            text=self._format_title(chat.get('title')), 
             anchor="w",
             font=ctk.CTkFont(size=12)
         )
@@ -38,11 +34,34 @@ class ChatListItem(ctk.CTkFrame):
         self.bind("<Button-1>", self._on_click)
         self.chat_title.bind("<Button-1>", self._on_click)
         self.model_badge.bind("<Button-1>", self._on_click)
+        if on_hover_callback is not None:
+            self.bind("<Enter>", self._on_hover)
+
+    @staticmethod
+    def _format_title(title):
+        """Truncate a chat title for the sidebar"""
+        title = title or 'Untitled Chat'
+        if len(title) > 25:
+            title = title[:25] + '...'
+        return title
+
+    def set_title(self, title):
+        """
+        Update the displayed title
+        
+        Args:
+            title (str): New chat title
+        """
+        self.chat_title.configure(text=self._format_title(title))
 
     def _on_click(self, event):
         """Handle click event and call the callback"""
         self.on_click_callback(self.chat)
 
+    def _on_hover(self, event):
+        """Handle the pointer entering the row, a hint the chat may be opened"""
+        self.on_hover_callback(self.chat)
+
 class ConfirmationDialog:
     """A utility class for creating confirmation dialogs"""
     @staticmethod